@@ -0,0 +1,126 @@
+"""Index of downloaded videos, checked before any extraction"""
+import os
+import sqlite3
+import threading
+import time
+
+
+def archive_id(extractor_key, video_id):
+    """Return the yt-dlp download archive ID ("youtube dQw4w9WgXcQ")"""
+    return f"{extractor_key.lower()} {video_id}"
+
+
+class ArchiveView:
+    """Set-like view of one variant, usable as yt-dlp's download_archive
+
+    yt-dlp keeps whatever non-path object it is given as its archive and
+    only uses `in`, `add` and truthiness, so it sees the live index.
+    Recording is left to the engine, which also knows the output files.
+    """
+
+    def __init__(self, index, variant):
+        self.index = index
+        self.variant = variant
+
+    def __contains__(self, archive_id):
+        return bool(self.index.lookup(archive_id, self.variant))
+
+    def __bool__(self):
+        return True
+
+    def add(self, archive_id):
+        """Ignore yt-dlp's own recording (the engine records files with their paths)"""
+
+    def __repr__(self):
+        # Stable, so pooled YoutubeDL instances are keyed by variant
+        return f"ArchiveView({self.variant!r})"
+
+
+class ArchiveIndex:
+    """Maps archive ID and variant to the files already on disk
+
+    The variant tells apart downloads of the same video with different
+    results (e.g. an mp4 and an extracted mp3). Everything is loaded into
+    memory at startup, so lookups do not touch the database; entries whose
+    files were deleted are dropped when looked up.
+    """
+
+    def __init__(self, path="archive.db"):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS archive (
+                archive_id TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                format TEXT,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                added_at REAL NOT NULL,
+                PRIMARY KEY (archive_id, variant, file_path)
+            );
+        """)
+        self._conn.commit()
+        self._files = {}
+        for archive_key, variant, file_path in self._conn.execute(
+                "SELECT archive_id, variant, file_path FROM archive"):
+            self._files.setdefault((archive_key, variant), []).append(file_path)
+
+    def view(self, variant):
+        """Return a download_archive view for one variant"""
+        return ArchiveView(self, variant)
+
+    def lookup(self, archive_key, variant):
+        """Return the existing files for a video and variant (empty if not downloaded)"""
+        with self._lock:
+            files = self._files.get((archive_key, variant))
+            if not files:
+                self.misses += 1
+                return []
+            missing = [path for path in files if not os.path.exists(path)]
+            for path in missing:
+                files.remove(path)
+                self._conn.execute("DELETE FROM archive WHERE archive_id = ? AND variant = ? AND file_path = ?",
+                                   (archive_key, variant, path))
+            if missing:
+                self._conn.commit()
+            if files:
+                self.hits += 1
+            else:
+                self.misses += 1
+                del self._files[(archive_key, variant)]
+            return list(files)
+
+    def add(self, archive_key, variant, file_path, format=None, bytes=0):
+        """Record a file produced for a video and variant"""
+        file_path = os.path.abspath(file_path)
+        if not bytes and os.path.exists(file_path):
+            bytes = os.path.getsize(file_path)
+        with self._lock:
+            files = self._files.setdefault((archive_key, variant), [])
+            if file_path not in files:
+                files.append(file_path)
+            self._conn.execute("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?, ?)",
+                               (archive_key, variant, file_path, format, bytes or 0, time.time()))
+            self._conn.commit()
+
+    def link(self, archive_key, variant, source, target):
+        """Hard-link an archived file to a new path and record it; returns False if linking failed"""
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if not os.path.exists(target):
+                os.link(source, target)
+        except OSError as e:
+            print(f"Could not link {source} to {target}: {e}")
+            return False
+        self.add(archive_key, variant, target)
+        return True
+
+    def stats(self):
+        """Return entry counts and lookup counters"""
+        with self._lock:
+            return {'videos': len(self._files), 'files': sum(len(f) for f in self._files.values()),
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,184 @@
+"""Global bandwidth limit shared fairly between running jobs"""
+import threading
+import time
+from datetime import datetime
+
+# A flow that has not reported progress for this long gives up its share
+IDLE_SECONDS = 2.0
+# Tokens a flow may save up, in seconds of its share
+BURST_SECONDS = 0.25
+# Longest single sleep, so limit changes apply quickly to throttled flows
+MAX_SLEEP = 0.25
+RATE_INTERVAL = 0.5
+RATE_SMOOTHING = 0.5
+
+
+def _minutes(text):
+    """Convert "HH:MM" to minutes after midnight"""
+    hours, _, minutes = text.strip().partition(':')
+    return int(hours) * 60 + int(minutes or 0)
+
+
+def scheduled_limit(schedule, default, now=None):
+    """Return the limit in bytes/s for the time of day; 0 means unlimited
+
+    Each rule is {"start": "HH:MM", "end": "HH:MM", "limit_kbps": N}; a rule
+    whose end is before its start runs over midnight. The first matching
+    rule wins, otherwise the default applies.
+    """
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    for rule in schedule or []:
+        start, end = _minutes(rule['start']), _minutes(rule['end'])
+        inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+        if inside:
+            return int(rule['limit_kbps']) * 1024
+    return default
+
+
+def parse_schedule(text):
+    """Parse "09:00-18:00=2000, 22:00-06:00=0" into schedule rules (KB/s)"""
+    rules = []
+    for part in (text or '').replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        period, _, limit = part.partition('=')
+        start, _, end = period.partition('-')
+        _minutes(start), _minutes(end)  # validate
+        rules.append({'start': start.strip(), 'end': end.strip(), 'limit_kbps': int(limit)})
+    return rules
+
+
+def format_schedule(rules):
+    """Format schedule rules for editing; inverse of parse_schedule"""
+    return ', '.join(f"{rule['start']}-{rule['end']}={rule['limit_kbps']}" for rule in rules or [])
+
+
+class _Flow:
+    """Token bucket and measured throughput of one job"""
+
+    def __init__(self, weight=1, cap=None):
+        self.weight = weight
+        self.cap = cap
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.last_seen = self.updated
+        self.rate = 0.0
+        self.window_bytes = 0
+        self.window_start = self.updated
+
+
+class BandwidthGovernor:
+    """Token-bucket limiter that splits a global rate between active jobs
+
+    Each job (flow) has its own bucket. The global limit is divided between
+    flows that reported progress recently, in proportion to their weights
+    (max-min fair: a flow with a lower cap than its share keeps only its cap
+    and the rest goes to the others). Flows block in consume() until their
+    bucket covers the bytes they reported. The limit is read through
+    limit_fn on every call, so changing it takes effect without restarting
+    jobs.
+    """
+
+    def __init__(self, limit_fn=lambda: 0):
+        self.limit_fn = limit_fn
+        self.throttled_seconds = 0.0
+        self.total_bytes = 0
+        self._flows = {}
+        self._lock = threading.Lock()
+
+    def set_flow(self, key, weight=None, cap=None):
+        """Create or update a flow; cap is in bytes/s (None or 0 for no cap)"""
+        with self._lock:
+            flow = self._flows.setdefault(key, _Flow())
+            if weight is not None:
+                flow.weight = max(weight, 0.001)
+            flow.cap = cap or None
+
+    def remove(self, key):
+        """Forget a finished flow"""
+        with self._lock:
+            self._flows.pop(key, None)
+
+    def consume(self, key, nbytes, cancelled=lambda: False):
+        """Account for bytes a flow received, sleeping while it is over its share"""
+        with self._lock:
+            flow = self._flows.setdefault(key, _Flow())
+            now = time.monotonic()
+            self._measure(flow, nbytes, now)
+            flow.last_seen = now
+            flow.tokens -= nbytes
+            self.total_bytes += nbytes
+        while not cancelled():
+            with self._lock:
+                now = time.monotonic()
+                share = self._allocate(now).get(key, 0)
+                if share:
+                    flow.tokens = min(flow.tokens + (now - flow.updated) * share, share * BURST_SECONDS)
+                else:
+                    flow.tokens = 0.0
+                flow.updated = now
+                if flow.tokens >= 0:
+                    return
+                delay = min(-flow.tokens / share, MAX_SLEEP)
+                self.throttled_seconds += delay
+                # Waiting still counts as activity, so the share is kept
+                flow.last_seen = now
+            time.sleep(delay)
+
+    def rate(self, key):
+        """Return the measured throughput of a flow in bytes/s"""
+        with self._lock:
+            flow = self._flows.get(key)
+            now = time.monotonic()
+            if flow is None or now - flow.last_seen > IDLE_SECONDS:
+                return 0.0
+            # Fold in the current window so flows stuck in a long wait slow down visibly
+            self._measure(flow, 0, now)
+            return flow.rate
+
+    def shares(self):
+        """Return the current allocation per active flow in bytes/s (0 = unlimited)"""
+        with self._lock:
+            return self._allocate(time.monotonic())
+
+    def stats(self):
+        """Return the limit, the active flows, the bytes received and the time spent throttling"""
+        with self._lock:
+            now = time.monotonic()
+            active = sum(1 for flow in self._flows.values() if now - flow.last_seen < IDLE_SECONDS)
+            return {'limit': self.limit_fn() or 0, 'active_flows': active, 'bytes': self.total_bytes,
+                    'throttled_seconds': round(self.throttled_seconds, 3)}
+
+    def _measure(self, flow, nbytes, now):
+        """Update the smoothed throughput of a flow (lock must be held)"""
+        flow.window_bytes += nbytes
+        elapsed = now - flow.window_start
+        if elapsed >= RATE_INTERVAL:
+            current = flow.window_bytes / elapsed
+            flow.rate = current if not flow.rate else (
+                RATE_SMOOTHING * current + (1 - RATE_SMOOTHING) * flow.rate)
+            flow.window_bytes = 0
+            flow.window_start = now
+
+    def _allocate(self, now):
+        """Split the limit between active flows by weight, honouring caps (lock must be held)"""
+        active = {key: flow for key, flow in self._flows.items() if now - flow.last_seen < IDLE_SECONDS}
+        remaining = self.limit_fn() or 0
+        if not remaining:
+            return {key: flow.cap or 0 for key, flow in active.items()}
+        shares = {}
+        while active:
+            total_weight = sum(flow.weight for flow in active.values())
+            capped = {key: flow for key, flow in active.items()
+                      if flow.cap and flow.cap <= remaining * flow.weight / total_weight}
+            if not capped:
+                for key, flow in active.items():
+                    shares[key] = remaining * flow.weight / total_weight
+                break
+            for key, flow in capped.items():
+                shares[key] = flow.cap
+                remaining -= flow.cap
+                del active[key]
+        return shares
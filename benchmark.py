@@ -0,0 +1,793 @@
+"""Offline benchmarks for YouTube Downloader Pro
+
+Runs against a local HTTP server, so no network access is needed:
+
+    python benchmark.py                 # all scenarios
+    python benchmark.py ydl-pool -n 50  # one scenario
+    python benchmark.py large-file playlist --latency 50 -o run.json
+    python benchmark.py small-jobs --compare run.json
+
+The engine scenarios use a stub extractor (benchmark_plugins) that gets its
+info dicts from the local server, so videos and playlists of any size can
+be generated.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.join(BASE_DIR, 'benchmark_plugins')
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """Serves deterministic synthetic media with HTTP range support"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Keep benchmark output clean"""
+
+    def do_HEAD(self):
+        """Send headers only"""
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        """Send headers and body"""
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        """Send the whole file or the requested byte range"""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        parsed = urlparse(self.path)
+        name = parsed.path.lstrip('/')
+        if name.startswith('api/'):
+            self._send_info(name, parse_qs(parsed.query), send_body)
+            return
+        size = self.server.files.get(name)
+        if size is None and name.startswith('media/'):
+            # media/<size>/<name>: a file of any size without registering it
+            size_text = name.split('/')[1]
+            size = int(size_text) if size_text.isdigit() else None
+        if size is None:
+            self.send_error(404)
+            return
+        with self.server.active_lock:
+            throttled = self.server.max_connections and self.server.active >= self.server.max_connections
+            if not throttled:
+                self.server.active += 1
+        if throttled:
+            # Like a CDN rate limiting a client that opens too many connections
+            self.server.throttled += 1
+            self.send_error(429)
+            return
+        try:
+            self._send_file(size, send_body)
+        finally:
+            with self.server.active_lock:
+                self.server.active -= 1
+
+    def _send_file(self, size, send_body):
+        """Send a synthetic file of the given size, or the requested byte range of it"""
+        start, end = 0, size - 1
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            first, _, last = range_header[6:].partition('-')
+            start = int(first) if first else 0
+            end = min(int(last), size - 1) if last else size - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if send_body:
+            self._send_bytes(start, end)
+
+    def _send_info(self, name, query, send_body):
+        """Send an info dict for the stub extractor (api/watch/<id> or api/playlist/<id>)"""
+        _, kind, item_id = (name.split('/') + ['', ''])[:3]
+        size = int(query.get('size', ['1048576'])[0])
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        if kind == 'watch':
+            info = {
+                'id': item_id,
+                'title': f"Benchmark {item_id}",
+                'duration': 60,
+                'thumbnails': [{'url': f"{base}/media/16384/{item_id}.jpg", 'width': 480, 'height': 360}],
+                'formats': [{
+                    'format_id': '18',
+                    'url': f"{base}/media/{size}/{item_id}.mp4",
+                    'ext': 'mp4',
+                    'vcodec': 'avc1.42001E',
+                    'acodec': 'mp4a.40.2',
+                    'height': 360,
+                    'filesize': size,
+                }],
+            }
+        elif kind == 'playlist':
+            # Paged like YouTube's continuations: ?page=N&page_size=M. The server's
+            # playlist_growth adds entries, at the front with ?order=newest like a channel
+            count = int(query.get('count', ['10'])[0]) + self.server.playlist_growth
+            page_size = int(query.get('page_size', [str(count)])[0])
+            first = int(query.get('page', ['0'])[0]) * page_size + 1
+            last = min(count, first + page_size - 1)
+            numbers = range(first, last + 1)
+            if query.get('order', [''])[0] == 'newest':
+                numbers = [count + 1 - i for i in numbers]
+            self.server.playlist_pages += 1
+            info = {
+                'id': item_id,
+                'title': f"Benchmark playlist {item_id}",
+                'entries': [{'id': f"{item_id}-{i}", 'title': f"Entry {i}",
+                             'url': f"{base}/watch/{item_id}-{i}?size={size}",
+                             'thumbnails': [{'url': f"{base}/media/16384/{item_id}-{i}.jpg"}]}
+                            for i in numbers],
+                'has_more': last < count,
+            }
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(info).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_bytes(self, start, end):
+        """Write synthetic bytes, throttled per connection if configured"""
+        chunk = self.server.chunk
+        rate = self.server.rate_per_connection
+        position = start
+        began = time.time()
+        while position <= end:
+            length = min(len(chunk), end - position + 1)
+            offset = position % len(chunk)
+            data = (chunk[offset:] + chunk[:offset])[:length]
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            position += length
+            # No sleep after the last chunk: the transfer is over and must not count as active
+            if rate and position <= end:
+                expected = (position - start) / rate
+                delay = expected - (time.time() - began)
+                if delay > 0:
+                    time.sleep(delay)
+
+
+class MediaServer:
+    """Local range-capable HTTP server serving synthetic files
+
+    latency (seconds) delays every response, rate_per_connection (bytes/s)
+    throttles every connection and max_connections answers media requests
+    beyond that many concurrent transfers with HTTP 429.
+    """
+
+    def __init__(self, files=None, rate_per_connection=0, latency=0.0, max_connections=0):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), MediaRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.files = dict(files or {'clip.mp4': 1024 * 1024})
+        self.httpd.chunk = bytes(range(256)) * 256
+        self.httpd.rate_per_connection = rate_per_connection
+        self.httpd.latency = latency
+        self.httpd.max_connections = max_connections
+        self.httpd.active = 0
+        self.httpd.throttled = 0
+        self.httpd.playlist_growth = 0
+        self.httpd.playlist_pages = 0
+        self.httpd.active_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, name):
+        """Return the URL of a served file"""
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/{name}"
+
+    def video_url(self, video_id, size):
+        """Return a stub extractor URL for a video of the given size"""
+        return self.url(f"watch/{video_id}?size={size}")
+
+    def playlist_url(self, playlist_id, count, size, order=""):
+        """Return a stub extractor URL for a playlist of count videos ('newest' lists the last first)"""
+        return self.url(f"playlist/{playlist_id}?count={count}&size={size}" + (f"&order={order}" if order else ""))
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _rss_bytes():
+    """Return the current resident set size of this process (Linux), or None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class ResourceMonitor:
+    """Measures wall time, CPU time and peak memory of a block
+
+    RSS is sampled on a thread where /proc is available; elsewhere the
+    process-wide peak from getrusage is reported. Child processes
+    (post-processing workers, ffmpeg) count once they have exited.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self._times = os.times()
+        self._started = time.perf_counter()
+        self.peak_rss = _rss_bytes() or 0
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.wall_seconds = time.perf_counter() - self._started
+        self._stop.set()
+        self._thread.join()
+        end = os.times()
+        self.cpu_seconds = (end.user - self._times.user) + (end.system - self._times.system)
+        self.children_cpu_seconds = ((end.children_user - self._times.children_user) +
+                                     (end.children_system - self._times.children_system))
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, _rss_bytes() or 0)
+
+    def result(self):
+        """Return the measurements as JSON-ready values"""
+        peak = self.peak_rss
+        if not peak and resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return {
+            'cpu_seconds': round(self.cpu_seconds, 3),
+            'children_cpu_seconds': round(self.children_cpu_seconds, 3),
+            'cpu_percent': round((self.cpu_seconds + self.children_cpu_seconds) / self.wall_seconds * 100, 1),
+            'peak_rss_mb': round(peak / 1024 / 1024, 1),
+        }
+
+
+class TimerRoot:
+    """Stands in for the Tk root so a ProgressBus flushes without a display"""
+
+    def after(self, ms, callback):
+        timer = threading.Timer(ms / 1000, callback)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def after_cancel(self, timer):
+        timer.cancel()
+
+
+def summarize(samples):
+    """Return latency statistics in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.mean(samples) * 1000, 3),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+    }
+
+
+def run_engine(submit, **settings):
+    """Run jobs on a DownloadEngine in a scratch directory and measure them
+
+    submit(downloader, progress_hook) queues the jobs and returns them.
+    Progress goes through a ProgressBus like in the GUI, so the callback
+    rates are what the UI would see.
+    """
+    import tempfile
+    import engine
+    from progress_bus import ProgressBus, progress_state
+
+    bus = ProgressBus()
+    first_bytes = {}
+    ttfb = []
+    lock = threading.Lock()
+
+    def progress_hook(job, d):
+        if d['status'] == 'downloading' and d.get('downloaded_bytes'):
+            name = d.get('tmpfilename') or d.get('filename')
+            with lock:
+                if name not in first_bytes:
+                    first_bytes[name] = time.perf_counter()
+                    # Elapsed at the first bytes of a file: request latency plus the first read
+                    ttfb.append(d.get('elapsed') or 0)
+        bus.publish(job.id, progress_state(d), lambda state: None)
+
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            options = engine.default_settings(os.path.join(tmp, 'out'))
+            options.update(settings)
+            downloader = engine.DownloadEngine(options)
+            bus.start(TimerRoot())
+            with ResourceMonitor() as usage:
+                started = time.perf_counter()
+                jobs = submit(downloader, progress_hook)
+                downloader.wait(jobs)
+            bus.stop()
+            adaptive = downloader.concurrency.snapshot() if downloader.concurrency else None
+            downloader.shutdown()
+        finally:
+            os.chdir(previous_dir)
+
+    elapsed = usage.wall_seconds
+    total_bytes = sum(job.bytes for job in jobs)
+    bus_stats = bus.stats()
+    result = {
+        'seconds': round(elapsed, 3),
+        'jobs': len(jobs),
+        'failed': sum(1 for job in jobs if job.state != engine.DONE),
+        'files': len(first_bytes),
+        'bytes': total_bytes,
+        'throughput_mb_s': round(total_bytes / elapsed / 1024 / 1024, 2),
+        'first_byte_seconds': round(min(first_bytes.values()) - started, 3) if first_bytes else None,
+        'ttfb': summarize(ttfb) if ttfb else None,
+        'progress_callbacks_per_second': round(bus_stats['published'] / elapsed, 1),
+        'ui_updates_per_second': round(bus_stats['delivered'] / elapsed, 1),
+    }
+    result.update(usage.result())
+    if adaptive:
+        result['workers'] = adaptive['workers']
+        result['decisions'] = [f"{d['from']}->{d['to']} {d['reason']}" for d in adaptive['decisions']]
+    return result
+
+
+def bench_large_file(args):
+    """One large file through the engine (extraction, segmented download, archive)"""
+    size = 256 * 1024 * 1024
+    with MediaServer(rate_per_connection=args.rate * 1024 * 1024, latency=args.latency / 1000) as server:
+        return run_engine(lambda downloader, hook: [
+            downloader.submit_video(server.video_url('large', size), progress_hook=hook)])
+
+
+def bench_playlist(args):
+    """A playlist of small videos expanded and downloaded as child jobs"""
+    size = 256 * 1024
+    with MediaServer(rate_per_connection=args.rate * 1024 * 1024, latency=args.latency / 1000) as server:
+        return run_engine(lambda downloader, hook: [
+            downloader.submit_playlist(server.playlist_url('bench', args.playlist_size, size),
+                                       progress_hook=hook)])
+
+
+def bench_subscription(args):
+    """Incremental sync of a newest-first channel that gained 20 videos since the last sync
+
+    The first sync lists and downloads the whole channel; the second one
+    should fetch only the first page and download just the new videos.
+    """
+    import tempfile
+    import engine
+
+    size = 16 * 1024
+    results = {}
+    previous_dir = os.getcwd()
+    with MediaServer(rate_per_connection=args.rate * 1024 * 1024, latency=args.latency / 1000) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            downloader = engine.DownloadEngine(engine.default_settings(os.path.join(tmp, 'out')))
+            subscription_id = downloader.subscribe(server.playlist_url('channel', args.playlist_size, size,
+                                                                       order='newest'))
+            for run, growth in (('initial', 0), ('incremental', 20), ('unchanged', 20)):
+                server.httpd.playlist_growth = growth
+                server.httpd.playlist_pages = 0
+                job = downloader.sync_subscription(subscription_id)
+                downloader.wait([job])
+                summary = job.sync.summary
+                results[run] = {key: summary[key] for key in
+                                ('checked', 'new', 'downloaded', 'failed', 'enumerate_seconds',
+                                 'download_seconds')}
+                results[run]['pages'] = server.httpd.playlist_pages
+            downloader.shutdown()
+        finally:
+            os.chdir(previous_dir)
+    return results
+
+
+def bench_daemon(args):
+    """Jobs submitted to the daemon's API over loopback and followed on its event stream
+
+    Measures request latency, the time until the event stream reports every
+    job finished, the event rate a client sees and how long a cancelled
+    download takes to stop.
+    """
+    import tempfile
+    import engine
+    from daemon import DaemonServer, DownloadDaemon
+    from daemon_client import DaemonClient
+
+    size = 64 * 1024
+    count = args.iterations * 5
+    events = []
+    finished = {}
+    all_finished = threading.Event()
+    previous_dir = os.getcwd()
+    with MediaServer(rate_per_connection=args.rate * 1024 * 1024, latency=args.latency / 1000) as server, \
+            MediaServer(rate_per_connection=1024 * 1024) as slow, tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            downloader = engine.DownloadEngine(engine.default_settings(os.path.join(tmp, 'out')))
+            api = DaemonServer(DownloadDaemon(downloader), 0).start()
+            client = DaemonClient(api.url)
+
+            def listen():
+                for event, data in client.events(hz=15):
+                    events.append(event)
+                    if event == 'state' and data['job']['state'] in (engine.DONE, engine.FAILED):
+                        finished[data['job']['id']] = time.perf_counter()
+                        if len(finished) == count + 1:
+                            all_finished.set()
+
+            threading.Thread(target=listen, daemon=True).start()
+            # The stream's first event ('jobs') shows it is connected
+            while not events:
+                time.sleep(0.01)
+            latencies = []
+            started = time.perf_counter()
+            for i in range(count):
+                before = time.perf_counter()
+                client.submit('video', server.video_url(f'daemon{i}', size))
+                latencies.append(time.perf_counter() - before)
+            submitted = time.perf_counter() - started
+            # A 1 GB download at 1 MB/s per connection only ends by being cancelled
+            job = client.submit('video', slow.video_url('cancelled', 1024 * 1024 * 1024), priority='high')
+            while client.job(job['id'])['progress'] is None:
+                time.sleep(0.05)
+            cancelled_at = time.perf_counter()
+            client.cancel(job['id'])
+            all_finished.wait(60)
+            stats = client.stats()
+            elapsed = time.perf_counter() - started
+            api.stop()
+            downloader.shutdown()
+        finally:
+            os.chdir(previous_dir)
+    return {
+        'jobs': count,
+        'submit': summarize(latencies),
+        'submit_seconds': round(submitted, 3),
+        'all_finished_seconds': round(max(finished.values()) - started, 3) if finished else None,
+        'done': stats['jobs'][engine.DONE],
+        'failed': stats['jobs'][engine.FAILED],
+        'cancel_seconds': round(finished[job['id']] - cancelled_at, 3) if job['id'] in finished else None,
+        'events': len(events),
+        'events_per_second': round(len(events) / elapsed, 1),
+    }
+
+
+def bench_adaptive(args):
+    """Fixed versus adaptive concurrency against a server that allows 6 transfers and 1 MB/s each
+
+    A seventh concurrent transfer gets HTTP 429, so the best fixed setting
+    is 6; the adaptive controller starts at 2 with a ceiling of 10.
+    """
+    size = 2 * 1024 * 1024
+    count = args.iterations * 3
+    results = {'allowed_connections': 6}
+    modes = (('fixed_2', {'concurrent_downloads': 2}),
+             ('fixed_10', {'concurrent_downloads': 10}),
+             ('adaptive', {'concurrent_downloads': 2, 'adaptive_concurrency': True,
+                           'max_concurrent_downloads': 10, 'adaptive_interval': 1}))
+    for mode, settings in modes:
+        with MediaServer(rate_per_connection=1024 * 1024, latency=args.latency / 1000,
+                         max_connections=6) as server:
+            results[mode] = run_engine(lambda downloader, hook: [
+                downloader.submit_video(server.video_url(f'{mode}{i}', size), progress_hook=hook)
+                for i in range(count)], connections_per_download=1, **settings)
+            results[mode]['http_429'] = server.httpd.throttled
+    return results
+
+
+def bench_small_jobs(args):
+    """Many independent single-video jobs of 64 KB each"""
+    size = 64 * 1024
+    count = args.iterations * 10
+    with MediaServer(rate_per_connection=args.rate * 1024 * 1024, latency=args.latency / 1000) as server:
+        return run_engine(lambda downloader, hook: [
+            downloader.submit_video(server.video_url(f'small{i}', size), progress_hook=hook)
+            for i in range(count)])
+
+
+def bench_audio(args):
+    """Audio extraction with ffmpeg (MP3, metadata) on five 8 MB videos"""
+    from yt_dlp.postprocessor import FFmpegExtractAudioPP
+
+    if not FFmpegExtractAudioPP(None).available:
+        return {'skipped': 'ffmpeg not found'}
+    size = 8 * 1024 * 1024
+    with MediaServer(rate_per_connection=args.rate * 1024 * 1024, latency=args.latency / 1000) as server:
+        return run_engine(lambda downloader, hook: [
+            downloader.submit_audio(server.video_url(f'audio{i}', size), progress_hook=hook)
+            for i in range(5)])
+
+
+def bench_ydl_pool(args):
+    """Per-call YoutubeDL construction versus warm pooled instances"""
+    import yt_dlp
+    from ydl_pool import YDLPool, PROFILE_INFO
+
+    opts = {'quiet': True, 'no_warnings': True}
+    with MediaServer() as server:
+        url = server.url('clip.mp4')
+
+        cold = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            with yt_dlp.YoutubeDL(dict(opts)) as ydl:
+                ydl.extract_info(url, download=False)
+            cold.append(time.perf_counter() - started)
+
+        pool = YDLPool(yt_dlp.YoutubeDL)
+        with pool.acquire(PROFILE_INFO, opts) as ydl:
+            ydl.extract_info(url, download=False)
+        warm = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            with pool.acquire(PROFILE_INFO, opts) as ydl:
+                ydl.extract_info(url, download=False)
+            warm.append(time.perf_counter() - started)
+        pool.close()
+
+    cold_stats, warm_stats = summarize(cold), summarize(warm)
+    return {
+        'per_call_construction': cold_stats,
+        'pooled_warm': warm_stats,
+        'speedup': round(cold_stats['mean_ms'] / warm_stats['mean_ms'], 2),
+    }
+
+
+def bench_segmented(args):
+    """Single large file over 1..8 connections against a per-connection throttled server"""
+    import tempfile
+    from segmented_download import SegmentedYoutubeDL
+
+    size = 16 * 1024 * 1024
+    rate = 2 * 1024 * 1024
+    results = {'file_bytes': size, 'rate_per_connection': rate, 'connections': {}}
+    with MediaServer({'large.mp4': size}, rate_per_connection=rate) as server:
+        pattern = server.httpd.chunk
+        for connections in (1, 2, 4, 8):
+            with tempfile.TemporaryDirectory() as tmp:
+                opts = {'quiet': True, 'no_warnings': True, 'noprogress': True,
+                        'outtmpl': os.path.join(tmp, '%(title)s.%(ext)s'),
+                        'segmented_connections': connections}
+                started = time.perf_counter()
+                with SegmentedYoutubeDL(opts) as ydl:
+                    info = ydl.extract_info(server.url('large.mp4'))
+                elapsed = time.perf_counter() - started
+                with open(info['requested_downloads'][0]['filepath'], 'rb') as f:
+                    data = f.read()
+            intact = len(data) == size and all(
+                data[offset:offset + len(pattern)] == pattern[:len(data) - offset]
+                for offset in range(0, len(data), len(pattern)))
+            results['connections'][connections] = {
+                'seconds': round(elapsed, 3),
+                'throughput_mb_s': round(size / elapsed / 1024 / 1024, 2),
+                'intact': intact,
+            }
+    baseline = results['connections'][1]['seconds']
+    for entry in results['connections'].values():
+        entry['speedup'] = round(baseline / entry['seconds'], 2)
+    return results
+
+
+def bench_bandwidth(args):
+    """Three jobs under a 6 MB/s global limit (weights 2:1, one job capped), then 2 MB/s"""
+    import tempfile
+    import engine
+    from scheduler import PRIORITY_HIGH
+
+    size = 64 * 1024 * 1024
+    mb = 1024 * 1024
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, \
+            MediaServer({'a.mp4': size, 'b.mp4': size, 'c.mp4': size}) as server:
+        os.chdir(tmp)
+        try:
+            settings = engine.default_settings(os.path.join(tmp, 'out'))
+            settings['bandwidth_limit_kbps'] = 6 * 1024
+            downloader = engine.DownloadEngine(settings)
+            jobs = [downloader.submit_video(server.url('a.mp4'), priority=PRIORITY_HIGH),
+                    downloader.submit_video(server.url('b.mp4')),
+                    downloader.submit_video(server.url('c.mp4'), rate_limit=mb // 2)]
+            phases = {}
+            for name, limit in (('limit_6mb', 6), ('limit_2mb', 2)):
+                settings['bandwidth_limit_kbps'] = limit * 1024
+                time.sleep(3)  # settle
+                samples = []
+                for _ in range(8):
+                    time.sleep(0.5)
+                    samples.append([downloader.job_speed(job) for job in jobs])
+                mean = [statistics.mean(sample[i] for sample in samples) / mb for i in range(len(jobs))]
+                shares = downloader.bandwidth.shares()
+                expected = [shares.get(job.id, 0) / mb for job in jobs]
+                phases[name] = {
+                    'measured_mb_s': [round(value, 2) for value in mean],
+                    'allocated_mb_s': [round(value, 2) for value in expected],
+                    'total_mb_s': round(sum(mean), 2),
+                }
+            downloader.shutdown()
+        finally:
+            os.chdir(previous_dir)
+    return phases
+
+
+def bench_postprocess(args):
+    """Six downloads on one worker followed by 1 s of CPU-bound post-processing, inline versus pipelined
+
+    ffmpeg is not needed: an Exec postprocessor running a busy loop stands in
+    for transcoding.
+    """
+    import tempfile
+    import engine
+
+    size = 2 * 1024 * 1024
+    files = {f'clip{i}.mp4': size for i in range(6)}
+    previous_dir = os.getcwd()
+    results = {'files': len(files), 'file_bytes': size, 'postprocess_seconds': 1.0}
+    with tempfile.TemporaryDirectory() as tmp, \
+            MediaServer(files, rate_per_connection=size) as server:
+        os.chdir(tmp)
+        burn = os.path.join(tmp, 'burn.py')
+        with open(burn, 'w') as f:
+            f.write("import time\nend = time.time() + 1\nwhile time.time() < end:\n    pass\n")
+        try:
+            for mode, pipelined in (('inline', False), ('pipelined', True)):
+                # Separate working directories, so the second run does not find the first in the archive
+                os.makedirs(os.path.join(tmp, mode))
+                os.chdir(os.path.join(tmp, mode))
+                settings = engine.default_settings(os.path.join(tmp, mode, 'out'))
+                settings.update(concurrent_downloads=1, pipeline_postprocessing=pipelined)
+                downloader = engine.DownloadEngine(settings)
+                started = time.perf_counter()
+                jobs = []
+                for name in files:
+                    opts = engine.build_video_opts(settings['download_path'], 'best', 'mp4')
+                    opts['postprocessors'] = [{'key': 'Exec', 'when': 'after_move',
+                                               'exec_cmd': f'"{sys.executable}" "{burn}"'}]
+                    jobs.append(downloader._queue_video(server.url(name), opts, None, engine.PRIORITY_NORMAL))
+                while not all(job.is_finished() for job in jobs):
+                    time.sleep(0.05)
+                elapsed = time.perf_counter() - started
+                results[mode] = {
+                    'seconds': round(elapsed, 3),
+                    'failed': sum(1 for job in jobs if job.state != engine.DONE),
+                    'stages': downloader.stage_stats(),
+                }
+                downloader.shutdown()
+        finally:
+            os.chdir(previous_dir)
+    results['speedup'] = round(results['inline']['seconds'] / results['pipelined']['seconds'], 2)
+    return results
+
+
+SCENARIOS = {
+    'adaptive': bench_adaptive,
+    'audio': bench_audio,
+    'bandwidth': bench_bandwidth,
+    'daemon': bench_daemon,
+    'large-file': bench_large_file,
+    'playlist': bench_playlist,
+    'postprocess': bench_postprocess,
+    'segmented': bench_segmented,
+    'small-jobs': bench_small_jobs,
+    'subscription': bench_subscription,
+    'ydl-pool': bench_ydl_pool,
+}
+
+
+def environment():
+    """Describe the machine and code a run was made with"""
+    import yt_dlp.version
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'commit': commit,
+    }
+
+
+def _numbers(value, prefix=''):
+    """Yield (path, number) for every numeric leaf of a result"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _numbers(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(previous, current):
+    """Return lines describing how each metric changed between two runs"""
+    before = dict(_numbers(previous.get('scenarios', {})))
+    lines = []
+    for path, value in _numbers(current.get('scenarios', {})):
+        old = before.get(path)
+        if old is None or old == value:
+            continue
+        change = f" ({(value - old) / old * 100:+.1f}%)" if old else ""
+        lines.append(f"{path}: {old} -> {value}{change}")
+    return lines
+
+
+def main(argv=None):
+    """Run the selected scenarios and print JSON results"""
+    parser = argparse.ArgumentParser(description="YouTube Downloader Pro benchmarks")
+    parser.add_argument("scenarios", nargs="*",
+                        help=f"Scenarios to run (default: all): {', '.join(sorted(SCENARIOS))}")
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("-o", "--output", help="Also write the JSON results to this file")
+    parser.add_argument("--latency", type=float, default=20,
+                        help="Server response latency in ms for the engine scenarios (default: 20)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Per-connection throttle in MB/s for the engine scenarios (default: none)")
+    parser.add_argument("--playlist-size", type=int, default=500)
+    parser.add_argument("--compare", metavar="FILE",
+                        help="Print how the results changed since an earlier JSON run (to stderr)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    sys.path.insert(0, BASE_DIR)
+    # yt-dlp loads extractor plugins from sys.path when the first YoutubeDL is created
+    sys.path.insert(0, PLUGIN_DIR)
+    results = {'timestamp': time.time(), 'environment': environment(), 'scenarios': {}}
+    for name in args.scenarios or sorted(SCENARIOS):
+        results['scenarios'][name] = SCENARIOS[name](args)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), results):
+                print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Stub extractor for the offline benchmarks
+
+benchmark.py puts benchmark_plugins on sys.path, so yt-dlp loads this as an
+extractor plugin. Info dicts come from the benchmark media server's /api
+endpoints, which generate videos and playlists of any size on demand.
+"""
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class BenchmarkIE(InfoExtractor):
+    IE_NAME = 'benchmark'
+    _VALID_URL = r'https?://127\.0\.0\.1:\d+/(?P<kind>watch|playlist)/(?P<id>[^/?#]+)'
+    _PAGE_SIZE = 100
+
+    def _real_extract(self, url):
+        kind, item_id = self._match_valid_url(url).group('kind', 'id')
+        api_url = url.replace(f'/{kind}/', f'/api/{kind}/', 1)
+        if kind == 'playlist':
+            # The first page comes with the playlist; later pages are fetched lazily
+            first_page = self._download_page(api_url, item_id, 0)
+            return self.playlist_result(self._entries(api_url, item_id, first_page),
+                                        first_page['id'], first_page.get('title'))
+        return self._download_json(api_url, item_id, note=False)
+
+    def _download_page(self, api_url, item_id, page):
+        return self._download_json(api_url, item_id, note=False,
+                                   query={'page': page, 'page_size': self._PAGE_SIZE})
+
+    def _entries(self, api_url, item_id, page_info):
+        page = 0
+        while True:
+            for entry in page_info['entries']:
+                yield self.url_result(entry['url'], BenchmarkIE, entry['id'], entry.get('title'),
+                                      thumbnails=entry.get('thumbnails'))
+            if not page_info.get('has_more'):
+                return
+            page += 1
+            page_info = self._download_page(api_url, item_id, page)
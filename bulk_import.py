@@ -0,0 +1,152 @@
+"""Streaming import of large URL lists into the download queue"""
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import QUEUED, DONE, FAILED
+from url_utils import URL_IN_TEXT_RE, canonical_key, canonical_url, parse_youtube_url
+
+MAX_IN_FLIGHT = 4
+MAX_QUEUED = 50
+
+
+def iter_urls(lines):
+    """Yield (url, key, is_playlist) for every URL in an iterable of lines
+
+    Blank lines and lines starting with # are skipped; a line may hold
+    several URLs. YouTube URLs are rewritten to their canonical form, so
+    the same video pasted in different shapes has one key.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        for match in URL_IN_TEXT_RE.finditer(line):
+            url = match.group(0).rstrip('.,;:!?)]}>"\'')
+            video_id, playlist_id = parse_youtube_url(url)
+            if video_id or playlist_id:
+                url = canonical_url(video_id, playlist_id)
+            elif not url.lower().startswith(('http://', 'https://')):
+                continue
+            yield url, canonical_key(url), bool(playlist_id and not video_id)
+
+
+class BulkImport:
+    """Reads a URL list lazily and queues each URL once its metadata is resolved
+
+    resolve(url) extracts a video's metadata (into the metadata cache, so
+    the download does not extract it again) and submit(url, is_playlist)
+    queues the job. Up to max_in_flight extractions run at once, and
+    reading pauses while max_queued imported jobs are still waiting for a
+    worker, so neither the list nor its metadata is ever held in memory as
+    a whole. Playlists are queued without resolving; their job expands
+    them.
+    """
+
+    def __init__(self, lines, resolve, submit, max_in_flight=MAX_IN_FLIGHT, max_queued=MAX_QUEUED,
+                 on_update=None):
+        self.lines = lines
+        self.resolve = resolve
+        self.submit = submit
+        self.max_queued = max_queued
+        self.on_update = on_update
+        self.counts = {'read': 0, 'duplicates': 0, 'resolving': 0, 'queued': 0, 'failed': 0}
+        self.errors = collections.deque(maxlen=100)
+        self.jobs = []
+        self.done = threading.Event()
+        self._cancelled = threading.Event()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="bulk-resolve")
+        self._waiting = collections.deque()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="bulk-import", daemon=True)
+
+    def start(self):
+        """Start reading in the background"""
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop reading; URLs still being resolved are not queued"""
+        self._cancelled.set()
+
+    def wait(self, timeout=None):
+        """Block until every line has been read and resolved; returns False on timeout"""
+        return self.done.wait(timeout)
+
+    def stats(self):
+        """Return import counters plus the outcome of the queued downloads"""
+        with self._lock:
+            result = dict(self.counts)
+            jobs = list(self.jobs)
+        result['downloaded'] = sum(1 for job in jobs if job.state == DONE)
+        result['download_failed'] = sum(1 for job in jobs if job.state == FAILED)
+        result['done'] = self.done.is_set()
+        result['cancelled'] = self._cancelled.is_set()
+        return result
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self.counts[name] += delta
+        if self.on_update:
+            self.on_update(self)
+
+    def _run(self):
+        seen = set()
+        try:
+            for url, key, is_playlist in iter_urls(self.lines):
+                if self._cancelled.is_set():
+                    break
+                self._count('read')
+                if key in seen:
+                    self._count('duplicates')
+                    continue
+                seen.add(key)
+                if not self._wait_for_room():
+                    break
+                self._count('resolving')
+                self._executor.submit(self._resolve, url, is_playlist)
+        except Exception as e:
+            print(f"Error reading URL list: {e}")
+        finally:
+            close = getattr(self.lines, 'close', None)
+            if close:
+                close()
+            self._executor.shutdown(wait=True)
+            self.done.set()
+            if self.on_update:
+                self.on_update(self)
+
+    def _wait_for_room(self):
+        """Wait for a free extraction slot and room in the queue; False if cancelled"""
+        while not self._cancelled.is_set():
+            with self._lock:
+                while self._waiting and self._waiting[0].state != QUEUED:
+                    self._waiting.popleft()
+                full = len(self._waiting) >= self.max_queued
+            if not full and self._slots.acquire(timeout=0.5):
+                return True
+            if full:
+                self._cancelled.wait(0.5)
+        return False
+
+    def _resolve(self, url, is_playlist):
+        try:
+            if self._cancelled.is_set():
+                return
+            if not is_playlist:
+                self.resolve(url)
+            if self._cancelled.is_set():
+                return
+            job = self.submit(url, is_playlist)
+        except Exception as e:
+            self.errors.append((url, str(e)))
+            self._count('failed')
+        else:
+            with self._lock:
+                self.jobs.append(job)
+                self._waiting.append(job)
+            self._count('queued')
+        finally:
+            self._slots.release()
+            self._count('resolving', -1)
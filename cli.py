@@ -0,0 +1,322 @@
+"""Command line batch mode for YouTube Downloader Pro (no GUI required)"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+import engine
+from scheduler import DONE, FAILED
+from subscriptions import format_summary
+
+
+class ProgressPrinter:
+    """Prints job state changes and throttled progress lines"""
+
+    def __init__(self, interval=1.0, speed_of=None):
+        self.interval = interval
+        self.speed_of = speed_of
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def on_job_state(self, job):
+        """Print a line whenever a job changes state"""
+        if job.parent is not None and job.state != FAILED:
+            return
+        if job.state == DONE:
+            self._print(f"[{job.id}] done: {job.result}")
+        elif job.state == FAILED:
+            self._print(f"[{job.id}] failed: {job.error}")
+        else:
+            self._print(f"[{job.id}] {job.state}: {job.name}")
+
+    def on_progress(self, job, d):
+        """Print download progress at most once per interval per job"""
+        if d['status'] == 'retrying':
+            self._print(f"[{job.id}] retrying in {d['retry_in']:.0f}s ({d['reason']}, attempt {d['attempt']})")
+            return
+        if d['status'] != 'downloading':
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._last.get(job.id, 0) < self.interval:
+                return
+            self._last[job.id] = now
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        done = d.get('downloaded_bytes', 0)
+        percent = f"{done / total * 100:5.1f}%" if total else "  ?  "
+        item = ""
+        if job.kind == "Playlist":
+            progress = job.progress.snapshot()
+            percent = f"{progress['fraction'] * 100:5.1f}%"
+            more = "+" if progress['expanding'] else ""
+            item = f" {progress['done'] + progress['failed']}/{progress['total']}{more} videos"
+        speed = f" {self.speed_of(job) / 1024 / 1024:.2f}MB/s" if self.speed_of else ""
+        self._print(f"[{job.id}] {percent}{item} {done // 1024 // 1024}MB{speed}")
+
+    def _print(self, text):
+        """Print without interleaving output from worker threads"""
+        with self._lock:
+            print(text, flush=True)
+
+
+def build_parser():
+    """Build the argument parser"""
+    parser = argparse.ArgumentParser(description="YouTube Downloader Pro batch mode")
+    parser.add_argument("-o", "--output", help="Download directory (defaults to the saved setting)")
+    parser.add_argument("-j", "--concurrent", type=int, help="Maximum concurrent downloads")
+    parser.add_argument("-a", "--adaptive", type=int, metavar="MAX",
+                        help="Adjust concurrent downloads automatically (AIMD), starting from -j, up to MAX")
+    parser.add_argument("-c", "--connections", type=int,
+                        help="Connections per download (fragments or byte ranges)")
+    parser.add_argument("-l", "--limit", type=int, help="Global bandwidth limit in KB/s (0 = unlimited)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show yt-dlp output")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics and job spans on 127.0.0.1:PORT")
+    parser.add_argument("--spans", metavar="FILE", help="Write per-job timing spans as JSON lines when done")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    video = sub.add_parser("video", help="Download single videos")
+    video.add_argument("urls", nargs="*")
+    video.add_argument("-i", "--input", metavar="FILE",
+                       help="Also import URLs from FILE, one or more per line ('-' reads stdin)")
+    video.add_argument("--quality", default="best",
+                       choices=["best", "worst", "1080p", "720p", "480p", "360p"])
+    video.add_argument("--format", default="mp4", choices=["mp4", "webm", "mkv"])
+
+    playlist = sub.add_parser("playlist", help="Download playlists")
+    playlist.add_argument("urls", nargs="+")
+    playlist.add_argument("--start", default="", help="First item (1-based)")
+    playlist.add_argument("--end", default="", help="Last item")
+    playlist.add_argument("--audio-only", action="store_true")
+    playlist.add_argument("--quality", default="best", choices=["best", "worst", "1080p", "720p"])
+
+    audio = sub.add_parser("audio", help="Extract audio from videos or playlists")
+    audio.add_argument("urls", nargs="*")
+    audio.add_argument("-i", "--input", metavar="FILE",
+                       help="Also import URLs from FILE, one or more per line ('-' reads stdin)")
+    audio.add_argument("--format", default="mp3", choices=["mp3", "m4a", "wav", "flac"])
+    audio.add_argument("--quality", default="best", choices=list(engine.AUDIO_QUALITY_MAP))
+    audio.add_argument("--no-metadata", action="store_true")
+    audio.add_argument("--thumbnail", action="store_true")
+
+    sub.add_parser("resume", help="Resume downloads interrupted by a crash or shutdown")
+
+    subscribe = sub.add_parser("subscribe", help="Save channel or playlist subscriptions")
+    subscribe.add_argument("urls", nargs="+")
+    subscribe.add_argument("--audio-only", action="store_true")
+    subscribe.add_argument("--quality", default="best", choices=["best", "worst", "1080p", "720p"])
+    subscribe.add_argument("--every", type=int, default=0, metavar="MINUTES",
+                           help="Sync automatically every MINUTES while 'sync --watch' runs")
+
+    unsubscribe = sub.add_parser("unsubscribe", help="Remove subscriptions")
+    unsubscribe.add_argument("ids", nargs="+", type=int)
+
+    sub.add_parser("subscriptions", help="List subscriptions and their last sync")
+
+    sync = sub.add_parser("sync", help="Download what subscriptions gained since their last sync")
+    sync.add_argument("ids", nargs="*", type=int, help="Subscriptions to sync (default: all)")
+    sync.add_argument("--watch", action="store_true",
+                      help="Keep running and sync subscriptions whenever their interval is due")
+
+    daemon = sub.add_parser("daemon", help="Run downloads behind a JSON API on 127.0.0.1 until stopped")
+    daemon.add_argument("--port", type=int, help="Port to listen on (defaults to the daemon_port setting)")
+    daemon.add_argument("--token", default=os.environ.get("YTDL_DAEMON_TOKEN", ""),
+                        help="Require 'Authorization: Bearer TOKEN' on every request "
+                             "(defaults to $YTDL_DAEMON_TOKEN)")
+
+    return parser
+
+
+def main(argv=None):
+    """Run the requested downloads and return a process exit code"""
+    args = build_parser().parse_args(argv)
+
+    settings = engine.load_settings()
+    if args.output:
+        settings["download_path"] = args.output
+    if args.concurrent:
+        settings["concurrent_downloads"] = args.concurrent
+    if args.adaptive:
+        settings["adaptive_concurrency"] = True
+        settings["max_concurrent_downloads"] = args.adaptive
+    if args.limit is not None:
+        settings["bandwidth_limit_kbps"] = args.limit
+    if args.connections:
+        settings["connections_per_download"] = args.connections
+    if args.metrics_port is not None:
+        settings["metrics_port"] = args.metrics_port
+
+    if args.command in ("subscribe", "unsubscribe", "subscriptions"):
+        return manage_subscriptions(args, settings)
+    if args.command == "daemon":
+        return serve_daemon(args, settings)
+
+    input_file = getattr(args, 'input', None)
+    if args.command in ("video", "audio") and not args.urls and not input_file:
+        build_parser().error("give URLs or --input FILE")
+
+    printer = ProgressPrinter()
+    downloader = engine.DownloadEngine(settings, on_job_state=printer.on_job_state,
+                                       quiet=not args.verbose)
+    printer.speed_of = downloader.job_speed
+
+    jobs = []
+    sync_started = time.time()
+    if args.command == "sync":
+        if args.watch:
+            return watch_subscriptions(downloader, printer)
+        jobs = downloader.sync_subscriptions(args.ids or None, progress_hook=printer.on_progress)
+    elif args.command == "resume":
+        for entry in downloader.pending_jobs():
+            partial = f" ({entry['partial_bytes'] // 1024 // 1024}MB partial)" if entry['partial_bytes'] else ""
+            print(f"Resuming {entry['kind'].lower()}: {entry['url']}{partial}")
+            jobs.append(downloader.resume(entry, progress_hook=printer.on_progress))
+    for url in getattr(args, 'urls', []):
+        if args.command == "video":
+            job = downloader.submit_video(url, args.quality, args.format,
+                                          progress_hook=printer.on_progress)
+        elif args.command == "playlist":
+            job = downloader.submit_playlist(url, args.start, args.end, args.audio_only, args.quality,
+                                             progress_hook=printer.on_progress)
+        else:
+            job = downloader.submit_audio(url, args.format, args.quality, not args.no_metadata,
+                                          args.thumbnail, progress_hook=printer.on_progress)
+        jobs.append(job)
+
+    importer = None
+    if input_file:
+        if input_file == "-":
+            lines = (line for line in sys.stdin)
+        else:
+            lines = open(input_file, encoding="utf-8", errors="replace")
+        if args.command == "video":
+            importer = downloader.import_urls(lines, "Video", args.quality, args.format,
+                                              progress_hook=printer.on_progress)
+        else:
+            importer = downloader.import_urls(lines, "Audio", args.quality, audio_format=args.format,
+                                              embed_metadata=not args.no_metadata,
+                                              embed_thumbnail=args.thumbnail,
+                                              progress_hook=printer.on_progress)
+
+    try:
+        if importer:
+            importer.wait()
+            jobs.extend(importer.jobs)
+        downloader.wait(jobs)
+    except KeyboardInterrupt:
+        if importer:
+            importer.cancel()
+        print("Interrupted; run 'resume' to continue unfinished downloads")
+        return 130
+    finally:
+        downloader.shutdown()
+
+    if args.spans:
+        with open(args.spans, 'w') as f:
+            f.write(downloader.spans.json_lines())
+
+    if importer:
+        counts = importer.stats()
+        print(f"Imported {counts['queued']} of {counts['read']} URLs "
+              f"({counts['duplicates']} duplicates, {counts['failed']} could not be resolved)")
+        for url, error in importer.errors:
+            print(f"  {url}: {error}")
+    if args.command == "sync":
+        print_sync_summary(jobs, time.time() - sync_started)
+    failed = [job for job in jobs if job.state == FAILED]
+    print(f"Finished: {len(jobs) - len(failed)} succeeded, {len(failed)} failed")
+    if args.verbose:
+        for name, stage in downloader.stage_stats().items():
+            print(f"{name}: {stage['completed']} done, {stage['failed']} failed, "
+                  f"avg wait {stage['mean_wait_seconds']}s, avg busy {stage['mean_busy_seconds']}s, "
+                  f"max queued {stage['max_queued']}")
+    return 1 if failed else 0
+
+
+def manage_subscriptions(args, settings):
+    """Add, remove or list subscriptions without starting the download engine"""
+    from subscriptions import SubscriptionStore
+
+    store = SubscriptionStore(engine.SUBSCRIPTIONS_FILE)
+    if args.command == "subscribe":
+        for url in args.urls:
+            subscription_id = store.add(url, args.audio_only, args.quality, args.every)
+            print(f"Subscribed [{subscription_id}] {url}")
+    elif args.command == "unsubscribe":
+        for subscription_id in args.ids:
+            store.remove(subscription_id)
+            print(f"Unsubscribed [{subscription_id}]")
+    else:
+        for subscription in store.all():
+            every = f", every {subscription['interval_minutes']} min" if subscription['interval_minutes'] else ""
+            print(f"[{subscription['id']}] {subscription['title'] or subscription['url']} "
+                  f"({subscription['entries']} known{every})")
+            if subscription['last_summary']:
+                print(f"    last sync: {format_summary(subscription['last_summary'])}")
+    return 0
+
+
+def print_sync_summary(jobs, elapsed):
+    """Print the totals of a sync run"""
+    # Each subscription's own line is printed by the engine as its sync finishes
+    summaries = [job.sync.summary for job in jobs if job.sync.summary]
+    print(f"Synced {len(summaries)} subscriptions in {elapsed:.1f}s: "
+          f"{sum(s['checked'] for s in summaries)} checked, {sum(s['new'] for s in summaries)} new; "
+          f"listing {sum(s['enumerate_seconds'] for s in summaries):.1f}s, "
+          f"downloading {sum(s['download_seconds'] for s in summaries):.1f}s")
+
+
+def watch_subscriptions(downloader, printer):
+    """Sync subscriptions on their intervals until interrupted"""
+    if not any(s['interval_minutes'] for s in downloader.subscriptions.all()):
+        print("No subscription has an interval; use 'subscribe URL --every MINUTES'")
+        return 1
+    downloader.start_subscription_timer(progress_hook=printer.on_progress)
+    print("Syncing subscriptions when due; press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Interrupted; run 'resume' to continue unfinished downloads")
+        return 130
+    finally:
+        downloader.shutdown()
+
+
+def serve_daemon(args, settings):
+    """Run the engine behind the JSON API until interrupted or terminated"""
+    from daemon import DaemonServer, DownloadDaemon
+
+    printer = ProgressPrinter()
+    downloader = engine.DownloadEngine(settings, on_job_state=printer.on_job_state, quiet=not args.verbose)
+    printer.speed_of = downloader.job_speed
+    daemon = DownloadDaemon(downloader)
+    port = args.port if args.port is not None else settings["daemon_port"]
+    try:
+        server = DaemonServer(daemon, port, args.token).start()
+    except OSError as e:
+        print(f"Could not listen on port {port}: {e}")
+        downloader.shutdown()
+        return 1
+    for job in daemon.resume_pending():
+        print(f"Resuming {job.kind.lower()}: {job.url}")
+    downloader.start_subscription_timer(progress_hook=daemon.progress_hook)
+    # Stopped as a service, it shuts down as cleanly as with Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Daemon listening on {server.url}; press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Stopping; unfinished downloads resume when the daemon starts again")
+        server.stop()
+        downloader.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
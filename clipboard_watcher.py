@@ -0,0 +1,100 @@
+"""Clipboard watcher that runs on the Tk main loop"""
+import tkinter as tk
+
+from url_utils import canonical_key, find_youtube_urls
+
+
+class ClipboardWatcher:
+    """Polls the clipboard from the Tk main loop with adaptive backoff
+
+    Polling starts at min_interval after a change and doubles while the
+    clipboard stays the same, up to max_interval (or unfocused_interval
+    while the window is in the background). Regaining focus triggers an
+    immediate check, which catches the common "copy in the browser, switch
+    back" flow. Each YouTube video/playlist is reported once per session.
+    """
+
+    def __init__(self, root, on_url, enabled=lambda: True, min_interval=500,
+                 max_interval=4000, unfocused_interval=2000):
+        self.root = root
+        self.on_url = on_url
+        self.enabled = enabled
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.unfocused_interval = unfocused_interval
+        self.interval = min_interval
+        self.seen = set()
+        self.polls = 0
+        self._last_text = None
+        self._after_id = None
+        self._focus_bind_id = None
+
+    def start(self):
+        """Start polling and listen for focus changes"""
+        self._focus_bind_id = self.root.bind("<FocusIn>", self._on_focus, add="+")
+        self._schedule(0)
+
+    def stop(self):
+        """Stop polling"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        if self._focus_bind_id is not None:
+            self.root.unbind("<FocusIn>", self._focus_bind_id)
+            self._focus_bind_id = None
+
+    def mark_seen(self, url):
+        """Suppress future reports of a URL the user already handled"""
+        self.seen.add(canonical_key(url))
+
+    def _on_focus(self, event=None):
+        """Check right away when the window regains focus"""
+        self.interval = self.min_interval
+        self._schedule(0)
+
+    def _schedule(self, delay):
+        """Arm the next poll, replacing any pending one"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        self._after_id = self.root.after(delay, self._poll)
+
+    def _is_focused(self):
+        """Return True if one of our windows has keyboard focus"""
+        try:
+            return self.root.focus_displayof() is not None
+        except (KeyError, tk.TclError):
+            return False
+
+    def _poll(self):
+        """Read the clipboard once and schedule the next poll"""
+        self._after_id = None
+        if not self.enabled():
+            self._schedule(self.max_interval)
+            return
+
+        self.polls += 1
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            text = ""
+
+        if text != self._last_text:
+            self._last_text = text
+            self.interval = self.min_interval
+            self._check_text(text)
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+
+        delay = self.interval
+        if not self._is_focused():
+            delay = max(delay, self.unfocused_interval)
+        self._schedule(delay)
+
+    def _check_text(self, text):
+        """Report each new YouTube URL in the clipboard text"""
+        for url, video_id, playlist_id in find_youtube_urls(text):
+            key = canonical_key(url)
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            self.on_url(url, video_id, playlist_id)
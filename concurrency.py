@@ -0,0 +1,173 @@
+"""Adaptive number of concurrent downloads (AIMD)
+
+Additive increase while aggregate throughput keeps improving and jobs are
+waiting for a worker; multiplicative decrease when the server throttles
+(see retry_policy.classify) or most jobs fail. An increase that brings no throughput gain
+is taken back, every decrease is followed by a few intervals without
+probing, and a worker count that was throttled is not tried again for a
+while.
+"""
+import collections
+import threading
+import time
+
+from retry_policy import THROTTLED, classify
+
+DECISION_HISTORY = 50
+MAX_AVOID_FACTOR = 16
+
+
+class AdaptiveConcurrency:
+    """AIMD controller that resizes the worker pool through apply(workers)
+
+    step() makes one decision from the throughput measured over the last
+    interval; start() runs it every interval on a daemon thread, sampling
+    (downloaded bytes so far, jobs waiting for a worker) through sample().
+    Throttling is acted on as soon as record() sees it, at most once per
+    interval, and the throttled worker count is not probed again for
+    avoid_intervals (doubling each time the same count is throttled again).
+    """
+
+    def __init__(self, apply, start, ceiling, floor=1, interval=5.0, min_gain=0.05, backoff=0.5,
+                 cooldown=3, avoid_intervals=12, on_decision=None):
+        self.apply = apply
+        self.ceiling = max(floor, int(ceiling))
+        self.floor = floor
+        self.workers = min(max(floor, int(start)), self.ceiling)
+        self.interval = interval
+        self.min_gain = min_gain
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.avoid_intervals = avoid_intervals
+        self.on_decision = on_decision
+        self.decisions = collections.deque(maxlen=DECISION_HISTORY)
+        self.throughput = 0.0
+        self._finished = self._errors = 0
+        self._probe_from = None
+        self._hold = 0
+        self._last_backoff = float('-inf')
+        self._throttled_at = None
+        self._avoid_until = 0.0
+        self._avoid_factor = 1
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, error=None):
+        """Count a finished download attempt; error is None for a successful one"""
+        with self._lock:
+            self._finished += 1
+            if error is None:
+                return
+            self._errors += 1
+            now = time.monotonic()
+            if classify(error) != THROTTLED or now - self._last_backoff < self.interval:
+                return
+            # Back off before the freed worker takes the next job, not at the next interval.
+            # Being throttled at the same count again doubles the time it is avoided
+            if self._throttled_at is not None and self.workers >= self._throttled_at:
+                self._avoid_factor = min(self._avoid_factor * 2, MAX_AVOID_FACTOR)
+            else:
+                self._avoid_factor = 1
+            self._throttled_at = self.workers
+            self._avoid_until = now + self.interval * self.avoid_intervals * self._avoid_factor
+            decision = self._back_off("throttled by the server", now)
+        self._publish(decision)
+
+    def step(self, throughput, waiting):
+        """Decide the worker count from the last interval's throughput (bytes/s)
+
+        waiting is the number of jobs queued for a worker. Returns the
+        decision dict when the count changed, else None.
+        """
+        with self._lock:
+            finished, errors = self._finished, self._errors
+            self._finished = self._errors = 0
+            self.throughput = throughput
+            now = time.monotonic()
+            decision = None
+            if now - self._last_backoff < self.interval:
+                pass
+            elif errors and errors * 2 >= finished:
+                decision = self._back_off(f"{errors} of {finished} downloads failed", now)
+            elif self._probe_from is not None and throughput < self._probe_from * (1 + self.min_gain):
+                decision = self._change(max(self.floor, self.workers - 1), "no throughput gain")
+                self._probe_from = None
+                self._hold = self.cooldown
+            elif self._hold:
+                self._hold -= 1
+            else:
+                ceiling = self.ceiling
+                if self._throttled_at is not None and now < self._avoid_until:
+                    ceiling = min(ceiling, self._throttled_at - 1)
+                if waiting and self.workers < ceiling:
+                    decision = self._change(self.workers + 1, "probing for more throughput")
+                    self._probe_from = throughput
+                else:
+                    # Nothing queued or at the ceiling; the last increase paid off
+                    self._probe_from = None
+            if decision:
+                decision['waiting'] = waiting
+        self._publish(decision)
+        return decision
+
+    def _back_off(self, reason, now):
+        """Cut the worker count multiplicatively (lock must be held)"""
+        self._last_backoff = now
+        self._probe_from = None
+        self._hold = self.cooldown
+        return self._change(max(self.floor, int(self.workers * self.backoff)), reason)
+
+    def _change(self, workers, reason):
+        """Record a new worker count (lock must be held); None if it is unchanged"""
+        if workers == self.workers:
+            return None
+        decision = {'time': time.time(), 'from': self.workers, 'to': workers, 'reason': reason,
+                    'throughput': round(self.throughput), 'waiting': None}
+        self.workers = workers
+        self.decisions.append(decision)
+        return decision
+
+    def _publish(self, decision):
+        if decision is None:
+            return
+        self.apply(decision['to'])
+        if self.on_decision:
+            self.on_decision(decision)
+
+    def set_ceiling(self, ceiling):
+        """Change the ceiling, shrinking the pool right away if it is above it"""
+        with self._lock:
+            self.ceiling = max(self.floor, int(ceiling))
+            shrink = self.workers > self.ceiling
+            if shrink:
+                self.workers = self.ceiling
+        if shrink:
+            self.apply(self.ceiling)
+
+    def snapshot(self):
+        """Return the current worker count, ceiling, throughput and recent decisions"""
+        with self._lock:
+            return {'workers': self.workers, 'ceiling': self.ceiling, 'throughput': self.throughput,
+                    'decisions': list(self.decisions)}
+
+    def start(self, sample):
+        """Make a decision every interval on a daemon thread"""
+        self.apply(self.workers)
+        self._thread = threading.Thread(target=self._run, args=(sample,), name="adaptive-concurrency",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop making decisions; the worker count stays where it is"""
+        self._stop.set()
+
+    def _run(self, sample):
+        last_bytes, waiting = sample()
+        last_time = time.monotonic()
+        while not self._stop.wait(self.interval):
+            total_bytes, waiting = sample()
+            now = time.monotonic()
+            self.step((total_bytes - last_bytes) / (now - last_time), waiting)
+            last_bytes, last_time = total_bytes, now
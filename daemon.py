@@ -0,0 +1,528 @@
+"""Headless download engine behind a localhost JSON API
+
+POST /jobs queues a video, playlist, audio or subscription sync job with
+the options of the matching GUI tab, GET /jobs and /jobs/<id> report jobs,
+DELETE /jobs/<id> cancels one, GET /events streams job states and progress
+as server-sent events and GET /stats returns engine statistics. GET
+/settings returns the engine's settings and PUT /settings changes some of
+them. /metrics and /spans are served as by the metrics endpoint.
+"""
+import hmac
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from engine import AUDIO_QUALITY_MAP, default_settings, save_settings
+from metrics_server import MetricsRequestHandler
+from scheduler import QUEUED, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+PRIORITIES = {'high': PRIORITY_HIGH, 'normal': PRIORITY_NORMAL, 'low': PRIORITY_LOW}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+JOB_KINDS = ["video", "playlist", "audio", "sync"]
+VIDEO_QUALITIES = ["best", "worst", "1080p", "720p", "480p", "360p"]
+VIDEO_FORMATS = ["mp4", "webm", "mkv"]
+PLAYLIST_QUALITIES = ["best", "worst", "1080p", "720p"]
+AUDIO_FORMATS = ["mp3", "m4a", "wav", "flac"]
+# Fields of a yt-dlp progress dict passed on to clients (see progress_bus.progress_state)
+PROGRESS_FIELDS = ('status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate', 'speed', 'eta',
+                   'filename', 'retry_in', 'attempt', 'reason')
+MAX_BODY_BYTES = 64 * 1024
+# Event streams send a comment this often when idle, so dead clients are noticed
+KEEPALIVE_SECONDS = 15
+EVENT_HZ = 4
+# Lowest (and highest) values the numeric settings may take; the others only need the right type
+SETTING_RANGES = {
+    'concurrent_downloads': (1, None),
+    'max_concurrent_downloads': (1, None),
+    'adaptive_interval': (1, None),
+    'connections_per_download': (1, None),
+    'bandwidth_limit_kbps': (0, None),
+    'metrics_port': (0, 65535),
+    'daemon_port': (0, 65535),
+    'postprocess_workers': (0, None),
+    'bulk_import_extractions': (1, None),
+    'bulk_import_queued': (1, None),
+    'cache_flat_ttl': (0, None),
+    'cache_full_ttl': (0, None),
+    'cache_max_mb': (0, None),
+    'thumbnail_cache_mb': (0, None),
+    'ui_refresh_hz': (1, 60),
+}
+SETTING_CHOICES = {
+    'theme': ["dark", "light"],
+    'default_video_quality': VIDEO_QUALITIES,
+    'default_audio_format': AUDIO_FORMATS,
+}
+TIME_OF_DAY = re.compile(r'([01]?\d|2[0-3]):[0-5]\d$')
+
+
+class EventQueue:
+    """Events waiting to be sent to one event-stream client
+
+    An event put under the key of a pending one replaces it, so progress
+    (keyed by job) is coalesced while state changes (unique keys) are all
+    delivered, in the order they happened.
+    """
+
+    def __init__(self):
+        self.closed = False
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def put(self, key, event, payload):
+        with self._cond:
+            self._pending.pop(key, None)
+            self._pending[key] = (event, payload)
+            self._cond.notify()
+
+    def take(self, timeout):
+        """Wait up to timeout for events and return all of them (empty on timeout or close)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or self.closed, timeout)
+            events = list(self._pending.values())
+            self._pending.clear()
+        return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class EventHub:
+    """Fans job events out to the connected event-stream clients"""
+
+    def __init__(self):
+        self.published = 0
+        self._clients = set()
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        queue = EventQueue()
+        with self._lock:
+            self._clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._clients.discard(queue)
+        queue.close()
+
+    def publish(self, event, payload, key=None):
+        """Queue an event for every client; events with the same key coalesce"""
+        with self._lock:
+            self.published += 1
+            key = key if key is not None else next(self._keys)
+            for queue in self._clients:
+                queue.put(key, event, payload)
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients), set()
+        for queue in clients:
+            queue.close()
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._clients), 'published': self.published}
+
+
+def progress_fields(d):
+    """Reduce a yt-dlp progress dict to the JSON-safe fields clients use"""
+    return {name: d.get(name) for name in PROGRESS_FIELDS if d.get(name) is not None}
+
+
+def choice(request, name, default, allowed):
+    """Return an option of a job request, checking it against the allowed values"""
+    value = request.get(name, default)
+    if value not in allowed:
+        raise ValueError(f"{name} must be one of {', '.join(allowed)}")
+    return value
+
+
+def flag(request, name, default):
+    """Return a boolean option of a job request"""
+    value = request.get(name, default)
+    if not isinstance(value, bool):
+        raise ValueError(f"{name} must be true or false")
+    return value
+
+
+def setting(name, value):
+    """Check a changed setting against the type of its default and the values it may take"""
+    defaults = default_settings()
+    if name not in defaults:
+        raise ValueError(f"Unknown setting {name}")
+    expected = type(defaults[name])
+    valid = isinstance(value, expected) or (expected is float and isinstance(value, int))
+    if not valid or (isinstance(value, bool) and expected is not bool):
+        raise ValueError(f"{name} must be of type {expected.__name__}")
+    low, high = SETTING_RANGES.get(name, (None, None))
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ValueError(f"{name} must be {low} or more" + (f" and at most {high}" if high is not None else ""))
+    if name in SETTING_CHOICES:
+        choice({name: value}, name, None, SETTING_CHOICES[name])
+    if name == 'download_path' and not value.strip():
+        raise ValueError("download_path must not be empty")
+    if name == 'bandwidth_schedule':
+        for rule in value:
+            schedule_rule(rule)
+    return value
+
+
+def schedule_rule(rule):
+    """Check a bandwidth schedule rule as parse_schedule builds them"""
+    if not isinstance(rule, dict) or set(rule) != {'start', 'end', 'limit_kbps'}:
+        raise ValueError("bandwidth_schedule rules must have start, end and limit_kbps")
+    for key in ('start', 'end'):
+        if not isinstance(rule[key], str) or not TIME_OF_DAY.match(rule[key]):
+            raise ValueError(f"bandwidth_schedule {key} must be a time of day as HH:MM")
+    limit = rule['limit_kbps']
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 0:
+        raise ValueError("bandwidth_schedule limit_kbps must be a whole number of KB/s")
+
+
+class DownloadDaemon:
+    """Connects a DownloadEngine to the API: submits jobs, serializes them and publishes their events
+
+    It takes over the engine's on_job_state listener and passes every
+    state change on to the listener the engine had.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.events = EventHub()
+        self.progress = {}
+        self._listener = engine.on_job_state
+        engine.on_job_state = self.on_job_state
+
+    def submit(self, request):
+        """Queue the job described by a POST /jobs body; raises ValueError for a bad request"""
+        engine = self.engine
+        kind = choice(request, 'kind', None, JOB_KINDS)
+        priority = PRIORITIES[choice(request, 'priority', 'normal', list(PRIORITIES))]
+        rate_limit = request.get('rate_limit_kbps') or 0
+        if not isinstance(rate_limit, int) or rate_limit < 0:
+            raise ValueError("rate_limit_kbps must be a whole number of KB/s")
+        rate_limit = rate_limit * 1024 or None
+        if kind == 'sync':
+            subscription_id = request.get('subscription_id')
+            if not isinstance(subscription_id, int):
+                raise ValueError("subscription_id is required")
+            return engine.sync_subscription(subscription_id, self.progress_hook, priority)
+        url = request.get('url')
+        if not isinstance(url, str) or not url.strip():
+            raise ValueError("url is required")
+        url = url.strip()
+        if kind == 'video':
+            return engine.submit_video(url, choice(request, 'quality', 'best', VIDEO_QUALITIES),
+                                       choice(request, 'format', 'mp4', VIDEO_FORMATS),
+                                       self.progress_hook, priority, rate_limit)
+        if kind == 'playlist':
+            start, end = str(request.get('start') or ''), str(request.get('end') or '')
+            if not (start.isdigit() or not start) or not (end.isdigit() or not end):
+                raise ValueError("start and end must be item numbers")
+            return engine.submit_playlist(url, start, end, flag(request, 'audio_only', False),
+                                          choice(request, 'quality', 'best', PLAYLIST_QUALITIES),
+                                          self.progress_hook, priority, rate_limit)
+        return engine.submit_audio(url, choice(request, 'format', 'mp3', AUDIO_FORMATS),
+                                   choice(request, 'quality', 'best', list(AUDIO_QUALITY_MAP)),
+                                   flag(request, 'embed_metadata', True),
+                                   flag(request, 'embed_thumbnail', False),
+                                   self.progress_hook, priority, rate_limit)
+
+    def update_settings(self, changes):
+        """Apply and save the settings of a PUT /settings body; raises ValueError for a bad one"""
+        settings = dict(self.engine.settings)
+        settings.update((name, setting(name, value)) for name, value in changes.items())
+        self.engine.apply_settings(settings)
+        save_settings(settings)
+        return settings
+
+    def resume_pending(self):
+        """Queue the jobs a previous run left in the journal; returns them"""
+        return [self.engine.resume(entry, progress_hook=self.progress_hook)
+                for entry in self.engine.pending_jobs()]
+
+    def jobs(self, state=None):
+        """Return the top-level jobs, oldest first"""
+        jobs = [job for job in list(self.engine.scheduler.jobs.values()) if job.parent is None]
+        return [job for job in jobs if state is None or job.state == state]
+
+    def job(self, job_id):
+        """Return a job (playlist entries included) by id, or None"""
+        return self.engine.scheduler.jobs.get(job_id)
+
+    def job_dict(self, job):
+        """JSON form of a job"""
+        data = {
+            'id': job.id,
+            'kind': job.kind,
+            'url': job.url,
+            'state': job.state,
+            'parent': job.parent.id if job.parent is not None else None,
+            'priority': PRIORITY_NAMES.get(job.priority, job.priority),
+            'queue_position': self.engine.scheduler.queue_position(job) if job.state == QUEUED else 0,
+            'result': job.result,
+            'error': str(job.error) if job.error is not None else None,
+            'error_kind': job.error_kind,
+            'cancelled': job.cancelled,
+            'attempts': job.attempts,
+            'skipped': job.skipped,
+            'file_path': job.file_path,
+            'bytes': job.bytes,
+            'expected_bytes': job.expected_bytes,
+            'speed': self.engine.job_speed(job) if job.parent is None else 0.0,
+            'progress': self.progress.get(job.id),
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+        if job.kind == "Playlist":
+            data['playlist'] = job.progress.snapshot()
+        if job.sync is not None:
+            data['sync'] = {'subscription_id': job.sync.subscription['id'], 'summary': job.sync.summary}
+        return data
+
+    def stats(self):
+        """Job counts and engine statistics for GET /stats"""
+        engine = self.engine
+        return {
+            'jobs': engine.scheduler.counts(),
+            'workers': engine.scheduler.max_workers,
+            'adaptive': engine.concurrency.snapshot() if engine.concurrency is not None else None,
+            'throughput': engine.throughput.snapshot(),
+            'bandwidth': engine.bandwidth.stats(),
+            'stages': engine.stage_stats(),
+            'hosts': engine.breaker.snapshot(),
+            'spans': engine.spans.summary(),
+            'metadata_cache': engine.metadata_cache.stats(),
+            'thumbnails': engine.thumbnails.stats(),
+            'events': self.events.stats(),
+        }
+
+    def progress_hook(self, job, d):
+        """Progress hook for the daemon's jobs; publishes coalesced progress events"""
+        if job.is_finished():
+            return
+        self.progress[job.id] = progress_fields(d)
+        self.events.publish('progress', job, key=('progress', job.id))
+
+    def progress_event(self, job):
+        """Payload of a progress event, built when it is sent so it carries the newest totals"""
+        data = {'id': job.id, 'progress': self.progress.get(job.id), 'speed': self.engine.job_speed(job),
+                'expected_bytes': job.expected_bytes}
+        if job.kind == "Playlist":
+            data['playlist'] = job.progress.snapshot()
+        return data
+
+    def on_job_state(self, job):
+        """Publish top-level state changes; a finished playlist entry updates its playlist's progress"""
+        if self._listener:
+            self._listener(job)
+        if job.parent is not None:
+            if job.is_finished():
+                self.events.publish('progress', job.parent, key=('progress', job.parent.id))
+            return
+        if job.is_finished():
+            # The final state says all there is; progress is only kept for unfinished jobs
+            self.progress.pop(job.id, None)
+        self.events.publish('state', {'job': self.job_dict(job), 'counts': self.engine.scheduler.counts(),
+                                      'workers': self.engine.scheduler.max_workers})
+
+
+class DaemonRequestHandler(MetricsRequestHandler):
+    """JSON API of a DownloadDaemon, plus the metrics endpoint's /metrics and /spans"""
+
+    def do_GET(self):
+        if not self._allowed():
+            return
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip('/')
+        daemon = self.server.daemon
+        if path == '/jobs':
+            state = parse_qs(parsed.query).get('state', [None])[0]
+            self._send_json(200, {'jobs': [daemon.job_dict(job) for job in daemon.jobs(state)]})
+        elif path.startswith('/jobs/'):
+            job = self._find_job(path)
+            if job is not None:
+                self._send_json(200, daemon.job_dict(job))
+        elif path == '/events':
+            hz = parse_qs(parsed.query).get('hz', [''])[0]
+            self._stream_events(min(max(int(hz), 1), 30) if hz.isdigit() else EVENT_HZ)
+        elif path == '/stats':
+            self._send_json(200, daemon.stats())
+        elif path == '/settings':
+            self._send_json(200, daemon.engine.settings)
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        if not self._allowed():
+            return
+        if urlparse(self.path).path.rstrip('/') != '/jobs':
+            self._send_json(404, {'error': "Not found"})
+            return
+        try:
+            request = self._read_json("the job")
+            if request is None:
+                return
+            job = self.server.daemon.submit(request)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(201, self.server.daemon.job_dict(job), {'Location': f"/jobs/{job.id}"})
+
+    def do_PUT(self):
+        if not self._allowed():
+            return
+        if urlparse(self.path).path.rstrip('/') != '/settings':
+            self._send_json(404, {'error': "Not found"})
+            return
+        try:
+            changes = self._read_json("the changed settings")
+            if changes is None:
+                return
+            settings = self.server.daemon.update_settings(changes)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(200, settings)
+
+    def do_DELETE(self):
+        if not self._allowed():
+            return
+        path = urlparse(self.path).path.rstrip('/')
+        if not path.startswith('/jobs/'):
+            self._send_json(404, {'error': "Not found"})
+            return
+        job = self._find_job(path)
+        if job is None:
+            return
+        daemon = self.server.daemon
+        if not daemon.engine.cancel(job):
+            self._send_json(409, {'error': "Job already finished", 'job': daemon.job_dict(job)})
+            return
+        self._send_json(200, daemon.job_dict(job))
+
+    def _allowed(self):
+        """Reject requests from web pages and, with a token set, requests without it"""
+        host = (self.headers.get('Host') or '').rsplit(':', 1)[0]
+        if self.headers.get('Origin') or host not in ('127.0.0.1', 'localhost'):
+            # Browsers send Origin (or a foreign Host after DNS rebinding); no page may drive the daemon
+            self._send_json(403, {'error': "Only local clients may use the API"})
+            return False
+        token = self.server.token
+        if token and not hmac.compare_digest(self.headers.get('Authorization', '').encode(),
+                                             f"Bearer {token}".encode()):
+            self._send_json(401, {'error': "Missing or wrong token"})
+            return False
+        return True
+
+    def _read_json(self, what):
+        """Return the request's JSON object; sends the error and returns None for an unusable request
+
+        A body that is not a JSON object raises ValueError.
+        """
+        if self.headers.get_content_type() != 'application/json':
+            self._send_json(415, {'error': f"Send {what} as application/json"})
+            return None
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            self._send_json(400, {'error': "Content-Length must be a byte count"})
+            return None
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {'error': "Request too large"})
+            return None
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(request, dict):
+            raise ValueError(f"Send {what} as a JSON object")
+        return request
+
+    def _find_job(self, path):
+        """Return the job named by /jobs/<id>, sending 404 if there is none"""
+        job_id = path[len('/jobs/'):]
+        job = self.server.daemon.job(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            self._send_json(404, {'error': f"No job {job_id}"})
+        return job
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, hz):
+        """Send events until the client disconnects; progress is sent at most hz times a second per job
+
+        The first event, 'jobs', lists every top-level job, so a client
+        needs no separate GET /jobs to catch up.
+        """
+        daemon = self.server.daemon
+        queue = daemon.events.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self._write_event('jobs', {'jobs': [daemon.job_dict(job) for job in daemon.jobs()],
+                                       'counts': daemon.engine.scheduler.counts(),
+                                       'workers': daemon.engine.scheduler.max_workers})
+            while not queue.closed:
+                events = queue.take(KEEPALIVE_SECONDS)
+                if not events and not queue.closed:
+                    self.wfile.write(b": keepalive\n\n")
+                for event, payload in events:
+                    self._write_event(event, daemon.progress_event(payload) if event == 'progress' else payload)
+                self.wfile.flush()
+                # Progress published meanwhile is coalesced into the next batch
+                time.sleep(1 / hz)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            daemon.events.unsubscribe(queue)
+
+    def _write_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+
+
+class DaemonServer:
+    """Serves a DownloadDaemon's API on 127.0.0.1 from a background thread"""
+
+    def __init__(self, daemon, port, token=""):
+        self.daemon = daemon
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), DaemonRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.daemon = daemon
+        self.httpd.engine = daemon.engine
+        self.httpd.token = token
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="daemon-server", daemon=True)
+
+    @property
+    def url(self):
+        """Base URL of the API"""
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        """Start serving"""
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Close the event streams, stop serving and close the socket"""
+        self.daemon.events.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
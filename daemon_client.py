@@ -0,0 +1,452 @@
+"""Client of the daemon's JSON API, and the engine stand-in the GUI uses to attach to a daemon"""
+import collections
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+from bulk_import import BulkImport
+from daemon import PRIORITY_NAMES
+from scheduler import QUEUED, RUNNING, DONE, FAILED, FINISHED_JOBS_KEPT, PRIORITY_NORMAL
+
+TOKEN_ENV = "YTDL_DAEMON_TOKEN"
+DEFAULT_URL = "http://127.0.0.1:8765"
+REQUEST_TIMEOUT = 10
+# Longer than the daemon's keepalive interval, so a silent stream means a dead daemon
+STREAM_TIMEOUT = 40
+RECONNECT_SECONDS = 2
+STATS_SECONDS = 1
+
+
+class DaemonError(Exception):
+    """The daemon rejected a request"""
+
+    def __init__(self, status, message):
+        super().__init__(f"{message} (HTTP {status})")
+        self.status = status
+
+
+class DaemonClient:
+    """Talks to a running daemon (see daemon.py) over its localhost API
+
+    token defaults to the YTDL_DAEMON_TOKEN environment variable.
+    Connection failures raise OSError; requests the daemon rejects raise
+    DaemonError.
+    """
+
+    def __init__(self, url=DEFAULT_URL, token=None):
+        self.url = url.rstrip('/')
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV, "")
+
+    def submit(self, kind, url=None, **options):
+        """Queue a job; options are those of POST /jobs (quality, format, start, ...). Returns the job"""
+        request = dict(options, kind=kind)
+        if url is not None:
+            request['url'] = url
+        return self._request('POST', '/jobs', request)
+
+    def jobs(self, state=None):
+        """Return the daemon's top-level jobs, optionally only those in one state"""
+        return self._request('GET', '/jobs' + (f"?state={state}" if state else ""))['jobs']
+
+    def job(self, job_id):
+        """Return one job"""
+        return self._request('GET', f"/jobs/{job_id}")
+
+    def cancel(self, job_id):
+        """Cancel a job; returns it, or None if it had already finished"""
+        try:
+            return self._request('DELETE', f"/jobs/{job_id}")
+        except DaemonError as e:
+            if e.status == 409:
+                return None
+            raise
+
+    def stats(self):
+        """Return job counts and engine statistics"""
+        return self._request('GET', '/stats')
+
+    def settings(self):
+        """Return the daemon's settings"""
+        return self._request('GET', '/settings')
+
+    def update_settings(self, changes):
+        """Change some of the daemon's settings; it applies and saves them. Returns all settings"""
+        return self._request('PUT', '/settings', changes)
+
+    def spans(self, limit=None):
+        """Return the daemon's newest spans as JSON lines"""
+        return self._read('GET', '/spans' + (f"?limit={limit}" if limit else "")).decode()
+
+    def events(self, hz=None):
+        """Yield (event, data) from the event stream until it ends
+
+        The first event is 'jobs' with every job; then come 'state' (a job
+        changed state) and 'progress' (coalesced, at most hz per second per job).
+        """
+        path = '/events' + (f"?hz={hz}" if hz else "")
+        with urllib.request.urlopen(self._build('GET', path), timeout=STREAM_TIMEOUT) as response:
+            event, data = None, []
+            for line in response:
+                line = line.decode().rstrip('\r\n')
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:'):
+                    data.append(line[5:].strip())
+                elif not line and data:
+                    yield event, json.loads('\n'.join(data))
+                    event, data = None, []
+
+    def _build(self, method, path, body=None):
+        headers = {'Authorization': f"Bearer {self.token}"} if self.token else {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        return urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+
+    def _request(self, method, path, body=None):
+        return json.loads(self._read(method, path, body))
+
+    def _read(self, method, path, body=None):
+        try:
+            with urllib.request.urlopen(self._build(method, path, body), timeout=REQUEST_TIMEOUT) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error') or e.reason
+            except ValueError:
+                message = e.reason
+            raise DaemonError(e.code, message) from None
+
+
+class RemoteProgress:
+    """Playlist totals of a remote job, read like PlaylistProgress"""
+
+    def __init__(self):
+        self.data = {'total': 0, 'done': 0, 'failed': 0, 'skipped': 0, 'expanding': False, 'active': 0,
+                     'fraction': 0.0, 'downloaded_bytes': 0, 'filenames': []}
+
+    def snapshot(self):
+        return dict(self.data)
+
+
+class RemoteSync:
+    """Subscription sync of a remote job; summary is set once it has finished"""
+
+    def __init__(self, data):
+        self.subscription_id = data['subscription_id']
+        self.summary = data['summary']
+
+
+class RemoteJob:
+    """A daemon job with the attributes the GUI reads from engine jobs"""
+
+    def __init__(self, data):
+        self.parent = None
+        self.progress = RemoteProgress()
+        self.progress_hook = None
+        self.tracked = False
+        self.imported = False
+        self.update(data)
+
+    def update(self, data):
+        """Take over the fields of the job's JSON form"""
+        self.id = data['id']
+        self.kind = data['kind']
+        self.name = self.url = data['url']
+        self.state = data['state']
+        self.queue_position = data['queue_position']
+        self.result = data['result']
+        self.error = data['error']
+        self.error_kind = data['error_kind']
+        self.cancelled = data['cancelled']
+        self.attempts = data['attempts']
+        self.skipped = data['skipped']
+        self.file_path = data['file_path']
+        self.bytes = data['bytes']
+        self.expected_bytes = data['expected_bytes']
+        self.speed = data['speed']
+        if data.get('playlist'):
+            self.progress.data = data['playlist']
+        self.sync = RemoteSync(data['sync']) if data.get('sync') else None
+
+    def is_finished(self):
+        """Return True once the job is done or failed"""
+        return self.state in (DONE, FAILED)
+
+    def __repr__(self):
+        return f"<RemoteJob {self.id} {self.kind} {self.state}>"
+
+
+class RemoteScheduler:
+    """Queue counters of the daemon's scheduler, as last reported on its event stream or by GET /stats"""
+
+    def __init__(self):
+        self.max_workers = 0
+        self._counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+
+    def update(self, counts, workers):
+        self._counts = counts
+        self.max_workers = workers
+
+    def counts(self):
+        return dict(self._counts)
+
+    def queue_position(self, job):
+        return job.queue_position if job.state == QUEUED else 0
+
+
+class RemoteSnapshot:
+    """One section of the daemon's statistics, read like the engine object it comes from"""
+
+    def __init__(self, engine, key):
+        self.engine = engine
+        self.key = key
+
+    def snapshot(self):
+        return self.engine.stats[self.key]
+
+
+class RemoteSpans:
+    """The daemon's spans, read like a SpanRecorder"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def summary(self):
+        return self.engine.stats['spans']
+
+    def json_lines(self, limit=None):
+        return self.engine.client.spans(limit)
+
+
+class RemoteEngine:
+    """Stand-in for DownloadEngine that runs jobs on a daemon (the GUI's --attach mode)
+
+    Jobs are submitted to and cancelled on the daemon; their state and
+    progress arrive over its event stream on a background thread and are
+    passed to on_job_state and the jobs' progress hooks, as the engine's
+    callbacks would be. Only jobs submitted here and subscription syncs
+    are reported to on_job_state. Settings are read from and applied on
+    the daemon, and its statistics are polled once a second. Metadata,
+    history, caches and subscriptions come from local, an
+    engine.MetadataEngine, which shares the daemon's files when both run in
+    the same directory.
+
+    Raises OSError if the daemon cannot be reached.
+    """
+
+    def __init__(self, client, local, on_job_state=None):
+        self.local = local
+        self.client = client
+        self.on_job_state = on_job_state
+        self.settings = client.settings()
+        self.stats = client.stats()
+        self.jobs = {}
+        self.syncs = {}
+        self.imports = []
+        self._finished = collections.deque()
+        self.scheduler = RemoteScheduler()
+        self.scheduler.update(self.stats['jobs'], self.stats['workers'])
+        self.throughput = RemoteSnapshot(self, 'throughput')
+        self.breaker = RemoteSnapshot(self, 'hosts')
+        self.spans = RemoteSpans(self)
+        # The daemon serves /metrics and /spans itself
+        self.metrics_server = client
+        self.connected = threading.Event()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._listen, name="daemon-events", daemon=True)
+        self._thread.start()
+        self._poller = threading.Thread(target=self._poll, name="daemon-stats", daemon=True)
+        self._poller.start()
+
+    def __getattr__(self, name):
+        return getattr(self.local, name)
+
+    @property
+    def download_path(self):
+        """The daemon's download directory"""
+        return self.settings["download_path"]
+
+    @property
+    def concurrency(self):
+        """The daemon's adaptive concurrency, or None when its worker count is fixed"""
+        return RemoteSnapshot(self, 'adaptive') if self.stats['adaptive'] is not None else None
+
+    def apply_settings(self, settings):
+        """Send the changed settings to the daemon, which applies and saves them"""
+        changes = {name: value for name, value in settings.items() if self.settings.get(name) != value}
+        if changes:
+            self.settings = self.client.update_settings(changes)
+            self.local.apply_settings(dict(self.settings))
+
+    def stage_stats(self):
+        """Return the daemon's download and post-processing stage statistics"""
+        return self.stats['stages']
+
+    def submit_video(self, url, quality="best", format_ext="mp4", progress_hook=None,
+                     priority=PRIORITY_NORMAL, rate_limit=None):
+        """Queue a single video download on the daemon"""
+        return self._submit(progress_hook, priority, rate_limit, kind='video', url=url, quality=quality,
+                            format=format_ext)
+
+    def submit_playlist(self, url, start_range="", end_range="", audio_only=False, quality="best",
+                        progress_hook=None, priority=PRIORITY_NORMAL, rate_limit=None):
+        """Queue a playlist on the daemon"""
+        return self._submit(progress_hook, priority, rate_limit, kind='playlist', url=url, start=start_range,
+                            end=end_range, audio_only=bool(audio_only), quality=quality)
+
+    def submit_audio(self, url, audio_format="mp3", quality="best", embed_metadata=True,
+                     embed_thumbnail=False, progress_hook=None, priority=PRIORITY_NORMAL, rate_limit=None):
+        """Queue an audio extraction on the daemon"""
+        return self._submit(progress_hook, priority, rate_limit, kind='audio', url=url, format=audio_format,
+                            quality=quality, embed_metadata=bool(embed_metadata),
+                            embed_thumbnail=bool(embed_thumbnail))
+
+    def sync_subscription(self, subscription_id, progress_hook=None, priority=PRIORITY_NORMAL):
+        """Sync a subscription on the daemon"""
+        return self._submit(progress_hook, priority, None, kind='sync', subscription_id=subscription_id)
+
+    def sync_subscriptions(self, subscription_ids=None, progress_hook=None, priority=PRIORITY_NORMAL):
+        """Sync several subscriptions (all by default) on the daemon; returns their jobs"""
+        if subscription_ids is None:
+            subscription_ids = [s['id'] for s in self.local.subscriptions.all()]
+        return [self.sync_subscription(i, progress_hook, priority) for i in subscription_ids]
+
+    def import_urls(self, lines, kind="Video", quality="best", format_ext="mp4", audio_format="mp3",
+                    embed_metadata=True, embed_thumbnail=False, progress_hook=None,
+                    priority=PRIORITY_NORMAL, on_update=None):
+        """Stream a URL list into the daemon's queue; the daemon extracts each video itself"""
+        def submit(url, is_playlist):
+            if is_playlist:
+                job = self.submit_playlist(url, audio_only=kind == "Audio", quality=quality,
+                                           progress_hook=progress_hook, priority=priority)
+            elif kind == "Audio":
+                job = self.submit_audio(url, audio_format, quality, embed_metadata, embed_thumbnail,
+                                        progress_hook, priority)
+            else:
+                job = self.submit_video(url, quality, format_ext, progress_hook, priority)
+            job.imported = True
+            return job
+
+        importer = BulkImport(lines, lambda url: None, submit, self.settings["bulk_import_extractions"],
+                              self.settings["bulk_import_queued"], on_update)
+        self.imports = [i for i in self.imports if not i.done.is_set()] + [importer]
+        return importer.start()
+
+    def cancel(self, job):
+        """Cancel a job on the daemon; returns False if it had already finished"""
+        return self.client.cancel(job.id) is not None
+
+    def job_speed(self, job):
+        """Return the job's throughput as last reported by the daemon"""
+        return job.speed
+
+    def pending_jobs(self):
+        """The daemon resumes its own unfinished jobs"""
+        return []
+
+    def discard_pending(self):
+        """The daemon's journal is left alone"""
+
+    def start_subscription_timer(self, progress_hook=None):
+        """The daemon syncs subscriptions on their intervals"""
+
+    def stop_subscription_timer(self):
+        """The daemon syncs subscriptions on their intervals"""
+
+    def shutdown(self, wait=True):
+        """Stop listening to the daemon and cancel imports still streaming; the daemon keeps running"""
+        self._stop.set()
+        for importer in self.imports:
+            importer.cancel()
+
+    def _submit(self, progress_hook, priority, rate_limit, **request):
+        data = self.client.submit(priority=PRIORITY_NAMES.get(priority, 'normal'),
+                                  rate_limit_kbps=(rate_limit or 0) // 1024, **request)
+        with self._lock:
+            job = self.jobs.get(data['id'])
+            if job is None:
+                job = self.jobs[data['id']] = RemoteJob(data)
+                if job.is_finished():
+                    self._drop_finished(job)
+            job.progress_hook = progress_hook
+            job.tracked = True
+            if job.sync is not None:
+                self.syncs[job.sync.subscription_id] = job
+        if job.state != QUEUED:
+            # The event stream got there first; report the state it saw
+            self._notify(job)
+        return job
+
+    def _listen(self):
+        """Follow the daemon's event stream, reconnecting whenever it drops"""
+        while not self._stop.is_set():
+            try:
+                for event, data in self.client.events():
+                    if self._stop.is_set():
+                        return
+                    self.connected.set()
+                    self._handle(event, data)
+            except (OSError, ValueError) as e:
+                if not self._stop.is_set():
+                    print(f"Lost the event stream of {self.client.url}: {e}; reconnecting")
+            self.connected.clear()
+            self._stop.wait(RECONNECT_SECONDS)
+
+    def _poll(self):
+        """Refresh the daemon's statistics; the last ones are kept while it cannot be reached"""
+        while not self._stop.wait(STATS_SECONDS):
+            try:
+                self.stats = self.client.stats()
+            except (OSError, ValueError, DaemonError):
+                continue
+            self.scheduler.update(self.stats['jobs'], self.stats['workers'])
+
+    def _handle(self, event, data):
+        if event == 'progress':
+            job = self.jobs.get(data['id'])
+            if job is None:
+                return
+            job.speed = data['speed']
+            job.expected_bytes = data['expected_bytes']
+            if data.get('playlist'):
+                job.progress.data = data['playlist']
+            if job.progress_hook and data['progress']:
+                job.progress_hook(job, data['progress'])
+            return
+        self.scheduler.update(data['counts'], data['workers'])
+        for job_data in data['jobs'] if event == 'jobs' else [data['job']]:
+            self._apply(job_data)
+
+    def _apply(self, data):
+        """Update the local copy of a job and report a state change"""
+        with self._lock:
+            job = self.jobs.get(data['id'])
+            changed = job is None or job.state != data['state']
+            if job is None:
+                job = self.jobs[data['id']] = RemoteJob(data)
+            else:
+                job.update(data)
+            if job.sync is not None:
+                self.syncs[job.sync.subscription_id] = job
+            if changed and job.is_finished():
+                self._drop_finished(job)
+        if changed and (job.tracked or job.sync is not None):
+            self._notify(job)
+
+    def _drop_finished(self, job):
+        """Remember a finished job, forgetting the oldest beyond FINISHED_JOBS_KEPT (lock must be held)"""
+        self._finished.append(job)
+        while len(self._finished) > FINISHED_JOBS_KEPT:
+            old = self._finished.popleft()
+            self.jobs.pop(old.id, None)
+            if old.sync is not None and self.syncs.get(old.sync.subscription_id) is old:
+                del self.syncs[old.sync.subscription_id]
+
+    def _notify(self, job):
+        if self.on_job_state:
+            self.on_job_state(job)
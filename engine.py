@@ -0,0 +1,1307 @@
+"""GUI-free download engine shared by the desktop app and the CLI"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from archive_index import ArchiveIndex, archive_id
+from bulk_import import BulkImport
+from concurrency import AdaptiveConcurrency
+from bandwidth import BandwidthGovernor, scheduled_limit
+from format_selection import FormatSelector, format_size, select_format
+from history_store import HistoryStore
+from job_journal import JobJournal, RUNNING as JOURNAL_RUNNING
+from job_spans import MARKER_STAGES, SpanRecorder, add_stage_markers
+from metadata_cache import MetadataCache, FLAT, FULL
+from metrics_server import MetricsServer
+from postprocess_pool import PostprocessPool, StageStats
+from retry_policy import CircuitBreaker, RetryPolicy, PERMANENT, THROTTLED, classify, host_key
+from stats_store import ThroughputStats, format_bytes
+from subscriptions import SubscriptionStore, SyncRun, format_summary
+from thumbnail_cache import ThumbnailCache, add_thumbnail_cache
+from scheduler import (DownloadScheduler, JobCancelled, JobInterrupted, QUEUED, RUNNING, DONE, FAILED,
+                       PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+from url_utils import canonical_key, parse_youtube_url
+from ydl_pool import YDLPool, PROFILE_INFO, PROFILE_FLAT, PROFILE_VIDEO, PROFILE_AUDIO
+
+yt_dlp = None
+_yt_dlp_lock = threading.Lock()
+
+
+def get_yt_dlp():
+    """Import yt-dlp on first use (installing it if missing) and return the module
+
+    The import takes a noticeable part of startup, so it is deferred until
+    something needs it; the GUI warms it up in the background.
+    """
+    global yt_dlp
+    if yt_dlp is not None:
+        return yt_dlp
+    with _yt_dlp_lock:
+        if yt_dlp is None:
+            # Try to import yt-dlp
+            try:
+                import yt_dlp as module
+            except ImportError:
+                print("yt-dlp not found. Installing...")
+                subprocess.check_call([sys.executable, "-m", "pip", "install", "yt-dlp"])
+                import yt_dlp as module
+            yt_dlp = module
+    return yt_dlp
+
+
+def create_ydl(opts, thumbnails=None):
+    """Create the YoutubeDL used for downloads (segmented HTTP downloads included)
+
+    With a ThumbnailCache, jobs with the cache_thumbnail option get their
+    thumbnail from it.
+    """
+    get_yt_dlp()
+    from segmented_download import SegmentedYoutubeDL
+    ydl = SegmentedYoutubeDL(opts)
+    if thumbnails is not None:
+        add_thumbnail_cache(ydl, thumbnails)
+    add_stage_markers(ydl)
+    return ydl
+
+
+SETTINGS_FILE = "settings.json"
+METADATA_CACHE_FILE = "metadata_cache.db"
+HISTORY_FILE = "history.db"
+STATS_FILE = "stats.json"
+JOURNAL_FILE = "jobs.db"
+ARCHIVE_FILE = "archive.db"
+SUBSCRIPTIONS_FILE = "subscriptions.db"
+THUMBNAIL_CACHE_DIR = "thumbnails"
+DEFAULT_DOWNLOAD_PATH = os.path.expanduser("~/Downloads/YouTube")
+# Bandwidth shares of running jobs by priority
+PRIORITY_WEIGHTS = {PRIORITY_HIGH: 4, PRIORITY_NORMAL: 2, PRIORITY_LOW: 1}
+# Redirects followed while listing (e.g. a channel URL to its videos tab)
+PLAYLIST_REDIRECTS = 5
+# Longer listings are not cached, so huge channels are never held in memory whole
+PLAYLIST_CACHE_ENTRIES = 5000
+# How often the subscription timer looks for subscriptions that are due
+SUBSCRIPTION_CHECK_INTERVAL = 60
+# How often waits between retries look for a cancellation
+CANCEL_CHECK_INTERVAL = 0.5
+AUDIO_QUALITY_MAP = {'best': '0', '320k': '320', '256k': '256', '192k': '192', '128k': '128'}
+
+
+def default_settings(download_path=DEFAULT_DOWNLOAD_PATH):
+    """Return the default settings dictionary"""
+    return {
+        "download_path": download_path,
+        "theme": "dark",
+        "auto_clipboard": True,
+        "concurrent_downloads": 3,
+        "adaptive_concurrency": False,
+        "max_concurrent_downloads": 8,
+        "adaptive_interval": 5,
+        "connections_per_download": 4,
+        "bandwidth_limit_kbps": 0,
+        "bandwidth_schedule": [],
+        "pipeline_postprocessing": True,
+        "rank_formats": True,
+        "metrics_port": 0,
+        "daemon_port": 8765,
+        "postprocess_workers": 0,
+        "bulk_import_extractions": 4,
+        "bulk_import_queued": 50,
+        "default_video_quality": "best",
+        "default_audio_format": "mp3",
+        "cache_flat_ttl": 3600,
+        "cache_full_ttl": 1800,
+        "cache_max_mb": 64,
+        "thumbnail_cache_mb": 128,
+        "ui_refresh_hz": 15,
+        "clipboard_auto_enqueue": False
+    }
+
+
+def load_settings(settings_file=SETTINGS_FILE, download_path=DEFAULT_DOWNLOAD_PATH):
+    """Load settings from JSON file"""
+    defaults = default_settings(download_path)
+    try:
+        if os.path.exists(settings_file):
+            with open(settings_file, 'r') as f:
+                settings = json.load(f)
+                # Update with any missing keys
+                for key, value in defaults.items():
+                    if key not in settings:
+                        settings[key] = value
+                return settings
+    except:
+        pass
+
+    return defaults
+
+
+def save_settings(settings, settings_file=SETTINGS_FILE):
+    """Save settings to JSON file"""
+    try:
+        with open(settings_file, 'w') as f:
+            json.dump(settings, f, indent=2)
+    except Exception as e:
+        print(f"Error saving settings: {e}")
+
+
+def get_format_string(quality, format_ext):
+    """Generate format string for yt-dlp"""
+    if quality == "best":
+        return f"best[ext={format_ext}]/best"
+    elif quality == "worst":
+        return f"worst[ext={format_ext}]/worst"
+    else:
+        height = quality.replace('p', '')
+        return f"best[height<={height}][ext={format_ext}]/best[height<={height}]/best"
+
+
+def build_playlist_items(start_range, end_range):
+    """Build the yt-dlp playlist_items selection from a start/end range"""
+    if start_range and end_range:
+        return f"{start_range}-{end_range}"
+    elif start_range:
+        return f"{start_range}-"
+    return ""
+
+
+def select_entries(entries, start_range="", end_range=""):
+    """Yield (position, entry) for the entries in a 1-based start/end range
+
+    Entries are consumed lazily and no further than the end of the range,
+    so a range near the start of a long playlist fetches only its first pages.
+    """
+    start_idx = int(start_range) if start_range else 1
+    end_idx = int(end_range) if end_range else None
+    for position, entry in enumerate(entries, 1):
+        if end_idx is not None and position > end_idx:
+            break
+        if position >= start_idx and entry:
+            yield position, entry
+
+
+def iter_paged(paged, chunk=100):
+    """Iterate a yt-dlp PagedList, fetching pages only as they are reached"""
+    start = 0
+    while True:
+        items = paged.getslice(start, start + chunk)
+        yield from items
+        if len(items) < chunk:
+            return
+        start += chunk
+
+
+def apply_connections(ydl_opts, connections):
+    """Set per-job parallelism: fragment downloads for DASH/HLS, byte ranges for plain HTTP"""
+    connections = max(1, int(connections))
+    ydl_opts['concurrent_fragment_downloads'] = connections
+    ydl_opts['segmented_connections'] = connections
+    return ydl_opts
+
+
+def build_video_opts(download_path, quality, format_ext):
+    """Build yt-dlp options for a single video download
+
+    format_request lets the engine rank the extracted formats itself
+    (see format_selection); the format string is the fallback.
+    """
+    return {
+        'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
+        'format': get_format_string(quality, format_ext),
+        'format_request': {'quality': quality, 'ext': format_ext},
+    }
+
+
+def build_playlist_opts(download_path, quality, audio_only, playlist_items=""):
+    """Build yt-dlp options for a playlist download"""
+    if audio_only:
+        format_str = 'bestaudio/best'
+    else:
+        format_str = get_format_string(quality, 'mp4')
+
+    ydl_opts = {
+        'outtmpl': os.path.join(download_path, 'Playlists/%(playlist)s/%(title)s.%(ext)s'),
+        'format': format_str,
+    }
+
+    if not audio_only:
+        ydl_opts['format_request'] = {'quality': quality, 'ext': 'mp4'}
+
+    if playlist_items:
+        ydl_opts['playlist_items'] = playlist_items
+
+    if audio_only:
+        ydl_opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        }]
+
+    return ydl_opts
+
+
+def build_audio_opts(download_path, audio_format, quality, embed_metadata=True, embed_thumbnail=False):
+    """Build yt-dlp options for audio extraction"""
+    postprocessors = [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': audio_format,
+        'preferredquality': AUDIO_QUALITY_MAP.get(quality, '192'),
+    }]
+
+    if embed_metadata:
+        postprocessors.append({'key': 'FFmpegMetadata'})
+
+    if embed_thumbnail:
+        postprocessors.append({'key': 'EmbedThumbnail'})
+
+    return {
+        'outtmpl': os.path.join(download_path, 'Audio/%(title)s.%(ext)s'),
+        'format': 'bestaudio/best',
+        'postprocessors': postprocessors,
+        'writethumbnail': bool(embed_thumbnail),
+    }
+
+
+def archive_variant(ydl_opts):
+    """Identify what a download produces, so e.g. mp4 and mp3 copies are archived separately"""
+    variant = ydl_opts.get('format', '')
+    for pp in ydl_opts.get('postprocessors') or []:
+        if pp.get('key') == 'FFmpegExtractAudio':
+            variant += f"|{pp.get('preferredcodec')}"
+    return variant
+
+
+class PlaylistProgress:
+    """Thread-safe aggregate of per-entry byte progress for a playlist"""
+
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.expanding = False
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def set_total(self, total):
+        """Set the number of entries being downloaded"""
+        with self._lock:
+            self.total = total
+
+    def add(self, count=1):
+        """Count entries found while the playlist is still being listed"""
+        with self._lock:
+            self.total += count
+
+    def set_expanding(self, expanding):
+        """Mark whether more entries may still be added"""
+        with self._lock:
+            self.expanding = expanding
+
+    def update(self, index, d):
+        """Record a progress hook event for one entry"""
+        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        with self._lock:
+            entry = self._entries.setdefault(index, {'downloaded': 0, 'total': 0, 'filename': ''})
+            entry['downloaded'] = d.get('downloaded_bytes', 0)
+            entry['total'] = total_bytes
+            entry['filename'] = d.get('filename', entry['filename'])
+
+    def finish(self, index, success):
+        """Mark an entry as finished"""
+        with self._lock:
+            self._entries.pop(index, None)
+            if success:
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def skip(self, index):
+        """Mark an entry that was already downloaded"""
+        with self._lock:
+            self.done += 1
+            self.skipped += 1
+
+    def snapshot(self):
+        """Return a consistent view of the aggregated progress"""
+        with self._lock:
+            partial = sum(e['downloaded'] / e['total'] for e in self._entries.values() if e['total'])
+            finished = self.done + self.failed
+            fraction = (finished + partial) / self.total if self.total else 0
+            return {
+                'total': self.total,
+                'done': self.done,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'expanding': self.expanding,
+                'active': len(self._entries),
+                'fraction': min(fraction, 1.0),
+                'downloaded_bytes': sum(e['downloaded'] for e in self._entries.values()),
+                'filenames': [e['filename'] for e in self._entries.values()],
+            }
+
+
+class MetadataEngine:
+    """Metadata extraction, caches, history and subscriptions on the local files, without running jobs
+
+    DownloadEngine builds on it; on its own it serves the GUI when jobs run
+    on a daemon (daemon_client.RemoteEngine).
+    """
+
+    def __init__(self, settings=None, quiet=True):
+        self.settings = settings if settings is not None else load_settings()
+        self.download_path = self.settings["download_path"]
+        self.quiet = quiet
+        self.metadata_cache = MetadataCache(METADATA_CACHE_FILE,
+                                            flat_ttl=self.settings["cache_flat_ttl"],
+                                            full_ttl=self.settings["cache_full_ttl"],
+                                            max_bytes=self.settings["cache_max_mb"] * 1024 * 1024)
+        self.thumbnails = ThumbnailCache(THUMBNAIL_CACHE_DIR, self.settings["thumbnail_cache_mb"] * 1024 * 1024)
+        self.ydl_pool = YDLPool(lambda opts: create_ydl(opts, self.thumbnails))
+        self.history = HistoryStore(HISTORY_FILE)
+        self.subscriptions = SubscriptionStore(SUBSCRIPTIONS_FILE)
+        self._can_merge = None
+
+        # Create download directory if it doesn't exist
+        os.makedirs(self.download_path, exist_ok=True)
+
+    def apply_settings(self, settings):
+        """Apply changed settings"""
+        self.settings = settings
+        self.download_path = settings["download_path"]
+        os.makedirs(self.download_path, exist_ok=True)
+
+    def extract_info(self, url, flat=False):
+        """Extract info without downloading, served from the metadata cache when fresh"""
+        kind = FLAT if flat else FULL
+        key = canonical_key(url)
+        info = self.metadata_cache.get(key, kind)
+        if info is not None:
+            return info
+
+        ydl_opts = {'quiet': True, 'no_warnings': True}
+        if flat:
+            ydl_opts['extract_flat'] = True
+        profile = PROFILE_FLAT if flat else PROFILE_INFO
+        with self.ydl_pool.acquire(profile, ydl_opts) as ydl:
+            info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+        self.metadata_cache.put(key, kind, info)
+        return info
+
+    def can_merge(self):
+        """Return True if ffmpeg is available to merge separate video and audio streams"""
+        if self._can_merge is None:
+            self._can_merge = get_yt_dlp().postprocessor.FFmpegMergerPP(None).available
+        return self._can_merge
+
+    def select_format(self, info, quality="best", format_ext="mp4"):
+        """Return the format a download of an extracted video would use, or None"""
+        return select_format(info.get('formats') or [], quality, format_ext, self.can_merge(),
+                             info.get('duration'))
+
+    def get_video_info(self, url):
+        """Extract video information without downloading"""
+        return self.extract_info(url)
+
+    def get_playlist_info(self, url):
+        """Extract flat playlist information without downloading"""
+        playlist = self.iter_playlist(url)
+        info = next(playlist)
+        return dict(info, entries=list(playlist))
+
+    def iter_playlist(self, url, refresh=False):
+        """Yield a playlist's info dict (without entries), then its flat entries as pages arrive
+
+        yt-dlp fetches further pages only as the entries are consumed, so the
+        first entries are available while a long channel is still being
+        listed. A complete listing is stored in the metadata cache unless it
+        has more than PLAYLIST_CACHE_ENTRIES entries; a cached listing is
+        replayed without network access unless refresh is set.
+        """
+        key = canonical_key(url)
+        info = None if refresh else self.metadata_cache.get(key, FLAT)
+        if info is not None:
+            entries = info.pop('entries', None) or []
+            yield info
+            yield from entries
+            return
+
+        ydl_opts = {'quiet': True, 'no_warnings': True, 'extract_flat': True}
+        with self.ydl_pool.acquire(PROFILE_FLAT, ydl_opts) as ydl:
+            # process=False leaves the extractor's entry generator unconsumed
+            info = ydl.extract_info(url, download=False, process=False)
+            for _ in range(PLAYLIST_REDIRECTS):
+                if info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, ie_key=info.get('ie_key'),
+                                        process=False)
+            entries = info.pop('entries', None) or []
+            if isinstance(entries, get_yt_dlp().utils.PagedList):
+                entries = iter_paged(entries)
+            info = ydl.sanitize_info(info)
+            yield info
+            listing = []
+            for entry in entries:
+                entry = ydl.sanitize_info(entry) if entry else entry
+                if listing is not None:
+                    listing.append(entry)
+                    if len(listing) > PLAYLIST_CACHE_ENTRIES:
+                        listing = None
+                yield entry
+        if listing is not None:
+            self.metadata_cache.put(key, FLAT, dict(info, entries=listing))
+
+    def subscribe(self, url, audio_only=False, quality="best", interval_minutes=0):
+        """Save a channel or playlist subscription and return its id
+
+        interval_minutes > 0 lets the subscription timer sync it on its own.
+        """
+        return self.subscriptions.add(url, audio_only, quality, interval_minutes)
+
+    def unsubscribe(self, subscription_id):
+        """Forget a subscription; files already downloaded stay"""
+        self.subscriptions.remove(subscription_id)
+
+
+class DownloadEngine(MetadataEngine):
+    """Runs video, playlist and audio jobs on a bounded scheduler"""
+
+    def __init__(self, settings=None, on_job_state=None, quiet=True):
+        super().__init__(settings, quiet)
+        self.throughput = ThroughputStats(STATS_FILE)
+        self.journal = JobJournal(JOURNAL_FILE)
+        self.bandwidth = BandwidthGovernor(self.bandwidth_limit)
+        self.archive = ArchiveIndex(ARCHIVE_FILE)
+        self.syncs = {}
+        self._sync_lock = threading.Lock()
+        self._subscription_timer = None
+        # Download and post-processing run as separate pipeline stages
+        self.download_stage = StageStats('download')
+        self.postprocess_pool = PostprocessPool(self.settings["postprocess_workers"])
+        self.spans = SpanRecorder()
+        self.metrics_server = None
+        self.imports = []
+        if self.settings["metrics_port"]:
+            self.start_metrics_server(self.settings["metrics_port"])
+        self.on_job_state = on_job_state
+        self._stats_lock = threading.Lock()
+        self.scheduler = DownloadScheduler(self.settings["concurrent_downloads"],
+                                           on_state_change=self._on_job_state)
+        self.retry_policy = RetryPolicy()
+        self.breaker = CircuitBreaker()
+        self.concurrency = None
+        if self.settings["adaptive_concurrency"]:
+            self.start_adaptive_concurrency()
+
+    def apply_settings(self, settings):
+        """Apply changed settings to the running engine"""
+        super().apply_settings(settings)
+        if settings["adaptive_concurrency"]:
+            if self.concurrency is None:
+                self.start_adaptive_concurrency()
+            else:
+                self.concurrency.set_ceiling(settings["max_concurrent_downloads"])
+        else:
+            self.stop_adaptive_concurrency()
+            self.scheduler.set_max_workers(settings["concurrent_downloads"])
+
+    def start_adaptive_concurrency(self):
+        """Let an AIMD controller set the number of concurrent downloads
+
+        It starts from concurrent_downloads and stays at or below
+        max_concurrent_downloads.
+        """
+        self.concurrency = AdaptiveConcurrency(
+            self.scheduler.set_max_workers, self.settings["concurrent_downloads"],
+            self.settings["max_concurrent_downloads"], interval=self.settings["adaptive_interval"],
+            on_decision=self._log_concurrency)
+        return self.concurrency.start(
+            lambda: (self.bandwidth.stats()['bytes'], self.scheduler.counts()[QUEUED]))
+
+    def stop_adaptive_concurrency(self):
+        """Go back to the fixed concurrent_downloads setting"""
+        if self.concurrency is not None:
+            self.concurrency.stop()
+            self.concurrency = None
+
+    def _log_concurrency(self, decision):
+        print(f"Concurrent downloads {decision['from']} -> {decision['to']}: {decision['reason']} "
+              f"({format_bytes(decision['throughput'])}/s measured)")
+
+    def bandwidth_limit(self):
+        """Return the global limit in bytes/s for the current time of day (0 = unlimited)"""
+        return scheduled_limit(self.settings["bandwidth_schedule"],
+                               self.settings["bandwidth_limit_kbps"] * 1024)
+
+    def set_job_rate_limit(self, job, rate_limit):
+        """Cap a running or queued top-level job at rate_limit bytes/s (None removes the cap)"""
+        job.rate_limit = rate_limit or None
+        self.bandwidth.set_flow(job.id, cap=job.rate_limit)
+
+    def job_speed(self, job):
+        """Return the measured throughput of a top-level job in bytes/s"""
+        return self.bandwidth.rate(job.id)
+
+    def submit_video(self, url, quality="best", format_ext="mp4", progress_hook=None,
+                     priority=PRIORITY_NORMAL, rate_limit=None):
+        """Queue a single video download; rate_limit caps it in bytes/s"""
+        ydl_opts = build_video_opts(self.download_path, quality, format_ext)
+        return self._queue_video(url, ydl_opts, progress_hook, priority, rate_limit=rate_limit)
+
+    def _queue_video(self, url, ydl_opts, progress_hook, priority, journal_id=None, rate_limit=None):
+        """Queue a single video download with resolved options"""
+        def run(job):
+            if self._skip_archived(job, url, ydl_opts):
+                return job.result
+
+            def hook(d):
+                if d['status'] == 'finished':
+                    job.result = d.get('filename', 'Unknown')
+            self._with_retries(job, url, lambda: self._download(job, url, PROFILE_VIDEO, ydl_opts, [hook],
+                                                                progress_hook), progress_hook)
+            return job.result
+
+        return self._submit(run, url, "Video", ydl_opts, priority, journal_id=journal_id,
+                            rate_limit=rate_limit)
+
+    def submit_playlist(self, url, start_range="", end_range="", audio_only=False, quality="best",
+                        progress_hook=None, priority=PRIORITY_NORMAL, rate_limit=None):
+        """Queue a playlist; each entry becomes its own job on the worker pool
+
+        The entries share one bandwidth flow, so rate_limit caps the playlist as a whole.
+        """
+        playlist_items = build_playlist_items(start_range, end_range)
+        ydl_opts = build_playlist_opts(self.download_path, quality, audio_only, playlist_items)
+        params = {'start_range': start_range, 'end_range': end_range, 'audio_only': audio_only}
+        return self._queue_playlist(url, ydl_opts, params, progress_hook, priority, rate_limit=rate_limit)
+
+    def _queue_playlist(self, url, ydl_opts, params, progress_hook, priority, journal_id=None,
+                        rate_limit=None, sync=None):
+        """Queue a playlist with resolved options
+
+        With a SyncRun the listing bypasses the cache and only the entries it
+        lets through are queued.
+        """
+        start_range, end_range = params['start_range'], params['end_range']
+        audio_only = params['audio_only']
+        entry_opts = {k: v for k, v in ydl_opts.items() if k != 'playlist_items'}
+        entry_profile = PROFILE_AUDIO if audio_only else PROFILE_VIDEO
+
+        def open_listing():
+            started = time.perf_counter()
+            playlist, info = self._open_playlist(url, refresh=sync is not None)
+            if sync is not None:
+                sync.enumerate_seconds += time.perf_counter() - started
+                playlist = sync.filter(playlist, info)
+            return playlist, info
+
+        def run(job):
+            # Expand entries without downloading; the range is applied locally so
+            # the cached flat listing covers every range of the same playlist
+            started = time.time()
+            playlist, info = self._with_retries(job, url, open_listing, progress_hook)
+            job.video_id = info.get('id') or job.video_id
+            playlist_info = {
+                'playlist': info.get('title') or info.get('id'),
+                'playlist_id': info.get('id'),
+                'playlist_title': info.get('title'),
+            }
+            if info.get('playlist_count'):
+                playlist_info['playlist_count'] = info['playlist_count']
+            job.progress.set_expanding(True)
+            # Later pages are fetched on their own thread, so this worker is free
+            # for the entries that are already queued
+            self.scheduler.hold(job)
+            threading.Thread(target=expand, args=(job, playlist, playlist_info, started),
+                             name=f"playlist-{job.id}", daemon=True).start()
+            return "Listing playlist"
+
+        def expand(job, playlist, playlist_info, started):
+            variant = archive_variant(entry_opts)
+            folder = os.path.dirname(entry_opts['outtmpl']).replace(
+                '%(playlist)s', get_yt_dlp().utils.sanitize_filename(str(playlist_info['playlist'])))
+            first_entry = None
+            error = result = None
+            listed = 0
+            try:
+                while True:
+                    try:
+                        for position, entry in select_entries(playlist, start_range, end_range):
+                            if self.scheduler.is_stopping():
+                                raise JobInterrupted("Playlist listing interrupted")
+                            if job.cancelled:
+                                raise JobCancelled("Cancelled")
+                            if position <= listed:
+                                # Already queued before the listing was restarted
+                                continue
+                            if first_entry is None:
+                                first_entry = time.time() - started
+                            job.progress.add()
+                            if self._reuse_archived(entry, variant, folder):
+                                job.progress.skip(position)
+                            else:
+                                self._submit_entry(job, entry, position, playlist_info, entry_profile,
+                                                   entry_opts, progress_hook)
+                            listed = position
+                            if progress_hook:
+                                progress_hook(job, {'status': 'expanding'})
+                        break
+                    except (JobInterrupted, JobCancelled):
+                        raise
+                    except Exception as e:
+                        # A later page failed; list again from the start, skipping what is queued
+                        if self.scheduler.is_stopping():
+                            raise
+                        kind = classify(e)
+                        self.breaker.record(host_key(url), kind)
+                        self._wait_for_retry(job, url, e, progress_hook, kind)
+                        playlist.close()
+                        playlist, _ = self._with_retries(job, url, open_listing, progress_hook)
+                total, skipped = job.progress.total, job.progress.skipped
+                result = f"{total} videos" + (f" ({skipped} already downloaded)" if skipped else "")
+            except Exception as e:
+                error = e
+            finally:
+                playlist.close()
+                job.progress.set_expanding(False)
+                self.spans.record(job, 'extract', started, time.time(), flat=True,
+                                  entries=job.progress.total, first_entry=first_entry)
+                if progress_hook:
+                    progress_hook(job, {'status': 'expanding'})
+            self.scheduler.release(job, error, result)
+
+        return self._submit(run, url, "Playlist", ydl_opts, priority, params=params,
+                            journal_id=journal_id, rate_limit=rate_limit, progress=PlaylistProgress(),
+                            sync=sync)
+
+    def _open_playlist(self, url, refresh=False):
+        """Start listing a playlist; returns the entry generator and the playlist info"""
+        playlist = self.iter_playlist(url, refresh)
+        return playlist, next(playlist)
+
+    def sync_subscription(self, subscription_id, progress_hook=None, priority=PRIORITY_NORMAL,
+                          journal_id=None):
+        """Queue the entries a subscription gained since its last sync
+
+        The sync is a playlist job whose listing stops at entries already in
+        the subscription's snapshot; job.sync is its SyncRun, and
+        job.sync.summary is filled in once the job has finished. Returns the
+        running job if the subscription is already being synced.
+        """
+        subscription = self.subscriptions.get(subscription_id)
+        if subscription is None:
+            raise ValueError(f"No subscription with id {subscription_id}")
+        with self._sync_lock:
+            job = self.syncs.get(subscription_id)
+            if job is not None and not job.is_finished():
+                return job
+            sync = SyncRun(subscription, self.subscriptions.known_ids(subscription_id))
+            ydl_opts = build_playlist_opts(self.download_path, subscription['quality'],
+                                           subscription['audio_only'])
+            params = {'start_range': "", 'end_range': "", 'audio_only': subscription['audio_only'],
+                      'subscription_id': subscription_id}
+            job = self._queue_playlist(subscription['url'], ydl_opts, params, progress_hook, priority,
+                                       journal_id, sync=sync)
+            self.syncs[subscription_id] = job
+        return job
+
+    def sync_subscriptions(self, subscription_ids=None, progress_hook=None, priority=PRIORITY_NORMAL):
+        """Sync several subscriptions (all by default) at once; returns their jobs"""
+        if subscription_ids is None:
+            subscription_ids = [s['id'] for s in self.subscriptions.all()]
+        return [self.sync_subscription(subscription_id, progress_hook, priority)
+                for subscription_id in subscription_ids]
+
+    def start_subscription_timer(self, progress_hook=None):
+        """Sync subscriptions with an interval whenever they are due, on a daemon thread"""
+        if self._subscription_timer is not None:
+            return
+        stop = self._subscription_timer = threading.Event()
+
+        def run():
+            while not stop.is_set():
+                for subscription in self.subscriptions.due():
+                    try:
+                        self.sync_subscription(subscription['id'], progress_hook, PRIORITY_LOW)
+                    except Exception as e:
+                        print(f"Error starting sync of {subscription['url']}: {e}")
+                stop.wait(SUBSCRIPTION_CHECK_INTERVAL)
+
+        threading.Thread(target=run, name="subscription-timer", daemon=True).start()
+
+    def stop_subscription_timer(self):
+        """Stop syncing subscriptions on their own"""
+        if self._subscription_timer is not None:
+            self._subscription_timer.set()
+            self._subscription_timer = None
+
+    def _finish_sync(self, job):
+        """Record a finished sync and remember the entries it saw"""
+        sync = job.sync
+        summary = sync.finish(job.progress.snapshot(), job.finished_at, job.error)
+        if isinstance(job.error, JobInterrupted):
+            # Left in the journal; the resumed sync lists the same new entries again
+            return
+        failed_ids = [child.entry_id for child in job.children if child.state == FAILED]
+        try:
+            self.subscriptions.finish_sync(sync.subscription['id'], summary,
+                                           sync.snapshot(failed_ids) if sync.listed else None, sync.title)
+        except Exception as e:
+            print(f"Error saving subscription snapshot: {e}")
+        print(f"Synced {format_summary(summary)}")
+
+    def submit_audio(self, url, audio_format="mp3", quality="best", embed_metadata=True,
+                     embed_thumbnail=False, progress_hook=None, priority=PRIORITY_NORMAL, rate_limit=None):
+        """Queue an audio extraction; rate_limit caps it in bytes/s"""
+        ydl_opts = build_audio_opts(self.download_path, audio_format, quality,
+                                    embed_metadata, embed_thumbnail)
+        return self._queue_audio(url, ydl_opts, {'audio_format': audio_format}, progress_hook, priority,
+                                 rate_limit=rate_limit)
+
+    def _queue_audio(self, url, ydl_opts, params, progress_hook, priority, journal_id=None,
+                     rate_limit=None):
+        """Queue an audio extraction with resolved options"""
+        def run(job):
+            if self._skip_archived(job, url, ydl_opts):
+                return f"{params['audio_format'].upper()} extraction (already downloaded)"
+            self._with_retries(job, url, lambda: self._download(job, url, PROFILE_AUDIO, ydl_opts, [],
+                                                                progress_hook), progress_hook)
+            return f"{params['audio_format'].upper()} extraction"
+
+        return self._submit(run, url, "Audio", ydl_opts, priority, params=params,
+                            journal_id=journal_id, rate_limit=rate_limit)
+
+    def import_urls(self, lines, kind="Video", quality="best", format_ext="mp4", audio_format="mp3",
+                    embed_metadata=True, embed_thumbnail=False, progress_hook=None,
+                    priority=PRIORITY_NORMAL, on_update=None):
+        """Stream a URL list (any iterable of lines, e.g. an open file) into the queue
+
+        Each distinct video is extracted once before it is queued, with a
+        bounded number of extractions in flight, so its download starts from
+        the metadata cache. Playlist URLs are queued as playlists. Returns
+        the started BulkImport; its jobs are marked with job.imported.
+        """
+        if kind == "Audio":
+            ydl_opts = build_audio_opts(self.download_path, audio_format, quality,
+                                        embed_metadata, embed_thumbnail)
+        else:
+            ydl_opts = build_video_opts(self.download_path, quality, format_ext)
+
+        def resolve(url):
+            if self._archived_files(url, ydl_opts):
+                return
+            host = host_key(url)
+            if not self.breaker.acquire(host, self.scheduler.stopping):
+                return
+            try:
+                self.extract_info(url)
+            except Exception as e:
+                kind = classify(e)
+                self.breaker.record(host, kind)
+                if kind == PERMANENT:
+                    raise
+                # Queued anyway; the job retries the extraction under the retry policy
+            else:
+                self.breaker.record(host)
+
+        def submit(url, is_playlist):
+            if is_playlist:
+                job = self.submit_playlist(url, audio_only=kind == "Audio", quality=quality,
+                                           progress_hook=progress_hook, priority=priority)
+            elif kind == "Audio":
+                job = self._queue_audio(url, dict(ydl_opts), {'audio_format': audio_format},
+                                        progress_hook, priority)
+            else:
+                job = self._queue_video(url, dict(ydl_opts), progress_hook, priority)
+            job.imported = True
+            return job
+
+        importer = BulkImport(lines, resolve, submit, self.settings["bulk_import_extractions"],
+                              self.settings["bulk_import_queued"], on_update)
+        self.imports = [i for i in self.imports if not i.done.is_set()] + [importer]
+        return importer.start()
+
+    def cancel(self, job):
+        """Cancel a queued or running job, with the entries of a playlist
+
+        The job fails with JobCancelled and is dropped from the journal;
+        files it already finished stay on disk. Returns False if the job had
+        already finished.
+        """
+        return self.scheduler.cancel(job)
+
+    def pending_jobs(self):
+        """Return jobs left unfinished by a previous run (see JobJournal.pending)"""
+        return self.journal.pending()
+
+    def resume(self, entry, progress_hook=None, priority=PRIORITY_NORMAL):
+        """Queue a journaled job again with its original options
+
+        The output template is unchanged, so yt-dlp finds the .part file and
+        continues it with a range request instead of starting from zero.
+        """
+        url, ydl_opts, params = entry['url'], entry['options'], entry['params']
+        if params.get('subscription_id') and self.subscriptions.get(params['subscription_id']):
+            return self.sync_subscription(params['subscription_id'], progress_hook, priority, entry['id'])
+        if entry['kind'] == "Playlist":
+            return self._queue_playlist(url, ydl_opts, params, progress_hook, priority, entry['id'])
+        elif entry['kind'] == "Audio":
+            return self._queue_audio(url, ydl_opts, params, progress_hook, priority, entry['id'])
+        return self._queue_video(url, ydl_opts, progress_hook, priority, entry['id'])
+
+    def discard_pending(self):
+        """Forget unfinished jobs from a previous run; partial files are left on disk"""
+        self.journal.clear()
+
+    def stage_stats(self):
+        """Return queue depth and timing of the download and post-processing stages"""
+        return {'download': self.download_stage.snapshot(), 'postprocess': self.postprocess_pool.snapshot()}
+
+    def start_metrics_server(self, port):
+        """Serve /metrics and /spans on 127.0.0.1:port; returns the server (None if it failed)"""
+        try:
+            self.metrics_server = MetricsServer(self, port).start()
+        except OSError as e:
+            print(f"Could not start metrics endpoint on port {port}: {e}")
+        return self.metrics_server
+
+    def metrics_text(self):
+        """Return stage timings and engine gauges in the Prometheus text format"""
+        lines = [self.spans.prometheus().rstrip('\n'),
+                 "# HELP ytdl_jobs Jobs by state (playlist entries rather than playlists)",
+                 "# TYPE ytdl_jobs gauge"]
+        for state, count in self.scheduler.counts().items():
+            lines.append(f'ytdl_jobs{{state="{state}"}} {count}')
+        lines += ["# HELP ytdl_pipeline_items Items waiting in or passing through each pipeline stage",
+                  "# TYPE ytdl_pipeline_items gauge"]
+        for stage, stats in self.stage_stats().items():
+            lines.append(f'ytdl_pipeline_items{{stage="{stage}",state="queued"}} {stats["queued"]}')
+            lines.append(f'ytdl_pipeline_items{{stage="{stage}",state="active"}} {stats["active"]}')
+        lines += ["# HELP ytdl_workers Concurrent downloads allowed right now",
+                  "# TYPE ytdl_workers gauge",
+                  f"ytdl_workers {self.scheduler.max_workers}"]
+        session = self.throughput.snapshot()['session']
+        lines += ["# HELP ytdl_downloaded_bytes_total Bytes downloaded this session",
+                  "# TYPE ytdl_downloaded_bytes_total counter",
+                  f"ytdl_downloaded_bytes_total {session['bytes']}",
+                  "# HELP ytdl_throttled_seconds_total Time downloads waited for the bandwidth limit",
+                  "# TYPE ytdl_throttled_seconds_total counter",
+                  f"ytdl_throttled_seconds_total {self.bandwidth.stats()['throttled_seconds']}"]
+        return '\n'.join(lines) + '\n'
+
+    def shutdown(self, wait=True):
+        """Interrupt running jobs and stop the workers; unfinished jobs stay in the journal"""
+        for importer in self.imports:
+            importer.cancel()
+        self.stop_subscription_timer()
+        self.stop_adaptive_concurrency()
+        self.scheduler.shutdown(wait)
+        self.postprocess_pool.shutdown()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    def wait(self, jobs, poll_interval=0.2):
+        """Block until all given jobs have finished (and syncs have recorded their summary)"""
+        while any(job.state in (QUEUED, RUNNING) or (job.sync is not None and job.sync.summary is None)
+                  for job in jobs):
+            time.sleep(poll_interval)
+
+    def _submit(self, run, url, kind, ydl_opts, priority, parent=None, params=None, journal_id=None,
+                **attrs):
+        """Hand a job to the scheduler, journaling top-level jobs before they are queued"""
+        video_id, playlist_id = parse_youtube_url(url)
+        if parent is None and journal_id is None:
+            journal_id = self.journal.add(kind, url, ydl_opts, params)
+        if kind != "Playlist":
+            self.download_stage.enqueue()
+            run = self._download_stage(run)
+        return self.scheduler.submit(run, name=url, kind=kind, priority=priority, parent=parent,
+                                     url=url, options=ydl_opts, journal_id=journal_id,
+                                     video_id=video_id or playlist_id,
+                                     rate_limit=attrs.pop('rate_limit', None), sync=attrs.pop('sync', None),
+                                     skipped=False,
+                                     file_path=None, bytes=0, expected_bytes=0, media_duration=None,
+                                     history_id=None, attempts=0, retries=0, error_kind=None, extracted=None,
+                                     peak_speed=0.0, download_seconds=0.0, postprocess_seconds=0.0,
+                                     **attrs)
+
+    def _with_retries(self, job, url, attempt, progress_hook=None):
+        """Run attempt() under the retry policy and the circuit breaker of the URL's host
+
+        The breaker learns the outcome as soon as extraction is done
+        (job.extracted() is called from the pre_process marker), so a
+        half-open probe does not hold the other jobs of the host back for a
+        whole transfer. Waits for retries and for an open breaker are
+        reported to progress_hook(job, d) as {'status': 'retrying', ...} events.
+        """
+        host = host_key(url)
+        recorded = []
+
+        def on_wait(seconds):
+            if progress_hook:
+                progress_hook(job, {'status': 'retrying', 'retry_in': seconds, 'attempt': job.attempts,
+                                    'reason': f"{host} is rate limiting"})
+
+        def extracted():
+            if not recorded:
+                recorded.append(True)
+                self.breaker.record(host)
+
+        while True:
+            if not self.breaker.acquire(host, self.scheduler.stopping, on_wait):
+                raise JobInterrupted("Interrupted by shutdown; will resume on next start")
+            if job.cancelled:
+                self.breaker.release(host)
+                raise JobCancelled("Cancelled")
+            job.attempts += 1
+            recorded.clear()
+            job.extracted = extracted
+            try:
+                result = attempt()
+            except Exception as e:
+                if isinstance(e, (JobInterrupted, JobCancelled)) or self.scheduler.is_stopping():
+                    self.breaker.release(host)
+                    raise
+                kind = classify(e)
+                # Throttling during the transfer still opens the breaker
+                if not recorded or kind == THROTTLED:
+                    self.breaker.record(host, kind)
+                if self.concurrency is not None and job.kind != "Playlist":
+                    self.concurrency.record(e)
+                self._wait_for_retry(job, url, e, progress_hook, kind)
+                continue
+            finally:
+                job.extracted = None
+            extracted()
+            if self.concurrency is not None and job.kind != "Playlist":
+                self.concurrency.record()
+            return result
+
+    def _wait_for_retry(self, job, url, error, progress_hook=None, kind=None):
+        """Sleep before retrying a failed attempt, or re-raise error if it is not retried"""
+        kind = kind or classify(error)
+        job.error_kind = kind
+        if not self.retry_policy.should_retry(kind, job.retries):
+            raise error
+        delay = self.retry_policy.delay(kind, job.retries)
+        job.retries += 1
+        print(f"{kind.capitalize()} failure in {job.name}, retry {job.retries} in {delay:.1f}s: {error}")
+        if progress_hook:
+            progress_hook(job, {'status': 'retrying', 'retry_in': delay, 'attempt': job.attempts,
+                                'reason': f"{kind} failure"})
+        deadline = time.monotonic() + delay
+        while not job.cancelled:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if self.scheduler.stopping.wait(min(remaining, CANCEL_CHECK_INTERVAL)):
+                raise JobInterrupted("Interrupted by shutdown; will resume on next start")
+        raise JobCancelled("Cancelled")
+
+    def _download_stage(self, run):
+        """Wrap a job target with download stage accounting"""
+        def staged(job):
+            started = time.time()
+            self.download_stage.start(started - job.created_at)
+            self.spans.record(job, 'queue', job.created_at, started)
+            success = False
+            try:
+                result = run(job)
+                success = True
+                return result
+            finally:
+                self.download_stage.finish(time.time() - started, success)
+        return staged
+
+    def _on_job_state(self, job):
+        """Record finished top-level jobs in the history and stats, then notify the listener"""
+        if job.is_finished():
+            self.throughput.clear_speed(job.id)
+            if job.parent is None:
+                self.bandwidth.remove(job.id)
+            if job.started_at is None and job.kind != "Playlist":
+                # Cancelled while queued, so it never reached the download stage
+                self.download_stage.cancel()
+        if job.journal_id is not None:
+            try:
+                if job.state == RUNNING:
+                    self.journal.set_state(job.journal_id, JOURNAL_RUNNING)
+                elif job.is_finished() and not isinstance(job.error, JobInterrupted):
+                    self.journal.remove(job.journal_id)
+            except Exception as e:
+                print(f"Error updating job journal: {e}")
+        if job.is_finished() and job.sync is not None:
+            self._finish_sync(job)
+        if job.is_finished() and job.started_at is not None:
+            self.spans.record(job, 'total', job.started_at, job.finished_at, ok=job.state == DONE,
+                              attempts=job.attempts, error_kind=job.error_kind)
+        if job.state == DONE and job.parent is None and not job.skipped:
+            self.throughput.add_job(job.bytes, job.finished_at - job.started_at, job.download_seconds,
+                                    job.postprocess_seconds, job.peak_speed)
+            try:
+                job.history_id = self.history.add(
+                    job.url, job.kind, job.result, video_id=job.video_id, file_path=job.file_path,
+                    bytes=job.bytes, duration=job.media_duration,
+                    started_at=job.started_at, finished_at=job.finished_at)
+            except Exception as e:
+                print(f"Error saving history: {e}")
+        if self.on_job_state:
+            self.on_job_state(job)
+
+    def _archived_files(self, url, ydl_opts):
+        """Return the archived files of a single-video URL for these options (empty if none)"""
+        video_id, playlist_id = parse_youtube_url(url)
+        if not video_id or playlist_id:
+            return []
+        return self.archive.lookup(archive_id('Youtube', video_id), archive_variant(ydl_opts))
+
+    def _skip_archived(self, job, url, ydl_opts):
+        """Finish a single-video job without network access if the archive has its file"""
+        files = self._archived_files(url, ydl_opts)
+        if not files:
+            return False
+        job.skipped = True
+        job.file_path = job.result = files[0]
+        return True
+
+    def _reuse_archived(self, entry, variant, folder):
+        """Skip a playlist entry that is archived, hard-linking it into this playlist's folder"""
+        if not entry.get('id'):
+            return False
+        key = archive_id(entry.get('ie_key') or 'Youtube', entry['id'])
+        files = self.archive.lookup(key, variant)
+        if not files:
+            return False
+        folder = os.path.abspath(folder)
+        if any(os.path.dirname(path) == folder for path in files):
+            return True
+        return self.archive.link(key, variant, files[0], os.path.join(folder, os.path.basename(files[0])))
+
+    def _record_hooks(self, job, variant, handoff=None):
+        """Return progress and postprocessor hooks that record file details on the job
+
+        With a handoff, each finished download is passed on to the
+        post-processing stage instead of being archived here.
+        """
+        targets = [job] if job.parent is None else [job, job.parent]
+
+        pp_started = {}
+        # Stage the current video is in; marker postprocessors move it along
+        timeline = {'stage': 'extract', 'start': time.time(), 'attrs': {}}
+        partial = {'path': None}
+        received = {}
+        received_lock = threading.Lock()
+        # Playlist entries draw from their playlist's flow
+        flow = job.parent or job
+        self.bandwidth.set_flow(flow.id, weight=PRIORITY_WEIGHTS.get(flow.priority, 1), cap=flow.rate_limit)
+
+        def check_interrupted():
+            if self.scheduler.is_stopping():
+                raise JobInterrupted("Interrupted by shutdown; will resume on next start")
+            if job.cancelled:
+                raise JobCancelled("Cancelled")
+
+        def advance(stage, now):
+            if timeline['stage']:
+                self.spans.record(job, timeline['stage'], timeline['start'], now, **timeline['attrs'])
+            timeline.update(stage=stage, start=now, attrs={})
+
+        def progress_hook(d):
+            check_interrupted()
+            tmpfilename = d.get('tmpfilename')
+            if job.journal_id is not None and tmpfilename and tmpfilename != partial['path']:
+                partial['path'] = tmpfilename
+                self.journal.set_file_path(job.journal_id, tmpfilename)
+            if d['status'] == 'downloading':
+                if not job.expected_bytes:
+                    # Whole selection, e.g. both streams of a video+audio pair
+                    info = d.get('info_dict') or {}
+                    job.expected_bytes = sum(format_size(f) for f in info.get('requested_formats') or [info])
+                name = d.get('tmpfilename') or d.get('filename')
+                downloaded = d.get('downloaded_bytes') or 0
+                # The first report of a file may include bytes resumed from disk
+                with received_lock:
+                    delta = downloaded - received.get(name, downloaded)
+                    received[name] = max(downloaded, received.get(name, 0))
+                if delta > 0:
+                    self.bandwidth.consume(flow.id, delta,
+                                           cancelled=lambda: self.scheduler.is_stopping() or job.cancelled)
+                    check_interrupted()
+                speed = d.get('speed') or 0
+                self.throughput.report_speed(job.id, speed)
+                if speed > job.peak_speed:
+                    with self._stats_lock:
+                        for target in targets:
+                            target.peak_speed = max(target.peak_speed, speed)
+                return
+            if d['status'] != 'finished':
+                return
+            info = d.get('info_dict') or {}
+            size = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+            if timeline['stage'] == 'download':
+                timeline['attrs']['bytes'] = timeline['attrs'].get('bytes', 0) + size
+            self.throughput.clear_speed(job.id)
+            with self._stats_lock:
+                for target in targets:
+                    target.bytes += size
+                    target.download_seconds += d.get('elapsed') or 0
+                    target.file_path = d.get('filename', target.file_path)
+                job.video_id = info.get('id', job.video_id)
+                job.media_duration = info.get('duration', job.media_duration)
+
+        def postprocessor_hook(d):
+            name = d.get('postprocessor')
+            if name in MARKER_STAGES:
+                if d['status'] == 'started':
+                    check_interrupted()
+                    advance(MARKER_STAGES[name], time.time())
+                    if name == 'SpanExtracted' and job.extracted is not None:
+                        job.extracted()
+                return
+            if d['status'] == 'started':
+                check_interrupted()
+                now = pp_started[name] = time.time()
+                if timeline['stage'] == 'download':
+                    # The first postprocessor ends the download (merging is a postprocessor too)
+                    advance(None, now)
+            elif d['status'] == 'finished':
+                now = time.time()
+                started = pp_started.pop(name, now)
+                elapsed = now - started
+                self.spans.record(job, 'move' if name == 'MoveFiles' else name, started, now)
+                with self._stats_lock:
+                    for target in targets:
+                        target.postprocess_seconds += elapsed
+                info = d.get('info_dict') or {}
+                filepath = info.get('filepath')
+                if filepath:
+                    job.file_path = filepath
+                if name == 'MoveFiles' and filepath:
+                    # Final location of every downloaded video, including whole-playlist audio jobs
+                    if handoff:
+                        handoff(info)
+                    else:
+                        self._archive_file(info, variant, filepath)
+                if name == 'MoveFiles':
+                    # Whole-playlist audio jobs go on with the next video
+                    timeline.update(stage='extract', start=now, attrs={})
+
+        return progress_hook, postprocessor_hook, timeline
+
+    def _archive_file(self, info, variant, filepath):
+        """Record a finished file in the download archive"""
+        if info.get('id') and info.get('extractor_key'):
+            self.archive.add(archive_id(info['extractor_key'], info['id']), variant, filepath,
+                             format=info.get('format_id'))
+
+    def _hand_off(self, job, info, pp_opts, variant):
+        """Queue a downloaded file for post-processing; the job stays running until it is done"""
+        info = get_yt_dlp().YoutubeDL.sanitize_info(info)
+        # Postprocessor objects do not survive the trip to the worker process
+        info.pop('__postprocessors', None)
+        self.scheduler.hold(job)
+        handed_off = time.time()
+        self.postprocess_pool.submit(
+            info['filepath'], info, pp_opts,
+            lambda result, error: self._postprocessed(job, info, variant, result, error, handed_off))
+
+    def _postprocessed(self, job, info, variant, result, error, handed_off):
+        """Record the outcome of post-processing and release the job"""
+        if error is not None and self.scheduler.is_stopping():
+            error = JobInterrupted("Interrupted by shutdown; will resume on next start")
+        if error is None:
+            self.spans.record(job, 'postprocess_queue', handed_off, result['started'])
+            position = result['started']
+            for name, seconds in result['timings'].items():
+                # The file was already moved into place by the download stage
+                if name != 'MoveFiles':
+                    self.spans.record(job, name, position, position + seconds, pipelined=True)
+                position += seconds
+            with self._stats_lock:
+                for target in ([job] if job.parent is None else [job, job.parent]):
+                    target.postprocess_seconds += result['finished'] - result['started']
+            job.file_path = result['filepath']
+            self._archive_file(info, variant, result['filepath'])
+        else:
+            print(f"Post-processing failed for {job.name}: {error}")
+        self.scheduler.release(job, error)
+
+    def _submit_entry(self, parent, entry, position, playlist_info, profile, ydl_opts, progress_hook):
+        """Queue one playlist entry as a child job of the playlist"""
+        url = entry.get('url') or entry.get('webpage_url') or entry.get('id')
+        extra_info = dict(playlist_info, playlist_index=position)
+        progress = parent.progress
+
+        def run(job):
+            def hook(d):
+                progress.update(position, d)
+                if progress_hook:
+                    progress_hook(parent, d)
+            notify = (lambda d: progress_hook(parent, d)) if progress_hook else None
+            try:
+                self._with_retries(job, url, lambda: self._download(job, url, profile, ydl_opts, [hook], None,
+                                                                    ie_key=entry.get('ie_key'),
+                                                                    extra_info=extra_info), notify)
+            except Exception:
+                progress.finish(position, False)
+                raise
+            progress.finish(position, True)
+            if job.media_duration:
+                with self._stats_lock:
+                    parent.media_duration = (parent.media_duration or 0) + job.media_duration
+
+        return self._submit(run, url, "Playlist Entry", ydl_opts, parent.priority, parent=parent,
+                            entry_id=entry.get('id') or entry.get('url'))
+
+    def _download(self, job, url, profile, ydl_opts, hooks, progress_hook, ie_key=None, extra_info=None):
+        """Run yt-dlp for a job on a pooled instance with engine and caller hooks attached"""
+        variant = archive_variant(ydl_opts)
+        handoff = None
+        if self.settings["pipeline_postprocessing"] and ydl_opts.get('postprocessors'):
+            # Download without postprocessors; they run on the post-processing pool
+            pp_opts = {'quiet': self.quiet, 'no_warnings': self.quiet,
+                       'postprocessors': ydl_opts['postprocessors']}
+            ydl_opts = {k: v for k, v in ydl_opts.items() if k != 'postprocessors'}
+            handoff = lambda info: self._hand_off(job, info, pp_opts, variant)
+        record_hook, postprocessor_hook, timeline = self._record_hooks(job, variant, handoff)
+        progress_hooks = [record_hook] + list(hooks)
+        if progress_hook:
+            progress_hooks.append(lambda d: progress_hook(job, d))
+        opts = apply_connections(dict(ydl_opts), self.settings["connections_per_download"])
+        request = opts.pop('format_request', None)
+        if request and self.settings["rank_formats"]:
+            opts['format'] = FormatSelector(request['quality'], request['ext'], self.can_merge())
+        if opts.get('writethumbnail'):
+            # Copied from the shared thumbnail cache instead of fetched for every job
+            opts.update(writethumbnail=False, cache_thumbnail=True)
+        # Small fixed reads keep progress hooks (and so the bandwidth governor) frequent
+        opts.update(buffersize=64 * 1024, noresizebuffer=True)
+        # yt-dlp checks the archive too, e.g. for playlists inside audio jobs
+        opts['download_archive'] = self.archive.view(variant)
+        if self.quiet:
+            opts.update(quiet=True, no_warnings=True, noprogress=True)
+        key = canonical_key(url)
+        cached = self.metadata_cache.get(key, FULL)
+        timeline['attrs']['cached'] = cached is not None
+        try:
+            with self.ydl_pool.acquire(profile, opts, progress_hooks, [postprocessor_hook]) as ydl:
+                if cached is not None:
+                    try:
+                        # Reuse the extraction from get_video_info instead of extracting again
+                        ydl.process_ie_result(cached, download=True, extra_info=extra_info or {})
+                        return
+                    except get_yt_dlp().utils.DownloadError as e:
+                        # Stream URLs in cached info expire; fall back to a fresh extraction
+                        print(f"Cached info failed for {url}: {e}; extracting again")
+                        self.metadata_cache.invalidate(key, FULL)
+                        timeline.update(stage='extract', start=time.time(), attrs={'cached': False})
+                ydl.extract_info(url, ie_key=ie_key, extra_info=extra_info or {})
+        except BaseException as e:
+            # Close the stage the job failed in, so slow failures show up too
+            if timeline['stage']:
+                self.spans.record(job, timeline['stage'], timeline['start'], time.time(),
+                                  error=type(e).__name__, **timeline['attrs'])
+            raise
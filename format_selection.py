@@ -0,0 +1,206 @@
+"""Ranking of extracted formats to pick what to download
+
+Format strings like best[height<=1080][ext=mp4] only match pre-muxed
+formats, which YouTube offers up to 720p at most. This ranks the video-only,
+audio-only and muxed formats of an info dict instead and picks the best
+video+audio pair (or a muxed format when it is as good) for the requested
+height and container.
+"""
+
+# Codec families each container can hold, most preferred first
+CONTAINER_CODECS = {
+    'mp4': (('avc1', 'av01', 'hevc', 'vp09'), ('mp4a', 'opus', 'mp3', 'ac-3', 'ec-3')),
+    'webm': (('vp09', 'av01', 'vp8'), ('opus', 'vorbis')),
+    'mkv': (('av01', 'vp09', 'hevc', 'avc1', 'vp8'), ('opus', 'mp4a', 'vorbis', 'flac', 'ac-3', 'ec-3', 'mp3')),
+}
+
+CODEC_ALIASES = {
+    'h264': 'avc1', 'avc': 'avc1', 'avc3': 'avc1',
+    'h265': 'hevc', 'hev1': 'hevc', 'hvc1': 'hevc',
+    'vp9': 'vp09', 'av1': 'av01',
+    'aac': 'mp4a', 'ac3': 'ac-3', 'eac3': 'ec-3',
+}
+
+
+def codec_family(codec):
+    """Normalize a codec string ("avc1.64001F", "vp9", "none") to its family"""
+    if not codec or codec == 'none':
+        return codec
+    family = codec.lower().split('.')[0]
+    return CODEC_ALIASES.get(family, family)
+
+
+def has_video(f):
+    """Formats whose video codec is unknown are assumed to carry video"""
+    return f.get('vcodec') != 'none'
+
+
+def has_audio(f):
+    """Formats whose audio codec is unknown are assumed to carry audio"""
+    return f.get('acodec') != 'none'
+
+
+def format_size(f, duration=None):
+    """Return the known or approximate size of a format in bytes (0 if unknown)"""
+    size = f.get('filesize') or f.get('filesize_approx')
+    if not size and duration and f.get('tbr'):
+        size = f['tbr'] * 1000 / 8 * duration
+    return int(size or 0)
+
+
+def _usable(f):
+    """Skip storyboards, DRM protected and deprioritized formats"""
+    return (f.get('url') is not None and f.get('protocol') != 'mhtml' and not f.get('has_drm')
+            and (has_video(f) or has_audio(f)) and (f.get('preference') or 0) > -1000)
+
+
+def _codec_rank(codec, preferred):
+    """Higher is better; codecs the container cannot hold rank lowest"""
+    family = codec_family(codec)
+    return len(preferred) - preferred.index(family) if family in preferred else 0
+
+
+def _video_key(f, container):
+    video_codecs = CONTAINER_CODECS.get(container, CONTAINER_CODECS['mkv'])[0]
+    codec = _codec_rank(f.get('vcodec'), video_codecs)
+    # Unknown codecs (generic extractors) are trusted to fit their own container
+    fits = codec > 0 or (f.get('vcodec') is None and f.get('ext') == container)
+    return (fits, f.get('height') or 0, codec, f.get('fps') or 0, f.get('tbr') or f.get('vbr') or 0)
+
+
+def _audio_key(f, container):
+    audio_codecs = CONTAINER_CODECS.get(container, CONTAINER_CODECS['mkv'])[1]
+    codec = _codec_rank(f.get('acodec'), audio_codecs)
+    # language_preference marks the original track over dubs
+    return (f.get('language_preference') or 0, codec, f.get('abr') or f.get('tbr') or 0)
+
+
+def parse_height(quality):
+    """Return the height limit of a quality setting ("1080p" -> 1080), or None"""
+    if quality and quality.endswith('p') and quality[:-1].isdigit():
+        return int(quality[:-1])
+    return None
+
+
+def rank_video(formats, max_height=None, container='mp4', worst=False):
+    """Return formats with video, best first (or worst first)
+
+    Formats above max_height are left out unless nothing is at or below it,
+    in which case the lowest available height is used.
+    """
+    candidates = [f for f in formats if _usable(f) and has_video(f)]
+    if max_height:
+        within = [f for f in candidates if (f.get('height') or 0) <= max_height]
+        if not within and candidates:
+            lowest = min(f.get('height') or 0 for f in candidates)
+            within = [f for f in candidates if (f.get('height') or 0) == lowest]
+        candidates = within
+    ranked = sorted(candidates, key=lambda f: _video_key(f, container), reverse=True)
+    if worst:
+        # Still in a codec the container holds, if there is one
+        ranked.sort(key=lambda f: (not _video_key(f, container)[0], f.get('height') or 0, f.get('tbr') or 0))
+    return ranked
+
+
+def rank_audio(formats, container='mp4', worst=False):
+    """Return audio-only formats, best first (or worst first)"""
+    candidates = [f for f in formats if _usable(f) and has_audio(f) and not has_video(f)]
+    ranked = sorted(candidates, key=lambda f: _audio_key(f, container), reverse=True)
+    if worst:
+        audio_codecs = CONTAINER_CODECS.get(container, CONTAINER_CODECS['mkv'])[1]
+        ranked.sort(key=lambda f: (not _codec_rank(f.get('acodec'), audio_codecs), f.get('abr') or f.get('tbr') or 0))
+    return ranked
+
+
+def merged_format(video, audio, container='mp4', duration=None):
+    """Build the format dict yt-dlp downloads as a video+audio pair"""
+    video_codecs, audio_codecs = CONTAINER_CODECS.get(container, CONTAINER_CODECS['mkv'])
+    fits = (codec_family(video.get('vcodec')) in video_codecs and
+            codec_family(audio.get('acodec')) in audio_codecs)
+    sizes = format_size(video, duration), format_size(audio, duration)
+    return {
+        'format_id': f"{video['format_id']}+{audio['format_id']}",
+        'format': f"{video.get('format') or video['format_id']}+{audio.get('format') or audio['format_id']}",
+        'ext': container if fits else 'mkv',
+        'requested_formats': [video, audio],
+        'protocol': f"{video.get('protocol')}+{audio.get('protocol')}",
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'fps': video.get('fps'),
+        'vcodec': video.get('vcodec'),
+        'acodec': audio.get('acodec'),
+        'vbr': video.get('vbr') or video.get('tbr'),
+        'abr': audio.get('abr') or audio.get('tbr'),
+        'tbr': (video.get('tbr') or 0) + (audio.get('tbr') or 0) or None,
+        # Only when both sizes are known; half a size is worse than none
+        'filesize_approx': sum(sizes) if all(sizes) else None,
+    }
+
+
+def select_format(formats, quality='best', container='mp4', can_merge=True, duration=None):
+    """Pick the format to download for a quality setting ("best", "worst", "1080p")
+
+    Returns a format from the list (muxed) or a merged video+audio format,
+    or None if nothing usable was found. A muxed format wins when its video
+    ranks as high as the best video-only one, since it needs no merging.
+    """
+    worst = quality == 'worst'
+    videos = rank_video(formats, parse_height(quality), container, worst)
+    muxed = [f for f in videos if has_audio(f)]
+    video_only = [f for f in videos if not has_audio(f)]
+    audios = rank_audio(formats, container, worst)
+    if can_merge and video_only and audios:
+        pair = merged_format(video_only[0], audios[0], container, duration)
+        if not muxed:
+            return pair
+        best_muxed, best_video = muxed[0], video_only[0]
+        if worst:
+            prefer_muxed = (best_muxed.get('height') or 0) <= (best_video.get('height') or 0)
+        else:
+            prefer_muxed = _video_key(best_muxed, container)[:2] >= _video_key(best_video, container)[:2]
+        return best_muxed if prefer_muxed else pair
+    if muxed:
+        return muxed[0]
+    # Audio-only sources (e.g. music uploads)
+    return audios[0] if audios else None
+
+
+def describe_format(f, duration=None):
+    """Return a short description such as "1080p avc1+mp4a mp4, ~245 MB" """
+    parts = []
+    if f.get('height'):
+        parts.append(f"{f['height']}p")
+    codecs = '+'.join(codec for codec in (codec_family(f.get('vcodec')), codec_family(f.get('acodec')))
+                      if codec and codec != 'none')
+    if codecs:
+        parts.append(codecs)
+    parts.append(f.get('ext') or '?')
+    text = ' '.join(parts)
+    size = format_size(f, duration)
+    if size:
+        text += f", {'' if f.get('filesize') else '~'}{size / 1024 / 1024:.0f} MB"
+    return text
+
+
+class FormatSelector:
+    """yt-dlp format selector (the `format` option may be a callable) using select_format
+
+    Falls back to the format yt-dlp ranks best when nothing matched.
+    """
+
+    def __init__(self, quality='best', container='mp4', can_merge=True):
+        self.quality = quality
+        self.container = container
+        self.can_merge = can_merge
+
+    def __call__(self, ctx):
+        formats = ctx.get('formats') or []
+        selected = select_format(formats, self.quality, self.container, self.can_merge)
+        if selected is None and formats:
+            selected = formats[-1]
+        if selected is not None:
+            yield selected
+
+    def __repr__(self):
+        # Stable, so pooled YoutubeDL instances are keyed by the request
+        return f"FormatSelector({self.quality!r}, {self.container!r}, can_merge={self.can_merge})"
@@ -0,0 +1,77 @@
+"""SQLite-backed download history"""
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+
+class HistoryStore:
+    """Persistent, indexed download history with paged reads"""
+
+    def __init__(self, path="history.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                video_id TEXT,
+                type TEXT NOT NULL,
+                info TEXT,
+                file_path TEXT,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                duration REAL,
+                started_at REAL,
+                finished_at REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_created ON history (created_at);
+            CREATE INDEX IF NOT EXISTS idx_history_video_id ON history (video_id);
+            CREATE INDEX IF NOT EXISTS idx_history_type ON history (type);
+        """)
+        self._conn.commit()
+
+    def add(self, url, type_str, info="", video_id=None, file_path=None, bytes=0,
+            duration=None, started_at=None, finished_at=None):
+        """Insert a history entry and return its id"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO history (url, video_id, type, info, file_path, bytes, duration, "
+                "started_at, finished_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, video_id, type_str, info, file_path, bytes or 0, duration,
+                 started_at, finished_at, time.time()))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def count(self):
+        """Return the number of entries"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def totals(self):
+        """Return entry count and total bytes"""
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM history").fetchone()
+        return {'count': count, 'bytes': size}
+
+    def page(self, offset, limit):
+        """Return entries newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM history ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry['timestamp'] = datetime.fromtimestamp(entry['created_at']).strftime("%Y-%m-%d %H:%M:%S")
+            entries.append(entry)
+        return entries
+
+    def clear(self):
+        """Delete every entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM history")
+            self._conn.commit()
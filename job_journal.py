@@ -0,0 +1,108 @@
+"""Crash-safe journal of queued and running downloads"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+QUEUED = "queued"
+RUNNING = "running"
+
+
+def partial_size(path):
+    """Return how many bytes of a partial download exist on disk
+
+    Segmented downloads preallocate the whole .part file and keep their
+    per-segment offsets in a .segments file next to it.
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path + '.segments', 'r') as f:
+            return sum(position - start for start, position, end in json.load(f))
+    except (OSError, ValueError):
+        return os.path.getsize(path)
+
+
+class JobJournal:
+    """Write-ahead record of unfinished top-level jobs
+
+    A job is written here before it is queued and removed once it has
+    finished, so anything left in the journal at startup was cut short by
+    a crash or by closing the app. Entries keep the resolved yt-dlp options
+    (output template included) so a resumed job writes to the same file
+    and yt-dlp continues its .part file with a range request.
+    """
+
+    def __init__(self, path="jobs.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = FULL;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                options TEXT NOT NULL,
+                params TEXT NOT NULL,
+                state TEXT NOT NULL,
+                file_path TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def add(self, kind, url, options, params=None):
+        """Record a job that is about to be queued and return its journal id"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, url, options, params, state, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, url, json.dumps(options), json.dumps(params or {}), QUEUED, now, now))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def set_state(self, journal_id, state):
+        """Update the recorded state of a job"""
+        self._update(journal_id, "state = ?", state)
+
+    def set_file_path(self, journal_id, file_path):
+        """Record the file a job is currently writing"""
+        self._update(journal_id, "file_path = ?", file_path)
+
+    def remove(self, journal_id):
+        """Forget a job that finished"""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (journal_id,))
+            self._conn.commit()
+
+    def pending(self):
+        """Return unfinished jobs oldest first, with the size of any partial file"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry['options'] = json.loads(entry['options'])
+            entry['params'] = json.loads(entry['params'])
+            entry['partial_bytes'] = partial_size(entry['file_path'])
+            entries.append(entry)
+        return entries
+
+    def clear(self):
+        """Forget every unfinished job"""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs")
+            self._conn.commit()
+
+    def _update(self, journal_id, assignment, value):
+        """Set one column of a journal entry"""
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignment}, updated_at = ? WHERE id = ?",
+                               (value, time.time(), journal_id))
+            self._conn.commit()
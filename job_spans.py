@@ -0,0 +1,128 @@
+"""Per-job timing spans in a bounded ring, exported as Prometheus text and JSON lines"""
+import collections
+import json
+import threading
+
+# No-op postprocessors whose hook events mark stage boundaries inside yt-dlp:
+# (marker, when it runs, stage that starts there). Extraction ends at
+# pre_process, format selection at video, writing extras (thumbnails,
+# subtitles, info JSON) at before_dl.
+STAGE_MARKERS = (
+    ('SpanExtracted', 'pre_process', 'format'),
+    ('SpanFormatSelected', 'video', 'prepare'),
+    ('SpanDownloadStarting', 'before_dl', 'download'),
+)
+MARKER_STAGES = {marker: stage for marker, _, stage in STAGE_MARKERS}
+# Display order; postprocessor stages go between download and move
+STAGE_ORDER = ('queue', 'extract', 'format', 'prepare', 'download', 'postprocess_queue')
+LAST_STAGES = ('move', 'total')
+QUANTILES = (('p50', 0.5), ('p95', 0.95))
+SPAN_CAPACITY = 5000
+
+_marker_classes = {}
+
+
+def add_stage_markers(ydl):
+    """Add the marker postprocessors to a YoutubeDL"""
+    from yt_dlp.postprocessor.common import PostProcessor
+
+    def run(self, info):
+        return [], info
+
+    for marker, when, _ in STAGE_MARKERS:
+        cls = _marker_classes.get(marker)
+        if cls is None:
+            # Built through the metaclass so run() reports started/finished to hooks
+            cls = _marker_classes[marker] = type(PostProcessor)(f"{marker}PP", (PostProcessor,), {'run': run})
+        ydl.add_post_processor(cls(), when=when)
+
+
+def stage_sort_key(stage):
+    """Order stages as a job passes through them"""
+    if stage in STAGE_ORDER:
+        return 0, STAGE_ORDER.index(stage), stage
+    if stage in LAST_STAGES:
+        return 2, LAST_STAGES.index(stage), stage
+    return 1, 0, stage
+
+
+def quantile(ordered, q):
+    """Nearest-rank quantile of a sorted list"""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class SpanRecorder:
+    """Keeps the most recent spans plus running totals per stage
+
+    Percentiles are computed over the spans still in the ring; counts and
+    sums cover everything recorded since startup, as Prometheus expects.
+    """
+
+    def __init__(self, capacity=SPAN_CAPACITY):
+        self.spans = collections.deque(maxlen=capacity)
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, job, stage, started, finished, **attrs):
+        """Record that a job spent started..finished (epoch seconds) in a stage"""
+        span = {
+            'job': job.id,
+            'parent': job.parent.id if job.parent else None,
+            'kind': job.kind,
+            'name': job.name,
+            'stage': stage,
+            'start': round(started, 6),
+            'seconds': round(max(0.0, finished - started), 6),
+        }
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+            total = self.totals.setdefault(stage, [0, 0.0])
+            total[0] += 1
+            total[1] += span['seconds']
+        return span
+
+    def recent(self, limit=None):
+        """Return the newest spans, oldest first"""
+        with self._lock:
+            spans = list(self.spans)
+        return spans[-limit:] if limit else spans
+
+    def summary(self):
+        """Return count, mean, p50, p95 and max seconds per stage, in stage order"""
+        by_stage = {}
+        with self._lock:
+            for span in self.spans:
+                by_stage.setdefault(span['stage'], []).append(span['seconds'])
+            totals = {stage: list(total) for stage, total in self.totals.items()}
+        result = {}
+        for stage in sorted(by_stage, key=stage_sort_key):
+            ordered = sorted(by_stage[stage])
+            result[stage] = {
+                'count': totals[stage][0],
+                'mean': sum(ordered) / len(ordered),
+                'max': ordered[-1],
+            }
+            result[stage].update((key, quantile(ordered, q)) for key, q in QUANTILES)
+        return result
+
+    def json_lines(self, limit=None):
+        """Return the newest spans as JSON lines"""
+        return ''.join(json.dumps(span) + '\n' for span in self.recent(limit))
+
+    def prometheus(self, prefix='ytdl'):
+        """Return a Prometheus summary of stage durations"""
+        name = f"{prefix}_stage_seconds"
+        lines = [f"# HELP {name} Time jobs spent in each stage (quantiles over recent spans)",
+                 f"# TYPE {name} summary"]
+        with self._lock:
+            totals = {stage: list(total) for stage, total in self.totals.items()}
+        summary = self.summary()
+        for stage in sorted(totals, key=stage_sort_key):
+            label = stage.replace('\\', '\\\\').replace('"', '\\"')
+            if stage in summary:
+                for key, q in QUANTILES:
+                    lines.append(f'{name}{{stage="{label}",quantile="{q}"}} {summary[stage][key]:.6f}')
+            lines.append(f'{name}_sum{{stage="{label}"}} {totals[stage][1]:.6f}')
+            lines.append(f'{name}_count{{stage="{label}"}} {totals[stage][0]}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,98 @@
+"""Persistent cache for yt-dlp extraction results"""
+import json
+import sqlite3
+import threading
+import time
+
+FLAT = "flat"
+FULL = "full"
+
+
+class MetadataCache:
+    """SQLite-backed info dict cache with per-kind TTLs and a size-capped LRU"""
+
+    def __init__(self, path="metadata_cache.db", flat_ttl=3600, full_ttl=1800, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.ttl = {FLAT: flat_ttl, FULL: full_ttl}
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS metadata (
+                key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                data TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (key, kind)
+            );
+            CREATE INDEX IF NOT EXISTS idx_metadata_accessed ON metadata (accessed_at);
+        """)
+        self._conn.commit()
+
+    def get(self, key, kind):
+        """Return a cached info dict, or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, fetched_at FROM metadata WHERE key = ? AND kind = ?", (key, kind)).fetchone()
+            if row is None or now - row[1] > self.ttl[kind]:
+                if row is not None:
+                    self._conn.execute("DELETE FROM metadata WHERE key = ? AND kind = ?", (key, kind))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE metadata SET accessed_at = ? WHERE key = ? AND kind = ?",
+                               (now, key, kind))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, kind, info):
+        """Store an info dict and evict least recently used entries over the size cap"""
+        data = json.dumps(info)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, kind, data, len(data), now, now))
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, key, kind=None):
+        """Remove one key (all kinds unless given)"""
+        with self._lock:
+            if kind is None:
+                self._conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+            else:
+                self._conn.execute("DELETE FROM metadata WHERE key = ? AND kind = ?", (key, kind))
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM metadata")
+            self._conn.commit()
+
+    def stats(self):
+        """Return entry count, stored bytes and hit/miss counters"""
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM metadata").fetchone()
+        return {'entries': count, 'bytes': size, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+    def _evict(self):
+        """Drop least recently used rows until under max_bytes (lock must be held)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM metadata").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, kind, size FROM metadata ORDER BY accessed_at").fetchall()
+        for key, kind, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM metadata WHERE key = ? AND kind = ?", (key, kind))
+            total -= size
+            self.evictions += 1
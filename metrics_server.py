@@ -0,0 +1,55 @@
+"""Localhost HTTP endpoint exposing engine metrics"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """GET /metrics (Prometheus text) and /spans?limit=N (JSON lines)"""
+
+    def log_message(self, format, *args):
+        """Scrapes are frequent; keep the console quiet"""
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        engine = self.server.engine
+        if parsed.path == '/metrics':
+            body, content_type = engine.metrics_text(), 'text/plain; version=0.0.4'
+        elif parsed.path == '/spans':
+            limit = parse_qs(parsed.query).get('limit', [''])[0]
+            body = engine.spans.json_lines(int(limit) if limit.isdigit() else None)
+            content_type = 'application/x-ndjson'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MetricsServer:
+    """Serves an engine's metrics on 127.0.0.1 from a background thread"""
+
+    def __init__(self, engine, port):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), MetricsRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.engine = engine
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+
+    @property
+    def url(self):
+        """Base URL of the endpoint"""
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        """Start serving"""
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
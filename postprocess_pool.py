@@ -0,0 +1,192 @@
+"""Post-processing pipeline stage running yt-dlp postprocessors in worker processes"""
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Per worker process: YoutubeDL instances by options, the timings of the running call and
+# the queue that tells the pool when a task starts
+_worker_ydls = {}
+_worker_timings = {}
+_worker_started = None
+
+
+def _init_worker(started_queue):
+    """Initializer of each worker process"""
+    global _worker_started
+    _worker_started = started_queue
+
+
+def _record_timing(d):
+    """Postprocessor hook inside a worker process"""
+    name = d.get('postprocessor')
+    if d['status'] == 'started':
+        _worker_timings[name] = -time.time()
+    elif d['status'] == 'finished' and name in _worker_timings:
+        _worker_timings[name] += time.time()
+
+
+def run_postprocessors(task_id, filepath, info, opts):
+    """Run the configured postprocessors on a downloaded file (in a worker process)"""
+    if _worker_started is not None:
+        # Sent before any work, so the pool sees the start while the task runs
+        _worker_started.put((task_id, time.time()))
+    import yt_dlp
+
+    key = json.dumps(opts, sort_keys=True)
+    ydl = _worker_ydls.get(key)
+    if ydl is None:
+        ydl = _worker_ydls[key] = yt_dlp.YoutubeDL(dict(opts))
+        ydl.add_postprocessor_hook(_record_timing)
+    _worker_timings.clear()
+    started = time.time()
+    info = ydl.post_process(filepath, info)
+    return {
+        'filepath': info.get('filepath') or filepath,
+        'started': started,
+        'finished': time.time(),
+        'timings': dict(_worker_timings),
+    }
+
+
+class StageStats:
+    """Queue depth and timing counters of one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.queued = 0
+        self.active = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.max_busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def enqueue(self):
+        """An item entered the stage's queue"""
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+    def start(self, waited):
+        """An item left the queue after waiting `waited` seconds"""
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.wait_seconds += waited
+
+    def cancel(self, failed=False):
+        """An item left the queue without being worked on (failed: it was lost, not cancelled)"""
+        with self._lock:
+            self.queued -= 1
+            if failed:
+                self.failed += 1
+
+    def finish(self, busy, success=True):
+        """An item finished after `busy` seconds of work"""
+        with self._lock:
+            self.active -= 1
+            self.busy_seconds += busy
+            self.max_busy_seconds = max(self.max_busy_seconds, busy)
+            if success:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self):
+        """Return the counters with mean wait and busy times"""
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                'queued': self.queued,
+                'active': self.active,
+                'max_queued': self.max_queued,
+                'completed': self.completed,
+                'failed': self.failed,
+                'mean_wait_seconds': round(self.wait_seconds / finished, 3) if finished else 0.0,
+                'mean_busy_seconds': round(self.busy_seconds / finished, 3) if finished else 0.0,
+                'max_busy_seconds': round(self.max_busy_seconds, 3),
+                'busy_seconds': round(self.busy_seconds, 3),
+            }
+
+
+class PostprocessPool:
+    """Process pool that post-processes finished downloads off the download workers
+
+    Sized to the CPU count by default, since ffmpeg transcoding is CPU
+    bound. Workers are spawned (not forked) because the app process runs
+    Tk and download threads. The pool starts on first use.
+    """
+
+    def __init__(self, max_workers=0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.stats = StageStats('postprocess')
+        self._executor = None
+        self._started = None
+        # Submit time and (once the worker reports it) start time of every unfinished task
+        self._tasks = {}
+        self._task_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, filepath, info, opts, callback):
+        """Queue post-processing of a file; callback(result, error) runs when it is done"""
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context('spawn')
+                self._started = context.SimpleQueue()
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context,
+                                                     initializer=_init_worker, initargs=(self._started,))
+            executor, started_queue = self._executor, self._started
+            task_id = next(self._task_ids)
+            self._tasks[task_id] = {'submitted': time.time(), 'started': None}
+        self.stats.enqueue()
+        future = executor.submit(run_postprocessors, task_id, filepath, info, opts)
+        future.add_done_callback(lambda f: self._done(f, task_id, started_queue, callback))
+        return future
+
+    def snapshot(self):
+        """Return stage counters, with the starts workers have reported so far"""
+        self._collect_starts(self._started)
+        result = self.stats.snapshot()
+        result['workers'] = self.max_workers
+        return result
+
+    def shutdown(self, wait=False):
+        """Stop the workers; queued items are cancelled"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _collect_starts(self, started_queue):
+        """Move tasks whose worker has reported its start from queued to active"""
+        if started_queue is None:
+            return
+        with self._lock:
+            while not started_queue.empty():
+                task_id, started = started_queue.get()
+                task = self._tasks.get(task_id)
+                if task is not None and task['started'] is None:
+                    task['started'] = started
+                    self.stats.start(max(0.0, started - task['submitted']))
+
+    def _done(self, future, task_id, started_queue, callback):
+        """Record timings of a finished item and report it"""
+        error = future.exception() if not future.cancelled() else RuntimeError("Post-processing cancelled")
+        result = None if error else future.result()
+        # A worker reports its start before its result, so it is in the queue by now
+        self._collect_starts(started_queue)
+        with self._lock:
+            task = self._tasks.pop(task_id)
+        if task['started'] is None:
+            # Cancelled, or lost with a worker process that died
+            self.stats.cancel(failed=not future.cancelled())
+        else:
+            finished = result['finished'] if result else time.time()
+            self.stats.finish(max(0.0, finished - task['started']), success=error is None)
+        callback(result, error)
@@ -0,0 +1,112 @@
+"""Coalescing, rate-limited progress delivery for the UI"""
+import threading
+
+
+def progress_state(d):
+    """Reduce a yt-dlp progress hook dict to the fields the UI needs
+
+    Streams without a known size still report total_bytes_estimate, so it is
+    used as a fallback for the fraction.
+    """
+    downloaded = d.get('downloaded_bytes') or 0
+    total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+    if d.get('status') == 'finished':
+        fraction = 1.0
+    else:
+        fraction = min(downloaded / total, 1.0) if total else 0.0
+    return {
+        'status': d.get('status'),
+        'downloaded_bytes': downloaded,
+        'total_bytes': total,
+        'estimated': not d.get('total_bytes') and bool(total),
+        'fraction': fraction,
+        'speed': d.get('speed'),
+        'eta': d.get('eta'),
+        'filename': d.get('filename', ''),
+        # Set while the engine waits to retry the job (see DownloadEngine._with_retries)
+        'retry': ({'in': d.get('retry_in') or 0, 'attempt': d.get('attempt'), 'reason': d.get('reason')}
+                  if d.get('status') == 'retrying' else None),
+    }
+
+
+def retry_text(retry):
+    """Describe a pending retry, e.g. "Retrying in 12s (throttled failure, attempt 2)" """
+    return f"Retrying in {retry['in']:.0f}s ({retry['reason']}, attempt {retry['attempt']})"
+
+
+class ProgressBus:
+    """Thread-safe bus that keeps the latest state per key and flushes at a fixed rate
+
+    Worker threads call publish() as often as yt-dlp reports progress; only
+    the newest state per key survives until the next flush, which runs on
+    the Tk main loop via root.after.
+    """
+
+    def __init__(self, hz=15):
+        self.interval_ms = max(1, int(1000 / hz))
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.flushes = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._root = None
+        self._after_id = None
+
+    def start(self, root):
+        """Start flushing on the given Tk root"""
+        self._root = root
+        self._schedule()
+
+    def stop(self):
+        """Stop flushing and drop anything pending"""
+        if self._root is not None and self._after_id is not None:
+            self._root.after_cancel(self._after_id)
+        self._root = None
+        with self._lock:
+            self.dropped += len(self._pending)
+            self._pending.clear()
+
+    def publish(self, key, state, callback):
+        """Queue callback(state) for the next flush, replacing any pending state for key"""
+        with self._lock:
+            self.published += 1
+            if self._root is None:
+                self.dropped += 1
+                return
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = (callback, state)
+
+    def stats(self):
+        """Return event counters"""
+        with self._lock:
+            return {'published': self.published, 'coalesced': self.coalesced,
+                    'dropped': self.dropped, 'delivered': self.delivered,
+                    'flushes': self.flushes, 'pending': len(self._pending)}
+
+    def _schedule(self):
+        """Arm the next flush"""
+        if self._root is not None:
+            self._after_id = self._root.after(self.interval_ms, self._flush)
+
+    def _flush(self):
+        """Deliver the latest state for every key (main thread)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.flushes += 1
+        delivered = dropped = 0
+        for callback, state in pending.values():
+            try:
+                callback(state)
+                delivered += 1
+            except Exception as e:
+                # Widget destroyed or similar; the event is lost
+                dropped += 1
+                print(f"Error delivering progress: {e}")
+        # Counted under the lock like publish(); callbacks run without it
+        with self._lock:
+            self.delivered += delivered
+            self.dropped += dropped
+        self._schedule()
@@ -0,0 +1,188 @@
+"""Retry policy and per-host circuit breaker shared by all jobs
+
+Failures are classified as throttled (the site is rate limiting us),
+transient (network trouble that may go away) or permanent (the video is
+unavailable, the URL is unsupported, ...). Throttled and transient
+failures are retried with exponential backoff and full jitter; a throttled
+failure also opens the circuit breaker of its host, which holds back new
+extractions for that host until a single probe gets through.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+from url_utils import parse_youtube_url
+
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+THROTTLE_MARKERS = ('HTTP Error 429', 'Too Many Requests', 'rate-limit', 'rate limit',
+                    "confirm you're not a bot", "confirm you’re not a bot")
+# Checked before the transient markers: "Unable to download webpage: HTTP Error 404" is permanent
+PERMANENT_MARKERS = ('Video unavailable', 'Private video', 'This video has been removed',
+                     'This video is not available', 'not available in your country',
+                     'members-only', 'Join this channel', 'confirm your age', 'copyright',
+                     'Unsupported URL', 'is not a valid URL', 'HTTP Error 404', 'HTTP Error 410',
+                     'Requested format is not available', 'Premieres in', 'live event will begin')
+TRANSIENT_MARKERS = ('timed out', 'Timeout', 'Connection reset', 'Connection refused',
+                     'Connection aborted', 'RemoteDisconnected', 'IncompleteRead',
+                     'Temporary failure in name resolution', 'Name or service not known',
+                     'Network is unreachable', 'EOF occurred', 'SSL', 'HTTP Error 403',
+                     'HTTP Error 500', 'HTTP Error 502', 'HTTP Error 503', 'HTTP Error 504',
+                     'Did not get any data blocks', 'content too short', 'fragment')
+
+# Attempts after the first one, per kind
+MAX_RETRIES = {THROTTLED: 8, TRANSIENT: 4, PERMANENT: 0}
+# Throttled failures back off from a longer base delay
+BASE_DELAYS = {THROTTLED: 10.0, TRANSIENT: 2.0}
+MAX_DELAY = 300.0
+BREAKER_BASE_DELAY = 30.0
+BREAKER_MAX_DELAY = 900.0
+
+
+def _causes(error):
+    """Yield an error and the errors it wraps (DownloadError.exc_info, __cause__)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        exc_info = getattr(error, 'exc_info', None)
+        wrapped = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = wrapped or error.__cause__ or error.__context__
+
+
+def classify(error):
+    """Return THROTTLED, TRANSIENT or PERMANENT for a job error"""
+    causes = list(_causes(error))
+    for cause in causes:
+        status = getattr(cause, 'status', None) or getattr(cause, 'code', None)
+        if status == 429:
+            return THROTTLED
+    text = ' '.join(str(cause) for cause in causes)
+    if any(marker in text for marker in THROTTLE_MARKERS):
+        return THROTTLED
+    if any(marker in text for marker in PERMANENT_MARKERS):
+        return PERMANENT
+    for cause in causes:
+        status = getattr(cause, 'status', None) or getattr(cause, 'code', None)
+        if isinstance(status, int) and (status >= 500 or status in (403, 408)):
+            return TRANSIENT
+        if isinstance(cause, (ConnectionError, TimeoutError)):
+            return TRANSIENT
+        if type(cause).__name__ in ('TransportError', 'IncompleteRead', 'ContentTooShortError', 'SSLError',
+                                    'ProxyError'):
+            return TRANSIENT
+    if any(marker in text for marker in TRANSIENT_MARKERS):
+        return TRANSIENT
+    return PERMANENT
+
+
+def host_key(url):
+    """Return the host a URL's requests go to; all YouTube URLs share one"""
+    video_id, playlist_id = parse_youtube_url(url)
+    if video_id or playlist_id:
+        return 'youtube.com'
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class RetryPolicy:
+    """Decides whether and when a failed attempt is retried"""
+
+    def __init__(self, max_retries=None, base_delays=None, max_delay=MAX_DELAY, rng=random.random):
+        self.max_retries = dict(MAX_RETRIES, **(max_retries or {}))
+        self.base_delays = dict(BASE_DELAYS, **(base_delays or {}))
+        self.max_delay = max_delay
+        self.rng = rng
+
+    def should_retry(self, kind, retries):
+        """Check whether an attempt failing with kind is retried after `retries` earlier retries"""
+        return retries < self.max_retries.get(kind, 0)
+
+    def delay(self, kind, retries):
+        """Seconds to wait before retry number retries + 1 (full jitter)"""
+        ceiling = min(self.max_delay, self.base_delays.get(kind, 1.0) * 2 ** retries)
+        return self.rng() * ceiling
+
+
+class CircuitBreaker:
+    """Per-host breaker: closed, open (no new extractions) or half-open (one probe)
+
+    A throttled failure opens the breaker for a backoff that doubles with
+    every consecutive throttled probe. Once it expires, the first caller of
+    acquire() becomes the probe while the others keep waiting; the probe's
+    success closes the breaker.
+    """
+
+    def __init__(self, base_delay=BREAKER_BASE_DELAY, max_delay=BREAKER_MAX_DELAY, rng=random.random):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng
+        self._hosts = {}
+        self._cond = threading.Condition()
+
+    def acquire(self, host, stopping=None, on_wait=None):
+        """Block until an extraction may start for host; returns False if stopping was set
+
+        on_wait(seconds) is called when the caller starts waiting for an open breaker.
+        """
+        with self._cond:
+            notified = False
+            while True:
+                state = self._hosts.get(host)
+                if state is None or state['state'] == 'closed':
+                    return True
+                now = time.time()
+                if state['state'] == 'open' and now >= state['open_until']:
+                    state['state'] = 'half-open'
+                    state['probe'] = threading.get_ident()
+                    return True
+                if state['state'] == 'half-open' and state['probe'] is None:
+                    state['probe'] = threading.get_ident()
+                    return True
+                if stopping is not None and stopping.is_set():
+                    return False
+                if on_wait and not notified:
+                    notified = True
+                    on_wait(max(0.0, state['open_until'] - now))
+                timeout = state['open_until'] - now if state['state'] == 'open' else 1.0
+                self._cond.wait(min(max(timeout, 0.05), 1.0))
+
+    def record(self, host, kind=None):
+        """Report the outcome of an extraction started after acquire(); kind is None on success"""
+        with self._cond:
+            state = self._hosts.get(host)
+            probe = state is not None and state.get('probe') == threading.get_ident()
+            if kind == THROTTLED:
+                state = self._hosts.setdefault(host, {'state': 'closed', 'trips': 0, 'open_until': 0.0,
+                                                      'probe': None})
+                if state['state'] == 'open':
+                    return
+                # Only a throttled probe (or the first throttle) lengthens the backoff
+                if probe or state['state'] == 'closed':
+                    state['trips'] += 1
+                delay = min(self.max_delay, self.base_delay * 2 ** (state['trips'] - 1))
+                state.update(state='open', open_until=time.time() + delay * (0.5 + self.rng() / 2),
+                             probe=None)
+            elif probe or (state is not None and state['state'] == 'closed'):
+                # A success, or a failure that says nothing about throttling
+                self._hosts.pop(host, None)
+            self._cond.notify_all()
+
+    def release(self, host):
+        """Give up a probe slot without an outcome (e.g. the job was interrupted)"""
+        with self._cond:
+            state = self._hosts.get(host)
+            if state is not None and state.get('probe') == threading.get_ident():
+                state['probe'] = None
+                self._cond.notify_all()
+
+    def snapshot(self):
+        """Return hosts whose breaker is not closed, with seconds until it may close"""
+        now = time.time()
+        with self._cond:
+            return {host: {'state': state['state'], 'trips': state['trips'],
+                           'retry_in': round(max(0.0, state['open_until'] - now), 1)}
+                    for host, state in self._hosts.items()}
@@ -0,0 +1,344 @@
+import collections
+import itertools
+import queue
+import threading
+import time
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Job priorities (lower runs first)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# Finished top-level jobs kept in the job table (with their children); older ones are dropped
+FINISHED_JOBS_KEPT = 500
+
+
+class JobInterrupted(Exception):
+    """Raised inside a job to abort it because the scheduler is shutting down"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job (or set as its error) once the job was cancelled"""
+
+
+class Job:
+    """A unit of work handled by the download scheduler
+
+    A job may spawn child jobs (e.g. playlist entries) or hand work to a
+    later pipeline stage (hold/release). It then stays running until the
+    children and holds are done, without occupying a worker.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, target, name="", kind="", priority=PRIORITY_NORMAL):
+        self.id = next(Job._ids)
+        self.target = target
+        self.name = name
+        self.kind = kind
+        self.priority = priority
+        self.state = QUEUED
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.parent = None
+        self.children = []
+        self.target_returned = False
+        self.holds = 0
+        self.hold_error = None
+        self.hold_result = None
+        self.cancelled = False
+
+    def is_finished(self):
+        """Return True once the job is done or failed"""
+        return self.state in (DONE, FAILED)
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.state}>"
+
+
+class DownloadScheduler:
+    """Bounded worker pool that runs queued jobs by priority
+
+    jobs holds the unfinished jobs and the last keep_finished finished
+    top-level ones, so a long-running process does not grow without bound;
+    counts() still counts the dropped ones.
+    """
+
+    def __init__(self, max_workers=3, on_state_change=None, keep_finished=FINISHED_JOBS_KEPT):
+        self.max_workers = max(1, int(max_workers))
+        self.on_state_change = on_state_change
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self._queued = set()
+        self._finished = collections.deque()
+        self._dropped = {DONE: 0, FAILED: 0}
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._running = 0
+        self.stopping = threading.Event()
+        self._spawn_workers()
+
+    def submit(self, target, name="", kind="", priority=PRIORITY_NORMAL, parent=None, **attrs):
+        """Queue a callable and return its Job; extra keyword arguments become job attributes"""
+        job = Job(target, name=name, kind=kind, priority=priority)
+        job.__dict__.update(attrs)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._queued.add(job)
+            if parent is not None:
+                job.parent = parent
+                parent.children.append(job)
+                job.cancelled = parent.cancelled
+        self._notify(job)
+        if job.cancelled:
+            # Queued by a playlist that was cancelled while listing
+            self._cancel_queued([job])
+            return job
+        self._queue.put((priority, next(self._order), job))
+        return job
+
+    def set_max_workers(self, max_workers):
+        """Resize the worker pool; extra workers exit after their current job"""
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+        self._spawn_workers()
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop taking jobs off the queue; queued jobs stay queued
+
+        Running jobs are expected to notice `stopping` and raise
+        JobInterrupted. Workers are not daemon threads, so the process
+        waits for them and their last database writes before exiting.
+        """
+        self.stopping.set()
+        if wait:
+            with self._lock:
+                workers = list(self._workers)
+            for worker in workers:
+                if worker is not threading.current_thread():
+                    worker.join(timeout)
+
+    def is_stopping(self):
+        """Return True once shutdown was requested or the main thread has exited
+
+        The main-thread check lets the interpreter exit after an uncaught
+        exception instead of waiting on the (non-daemon) workers forever.
+        """
+        if not self.stopping.is_set() and not threading.main_thread().is_alive():
+            self.stopping.set()
+        return self.stopping.is_set()
+
+    def hold(self, job):
+        """Keep a job running after its target returns, until release() is called"""
+        with self._lock:
+            job.holds += 1
+
+    def release(self, job, error=None, result=None):
+        """Drop a hold; the job fails with the first error passed here
+
+        A result replaces the one returned by the job's target, for holds
+        that do the job's remaining work on another thread.
+        """
+        with self._lock:
+            job.holds -= 1
+            if error is not None and job.hold_error is None:
+                job.hold_error = error
+            if result is not None:
+                job.hold_result = result
+            if job.is_finished() or not self._ready(job):
+                return
+            self._finish(job)
+        self._complete(job)
+
+    def cancel(self, job):
+        """Cancel a job and its children; returns False if it had already finished
+
+        Queued jobs fail with JobCancelled right away and are skipped by the
+        workers. Running jobs are only marked cancelled; they raise
+        JobCancelled at their next progress check, the same way they notice
+        a shutdown.
+        """
+        queued = []
+        with self._lock:
+            if job.is_finished():
+                return False
+            pending = [job]
+            while pending:
+                current = pending.pop()
+                pending.extend(current.children)
+                if current.is_finished():
+                    continue
+                current.cancelled = True
+                if current.state == QUEUED:
+                    queued.append(current)
+        self._cancel_queued(queued)
+        return True
+
+    def _cancel_queued(self, jobs):
+        """Fail queued jobs with JobCancelled without running them"""
+        finished = []
+        with self._lock:
+            for job in jobs:
+                if job.state == QUEUED:
+                    job.target_returned = True
+                    self._finish(job, JobCancelled("Cancelled"))
+                    finished.append(job)
+        for job in finished:
+            self._complete(job)
+
+    def queue_position(self, job):
+        """Return the 1-based position of a queued job, or 0 if not queued"""
+        if job.state != QUEUED:
+            return 0
+        with self._lock:
+            waiting = list(self._queued)
+        waiting.sort(key=lambda j: (j.priority, j.created_at, j.id))
+        return waiting.index(job) + 1 if job in waiting else 0
+
+    def counts(self):
+        """Return the number of jobs in each state, counting children rather than their parents"""
+        with self._lock:
+            result = {QUEUED: 0, RUNNING: 0, DONE: self._dropped[DONE], FAILED: self._dropped[FAILED]}
+            for job in self.jobs.values():
+                if job.children:
+                    continue
+                result[job.state] = result.get(job.state, 0) + 1
+        return result
+
+    def _spawn_workers(self):
+        """Start workers until the pool matches max_workers"""
+        with self._lock:
+            if self.stopping.is_set():
+                return
+            self._workers = [w for w in self._workers if w.is_alive()]
+            missing = self.max_workers - len(self._workers)
+            for _ in range(missing):
+                worker = threading.Thread(target=self._worker_loop, name="download-worker")
+                self._workers.append(worker)
+                worker.start()
+
+    def _should_exit(self):
+        """Check whether this worker is surplus after a pool shrink or shutdown"""
+        stopping = self.is_stopping()
+        with self._lock:
+            if stopping:
+                self._workers.remove(threading.current_thread())
+                return True
+            alive = [w for w in self._workers if w.is_alive()]
+            if len(alive) > self.max_workers:
+                self._workers.remove(threading.current_thread())
+                return True
+        return False
+
+    def _worker_loop(self):
+        """Take jobs off the queue and run them one at a time"""
+        while True:
+            if self._should_exit():
+                return
+            try:
+                _, _, job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if self.is_stopping():
+                # Leave the job queued; it is resumed from the journal next time
+                self._queue.task_done()
+                continue
+            self._run_job(job)
+            self._queue.task_done()
+
+    def _run_job(self, job):
+        """Run a single job and record its outcome"""
+        with self._lock:
+            if job.is_finished():
+                # Cancelled while it was queued
+                return
+            self._running += 1
+            self._queued.discard(job)
+            job.state = RUNNING
+            job.started_at = time.time()
+        self._notify(job)
+        try:
+            result = job.target(job)
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+        with self._lock:
+            self._running -= 1
+            job.target_returned = True
+            if error is None:
+                job.result = result
+            if error is None and not self._ready(job):
+                # Children or holds pending; the last of them to finish completes this job
+                return
+            self._finish(job, error)
+        self._complete(job)
+
+    def _ready(self, job):
+        """Check whether a job has nothing left outstanding (lock must be held)"""
+        return (job.target_returned and job.holds == 0 and
+                all(child.is_finished() for child in job.children))
+
+    def _finish(self, job, error=None):
+        """Set the final state of a job (lock must be held)"""
+        if error is None:
+            error = job.hold_error
+        if job.hold_result is not None:
+            job.result = job.hold_result
+        if error is None and job.children and all(child.state == FAILED for child in job.children):
+            error = job.children[0].error
+        if error is None:
+            # A parent with interrupted children is unfinished, not done
+            error = next((child.error for child in job.children
+                          if isinstance(child.error, JobInterrupted)), None)
+        if error is None and job.cancelled:
+            error = JobCancelled("Cancelled")
+        job.error = error
+        job.state = FAILED if error is not None else DONE
+        job.finished_at = time.time()
+        self._queued.discard(job)
+
+    def _complete(self, job):
+        """Notify about a finished job and complete its parent if it was the last child"""
+        self._notify(job)
+        parent = job.parent
+        if parent is None:
+            self._drop_finished(job)
+            return
+        with self._lock:
+            if parent.is_finished() or not self._ready(parent):
+                return
+            self._finish(parent)
+        self._complete(parent)
+
+    def _drop_finished(self, job):
+        """Remember a finished top-level job, dropping the oldest beyond keep_finished"""
+        with self._lock:
+            self._finished.append(job)
+            while len(self._finished) > self.keep_finished:
+                pending = [self._finished.popleft()]
+                while pending:
+                    current = pending.pop()
+                    pending.extend(current.children)
+                    self.jobs.pop(current.id, None)
+                    if not current.children:
+                        self._dropped[current.state] += 1
+
+    def _notify(self, job):
+        """Report a job state change to the listener"""
+        if self.on_state_change:
+            try:
+                self.on_state_change(job)
+            except Exception as e:
+                print(f"Error in scheduler listener: {e}")
@@ -0,0 +1,236 @@
+"""Multi-connection downloads of progressive HTTP files
+
+Imports yt-dlp at module level, so import it lazily (see engine.create_ydl).
+"""
+import json
+import os
+import threading
+import time
+
+from yt_dlp import YoutubeDL
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import IncompleteRead, RequestError
+from yt_dlp.utils import ContentTooShortError
+
+# Files smaller than this per connection are not worth splitting
+MIN_SEGMENT_SIZE = 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+PROGRESS_INTERVAL = 0.25
+REPORT_BYTES = 1024 * 1024
+
+
+def split_ranges(total, connections):
+    """Split [0, total) into contiguous [start, position, end] segments"""
+    size = -(-total // connections)
+    return [[start, start, min(start + size, total) - 1] for start in range(0, total, size)]
+
+
+class SegmentedHttpFD(HttpFD):
+    """HttpFD that fetches byte ranges over several connections in parallel
+
+    Every connection writes straight into its own region of the
+    preallocated .part file, so the file is assembled in place without a
+    second copy. Segment offsets are saved next to the .part file so an
+    interrupted download resumes each segment where it stopped. Servers
+    without range support and small files use the normal single
+    connection download.
+    """
+
+    FD_NAME = 'segmented'
+
+    def real_download(self, filename, info_dict):
+        connections = int(self.params.get('segmented_connections') or 1)
+        tmpfilename = self.temp_name(filename)
+        state_path = tmpfilename + '.segments'
+        if connections < 2 or tmpfilename == filename:
+            return super().real_download(filename, info_dict)
+
+        url = info_dict['url']
+        headers = dict(info_dict.get('http_headers') or {})
+        segments = self._load_segments(state_path) if os.path.exists(tmpfilename) else None
+        if segments is None:
+            if os.path.exists(tmpfilename):
+                # Partial file from a single-connection download; let HttpFD continue it
+                return super().real_download(filename, info_dict)
+            total = self._probe_size(url, headers)
+            if not total or total < 2 * MIN_SEGMENT_SIZE:
+                return super().real_download(filename, info_dict)
+            connections = min(connections, total // MIN_SEGMENT_SIZE)
+            segments = split_ranges(total, connections)
+            with open(tmpfilename, 'wb') as f:
+                f.truncate(total)
+        total = segments[-1][2] + 1
+
+        self.report_destination(filename)
+        stop = threading.Event()
+        errors = []
+        # Segments wait once REPORT_BYTES have arrived since the last progress
+        # report, so a hook that sleeps (the bandwidth governor) throttles every
+        # connection of this download
+        self._pacing = threading.Condition()
+        self._unreported = 0
+        threads = [threading.Thread(target=self._fetch_segment,
+                                    args=(url, headers, tmpfilename, segment, stop, errors),
+                                    daemon=True)
+                   for segment in segments if segment[1] <= segment[2]]
+        started = time.time()
+        resumed_bytes = sum(segment[1] - segment[0] for segment in segments)
+        last_saved = started
+        try:
+            self._report_progress(info_dict, filename, tmpfilename, resumed_bytes, total,
+                                  started, resumed_bytes, len(threads))
+            for thread in threads:
+                thread.start()
+            while any(thread.is_alive() for thread in threads):
+                with self._pacing:
+                    self._pacing.wait_for(lambda: self._unreported >= REPORT_BYTES or stop.is_set(),
+                                          PROGRESS_INTERVAL)
+                downloaded = sum(segment[1] - segment[0] for segment in segments)
+                self._report_progress(info_dict, filename, tmpfilename, downloaded, total,
+                                      started, resumed_bytes, len(threads))
+                with self._pacing:
+                    self._unreported = 0
+                    self._pacing.notify_all()
+                if time.time() - last_saved >= PROGRESS_INTERVAL:
+                    self._save_segments(state_path, segments)
+                    last_saved = time.time()
+        finally:
+            # Also reached when a progress hook raises (e.g. shutdown); keep offsets for resume
+            stop.set()
+            with self._pacing:
+                self._pacing.notify_all()
+            for thread in threads:
+                # The first progress report may raise before any thread started
+                if thread.ident is not None:
+                    thread.join()
+            self._save_segments(state_path, segments)
+        if errors:
+            raise errors[0]
+        if any(segment[1] <= segment[2] for segment in segments):
+            # Never hand on a .part file with holes in it; the saved offsets resume it
+            raise ContentTooShortError(sum(segment[1] - segment[0] for segment in segments), total)
+
+        self.try_rename(tmpfilename, filename)
+        os.remove(state_path)
+        self._hook_progress({
+            'status': 'finished',
+            'downloaded_bytes': total,
+            'total_bytes': total,
+            'filename': filename,
+            'elapsed': time.time() - started,
+        }, info_dict)
+        return True
+
+    def _report_progress(self, info_dict, filename, tmpfilename, downloaded, total, started,
+                         resumed_bytes, connections):
+        """Call the progress hooks with the combined state of all segments"""
+        now = time.time()
+        speed = self.calc_speed(started, now, downloaded - resumed_bytes)
+        self._hook_progress({
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'tmpfilename': tmpfilename,
+            'filename': filename,
+            'eta': self.calc_eta(speed, total - downloaded),
+            'speed': speed,
+            'elapsed': now - started,
+            'connections': connections,
+        }, info_dict)
+
+    def _probe_size(self, url, headers):
+        """Return the file size if the server honours range requests, else None"""
+        try:
+            response = self.ydl.urlopen(Request(url, headers=dict(headers, Range='bytes=0-0')))
+        except RequestError:
+            return None
+        try:
+            content_range = response.headers.get('Content-Range') or ''
+            if response.status != 206 or '/' not in content_range:
+                return None
+            total = content_range.rsplit('/', 1)[1]
+            return int(total) if total.isdigit() else None
+        finally:
+            response.close()
+
+    def _fetch_segment(self, url, headers, tmpfilename, segment, stop, errors):
+        """Download one segment into place, retrying from its current offset"""
+        retries = self.params.get('retries', 10)
+        attempt = 0
+        while segment[1] <= segment[2] and not stop.is_set():
+            try:
+                request = Request(url, headers=dict(headers, Range=f'bytes={segment[1]}-{segment[2]}'))
+                response = self.ydl.urlopen(request)
+                try:
+                    if response.status != 206:
+                        raise RequestError(f'Server ignored range request (HTTP {response.status})')
+                    received = 0
+                    with open(tmpfilename, 'r+b') as f:
+                        f.seek(segment[1])
+                        while segment[1] <= segment[2] and not stop.is_set():
+                            block = response.read(min(BLOCK_SIZE, segment[2] - segment[1] + 1))
+                            if not block:
+                                # A short response counts as a failed attempt
+                                raise IncompleteRead(received, segment[2] - segment[1] + 1)
+                            received += len(block)
+                            f.write(block)
+                            segment[1] += len(block)
+                            with self._pacing:
+                                self._unreported += len(block)
+                                if self._unreported >= REPORT_BYTES:
+                                    self._pacing.notify_all()
+                                    self._pacing.wait_for(
+                                        lambda: self._unreported < REPORT_BYTES or stop.is_set())
+                finally:
+                    response.close()
+            except (RequestError, OSError) as e:
+                attempt += 1
+                if attempt > retries:
+                    errors.append(e)
+                    stop.set()
+                    return
+                self.to_screen(f'[segmented] Segment at byte {segment[1]} failed ({e}); '
+                               f'retrying ({attempt}/{retries})')
+                time.sleep(min(2 ** attempt, 30) / 10)
+            except Exception as e:
+                # Not worth retrying, but real_download must still see it
+                errors.append(e)
+                stop.set()
+                return
+
+    def _load_segments(self, state_path):
+        """Load saved segment offsets, or None if there are none"""
+        try:
+            with open(state_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_segments(self, state_path, segments):
+        """Save segment offsets atomically"""
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(segments, f)
+        os.replace(tmp_path, state_path)
+
+
+class SegmentedYoutubeDL(YoutubeDL):
+    """YoutubeDL that uses SegmentedHttpFD where yt-dlp would use plain HttpFD
+
+    DASH/HLS formats are parallelized by yt-dlp itself through the
+    concurrent_fragment_downloads option.
+    """
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if (test or subtitle or name == '-' or (self.params.get('segmented_connections') or 1) < 2
+                or get_suitable_downloader(info, self.params) is not HttpFD):
+            return super().dl(name, info, subtitle, test)
+        fd = SegmentedHttpFD(self, self.params)
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None:
+            new_info['http_headers'] = self._calc_headers(new_info)
+        return fd.download(name, new_info, subtitle)
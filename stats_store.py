@@ -0,0 +1,99 @@
+"""Measured download throughput accounting"""
+import json
+import os
+import threading
+import time
+
+SPEED_STALE_SECONDS = 3
+
+
+def empty_totals():
+    """Return a zeroed aggregate record"""
+    return {
+        'jobs': 0,
+        'bytes': 0,
+        'wall_seconds': 0.0,
+        'download_seconds': 0.0,
+        'postprocess_seconds': 0.0,
+        'peak_speed': 0.0,
+    }
+
+
+class ThroughputStats:
+    """Rolling per-session and all-time download aggregates kept in a small JSON file"""
+
+    def __init__(self, path="stats.json"):
+        self.path = path
+        self.session = empty_totals()
+        self.all_time = self._load()
+        self._speeds = {}
+        self._lock = threading.Lock()
+
+    def report_speed(self, key, speed):
+        """Record the latest reported speed for an active download"""
+        if speed:
+            with self._lock:
+                self._speeds[key] = (speed, time.time())
+
+    def clear_speed(self, key):
+        """Forget the speed of a download that stopped"""
+        with self._lock:
+            self._speeds.pop(key, None)
+
+    def current_speed(self):
+        """Return the summed speed of downloads that reported recently, in bytes/s"""
+        now = time.time()
+        with self._lock:
+            return sum(speed for speed, at in self._speeds.values() if now - at < SPEED_STALE_SECONDS)
+
+    def add_job(self, bytes, wall_seconds, download_seconds, postprocess_seconds, peak_speed):
+        """Fold one finished job into the session and all-time totals and save"""
+        with self._lock:
+            for totals in (self.session, self.all_time):
+                totals['jobs'] += 1
+                totals['bytes'] += bytes
+                totals['wall_seconds'] += wall_seconds
+                totals['download_seconds'] += download_seconds
+                totals['postprocess_seconds'] += postprocess_seconds
+                totals['peak_speed'] = max(totals['peak_speed'], peak_speed)
+            self._save(self.all_time)
+
+    def snapshot(self):
+        """Return copies of the totals with average throughput added"""
+        with self._lock:
+            result = {'session': dict(self.session), 'all_time': dict(self.all_time)}
+        for totals in result.values():
+            seconds = totals['download_seconds']
+            totals['average_speed'] = totals['bytes'] / seconds if seconds else 0.0
+        result['current_speed'] = self.current_speed()
+        return result
+
+    def _load(self):
+        """Load all-time totals from disk"""
+        totals = empty_totals()
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    totals.update(json.load(f))
+        except Exception as e:
+            print(f"Error loading stats: {e}")
+        return totals
+
+    def _save(self, data):
+        """Write all-time totals atomically (lock must be held)"""
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving stats: {e}")
+
+
+def format_bytes(size):
+    """Format a byte count for display"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} TB"
@@ -0,0 +1,225 @@
+"""Saved channel and playlist subscriptions with the snapshot of entries seen so far"""
+import json
+import sqlite3
+import threading
+import time
+
+from url_utils import parse_youtube_url
+
+NEWEST_FIRST = "newest"
+APPENDED = "appended"
+# A newest-first listing ends after this many already known entries in a row
+KNOWN_STREAK = 3
+
+
+def listing_order(url):
+    """Guess how new entries show up: channels and upload lists put them first, playlists append"""
+    video_id, playlist_id = parse_youtube_url(url)
+    if playlist_id and not playlist_id.startswith('UU'):
+        return APPENDED
+    return NEWEST_FIRST
+
+
+def format_summary(summary):
+    """One-line description of a sync run"""
+    name = summary.get('title') or summary['url']
+    if summary.get('error') and not summary.get('listed'):
+        return f"{name}: sync failed after checking {summary['checked']} entries: {summary['error']}"
+    text = f"{name}: {summary['checked']} checked, {summary['new']} new"
+    if summary['new']:
+        text += f" ({summary['downloaded']} downloaded, {summary['failed']} failed)"
+    return (text + f"; listing {summary['enumerate_seconds']:.1f}s, "
+            f"downloading {summary['download_seconds']:.1f}s")
+
+
+class SyncRun:
+    """Lists one subscription against its snapshot and collects the run's statistics
+
+    filter() passes on only the entries that are not in the snapshot. A
+    newest-first listing stops after KNOWN_STREAK known entries in a row,
+    so a sync of a large channel fetches just its first pages. An appended
+    playlist is always listed to the end: an unchanged size and known first
+    entries do not rule out one entry removed and another one appended.
+    """
+
+    def __init__(self, subscription, known_ids):
+        self.subscription = subscription
+        self.known = set(known_ids)
+        self.known_ids = known_ids
+        self.title = subscription['title']
+        self.started_at = time.time()
+        self.checked_ids = []
+        self.new_ids = []
+        self.enumerate_seconds = 0.0
+        self.first_queued = None
+        self.stopped_early = False
+        self.listed = False
+        self.summary = None
+
+    def filter(self, entries, info):
+        """Yield the new entries of a listing; closes entries when done
+
+        Called again with a fresh listing when a later page failed and the
+        playlist job lists it again, so the counts start over each time.
+        """
+        self.title = info.get('title') or self.title
+        self.checked_ids, self.new_ids = [], []
+        newest_first = self.subscription['listing_order'] == NEWEST_FIRST
+        streak = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    entry = next(entries)
+                except StopIteration:
+                    break
+                finally:
+                    self.enumerate_seconds += time.perf_counter() - started
+                if not entry:
+                    continue
+                entry_id = entry.get('id') or entry.get('url')
+                self.checked_ids.append(entry_id)
+                if entry_id in self.known:
+                    streak += 1
+                    if streak >= KNOWN_STREAK and newest_first:
+                        self.stopped_early = True
+                        break
+                    continue
+                streak = 0
+                self.new_ids.append(entry_id)
+                if self.first_queued is None:
+                    self.first_queued = time.time()
+                yield entry
+            self.listed = True
+        finally:
+            entries.close()
+
+    def snapshot(self, failed_ids=()):
+        """Entry IDs to remember, in listing order; failed entries are left out so they come back"""
+        ids = list(self.checked_ids)
+        if self.stopped_early:
+            seen = set(ids)
+            ids += [entry_id for entry_id in self.known_ids if entry_id not in seen]
+        failed = set(failed_ids)
+        return [entry_id for entry_id in dict.fromkeys(ids) if entry_id not in failed]
+
+    def finish(self, progress, finished_at, error=None):
+        """Build the run summary from the playlist job's progress"""
+        self.summary = {
+            'subscription_id': self.subscription['id'],
+            'url': self.subscription['url'],
+            'title': self.title,
+            'checked': len(self.checked_ids),
+            'new': len(self.new_ids),
+            'downloaded': progress['done'] - progress['skipped'],
+            'skipped': progress['skipped'],
+            'failed': progress['failed'],
+            'stopped_early': self.stopped_early,
+            'listed': self.listed,
+            'enumerate_seconds': round(self.enumerate_seconds, 3),
+            'download_seconds': round(finished_at - self.first_queued, 3) if self.first_queued else 0.0,
+            'started_at': self.started_at,
+            'finished_at': finished_at,
+            'error': str(error) if error else None,
+        }
+        return self.summary
+
+
+class SubscriptionStore:
+    """Subscriptions and their last-seen entries (IDs and order) in SQLite"""
+
+    def __init__(self, path="subscriptions.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                title TEXT,
+                audio_only INTEGER NOT NULL DEFAULT 0,
+                quality TEXT NOT NULL DEFAULT 'best',
+                listing_order TEXT NOT NULL,
+                interval_minutes INTEGER NOT NULL DEFAULT 0,
+                last_sync_at REAL,
+                last_summary TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS snapshot (
+                subscription_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                entry_id TEXT NOT NULL,
+                PRIMARY KEY (subscription_id, position)
+            );
+        """)
+        self._conn.commit()
+
+    def add(self, url, audio_only=False, quality="best", interval_minutes=0, order=None):
+        """Subscribe to a channel or playlist (or update its options) and return its id"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO subscriptions (url, audio_only, quality, listing_order, interval_minutes, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+                "audio_only = excluded.audio_only, quality = excluded.quality, "
+                "interval_minutes = excluded.interval_minutes",
+                (url, int(bool(audio_only)), quality, order or listing_order(url), int(interval_minutes),
+                 time.time()))
+            self._conn.commit()
+            return self._conn.execute("SELECT id FROM subscriptions WHERE url = ?", (url,)).fetchone()[0]
+
+    def remove(self, subscription_id):
+        """Forget a subscription and its snapshot"""
+        with self._lock:
+            self._conn.execute("DELETE FROM snapshot WHERE subscription_id = ?", (subscription_id,))
+            self._conn.execute("DELETE FROM subscriptions WHERE id = ?", (subscription_id,))
+            self._conn.commit()
+
+    def get(self, subscription_id):
+        """Return one subscription, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT s.*, (SELECT COUNT(*) FROM snapshot WHERE subscription_id = s.id) AS entries "
+                "FROM subscriptions s WHERE id = ?", (subscription_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def all(self):
+        """Return every subscription, oldest first, with the size of its snapshot"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.*, (SELECT COUNT(*) FROM snapshot WHERE subscription_id = s.id) AS entries "
+                "FROM subscriptions s ORDER BY id").fetchall()
+        return [self._entry(row) for row in rows]
+
+    def due(self, now=None):
+        """Return subscriptions with an interval whose next sync is due"""
+        now = now or time.time()
+        return [s for s in self.all() if s['interval_minutes'] > 0 and
+                (s['last_sync_at'] is None or s['last_sync_at'] + s['interval_minutes'] * 60 <= now)]
+
+    def known_ids(self, subscription_id):
+        """Return the entry IDs seen by the last sync, in listing order"""
+        with self._lock:
+            rows = self._conn.execute("SELECT entry_id FROM snapshot WHERE subscription_id = ? "
+                                      "ORDER BY position", (subscription_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def finish_sync(self, subscription_id, summary, entry_ids=None, title=None):
+        """Record a sync run; entry_ids (None keeps the old one) replaces the snapshot"""
+        with self._lock:
+            if entry_ids is not None:
+                self._conn.execute("DELETE FROM snapshot WHERE subscription_id = ?", (subscription_id,))
+                self._conn.executemany(
+                    "INSERT INTO snapshot (subscription_id, position, entry_id) VALUES (?, ?, ?)",
+                    [(subscription_id, position, entry_id) for position, entry_id in enumerate(entry_ids)])
+            self._conn.execute(
+                "UPDATE subscriptions SET last_sync_at = ?, last_summary = ?, title = COALESCE(?, title) "
+                "WHERE id = ?", (summary['finished_at'], json.dumps(summary), title, subscription_id))
+            self._conn.commit()
+
+    def _entry(self, row):
+        entry = dict(row)
+        entry['audio_only'] = bool(entry['audio_only'])
+        entry['last_summary'] = json.loads(entry['last_summary']) if entry['last_summary'] else None
+        return entry
@@ -0,0 +1,143 @@
+"""AIMD concurrency simulated against the local server that answers extra connections with 429"""
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmark import MediaServer
+from concurrency import AdaptiveConcurrency
+
+THROTTLED = "throttled by the server"
+PROBING = "probing for more throughput"
+
+
+class SimulatedPool:
+    """Workers that fetch the same file over and over, as many at a time as the controller allows
+
+    Successes and 429s are reported to the controller like the engine
+    reports download attempts; sample() returns (bytes so far, waiting).
+    """
+
+    def __init__(self, url, ceiling):
+        self.url = url
+        self.target = 0
+        self.active = self.peak_active = self.peak_target = 0
+        self.bytes = 0
+        self.controller = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._work, args=(i,), daemon=True) for i in range(ceiling + 2)]
+
+    def apply(self, workers):
+        with self._lock:
+            self.target = workers
+            self.peak_target = max(self.peak_target, workers)
+
+    def sample(self):
+        with self._lock:
+            # Plenty of jobs are always queued
+            return self.bytes, 100
+
+    def start(self, controller):
+        self.controller = controller
+        for thread in self._threads:
+            thread.start()
+        controller.start(self.sample)
+
+    def stop(self):
+        self.controller.stop()
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self, index):
+        while not self._stop.is_set():
+            with self._lock:
+                allowed = index < self.target
+                if allowed:
+                    self.active += 1
+                    self.peak_active = max(self.peak_active, self.active)
+            if not allowed:
+                time.sleep(0.01)
+                continue
+            try:
+                with urllib.request.urlopen(self.url, timeout=10) as response:
+                    # Counted as it arrives, so each interval sees a steady rate
+                    for data in iter(lambda: response.read(16 * 1024), b''):
+                        with self._lock:
+                            self.bytes += len(data)
+                self.controller.record()
+            except urllib.error.HTTPError as e:
+                self.controller.record(e)
+                # Like the engine's retry delay
+                time.sleep(0.05)
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+
+def simulate(max_connections, ceiling, until, timeout=20, settle=0.0):
+    """Run the controller against the server until until(decisions) holds, then settle seconds more
+
+    Returns the pool, the decisions and the number of 429s the server sent.
+    """
+    with MediaServer(files={'clip.mp4': 256 * 1024}, rate_per_connection=1024 * 1024,
+                     max_connections=max_connections) as server:
+        pool = SimulatedPool(server.url('clip.mp4'), ceiling)
+        controller = AdaptiveConcurrency(pool.apply, 1, ceiling, interval=0.4, cooldown=1, avoid_intervals=4)
+        pool.start(controller)
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline and not until(list(controller.decisions)):
+                time.sleep(0.05)
+            time.sleep(settle)
+        finally:
+            pool.stop()
+        return pool, list(controller.decisions), server.httpd.throttled
+
+
+def test_backs_off_multiplicatively_after_429s_and_probes_additively():
+    pool, decisions, throttled = simulate(
+        4, 10, lambda decisions: sum(d['reason'] == THROTTLED for d in decisions) >= 2)
+    backoffs = [d for d in decisions if d['reason'] == THROTTLED]
+    increases = [d for d in decisions if d['reason'] == PROBING]
+    assert throttled and len(backoffs) >= 2
+    for d in backoffs:
+        assert d['to'] == max(1, d['from'] // 2)
+    assert increases
+    for d in increases:
+        assert d['to'] == d['from'] + 1
+    # Not throttled below the 4 connections the server allows (a request may
+    # overlap the end of the previous one, so 4 itself can be)
+    assert all(d['from'] >= 4 for d in backoffs)
+    assert pool.peak_target <= 10
+
+
+def test_increases_while_responses_are_clean_and_stops_at_the_ceiling():
+    pool, decisions, throttled = simulate(
+        0, 3, lambda decisions: any(d['to'] == 3 for d in decisions), timeout=10, settle=1.5)
+    assert throttled == 0
+    assert [(d['from'], d['to']) for d in decisions[:2]] == [(1, 2), (2, 3)]
+    assert all(d['reason'] == PROBING for d in decisions[:2])
+    # Several more intervals with jobs waiting did not take it further
+    assert pool.peak_target == 3
+    assert pool.peak_active <= 3
+
+
+def test_never_exceeds_the_ceiling():
+    pool, decisions, throttled = simulate(0, 2, lambda decisions: False, timeout=3)
+    assert pool.peak_target <= 2
+    assert pool.peak_active <= 2
+    assert all(d['to'] <= 2 for d in decisions)
+
+
+def test_lowering_the_ceiling_shrinks_the_pool():
+    applied = []
+    controller = AdaptiveConcurrency(applied.append, 6, 8)
+    controller.set_ceiling(3)
+    assert controller.workers == 3 and applied == [3]
+    controller.set_ceiling(5)
+    assert controller.workers == 3 and applied == [3]
+    for _ in range(5):
+        controller.step(1000.0 * (controller.workers + 1), waiting=10)
+    assert controller.workers == 5
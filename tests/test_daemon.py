@@ -0,0 +1,128 @@
+"""Request validation and bookkeeping of the daemon's API"""
+import http.client
+import json
+
+import pytest
+
+import daemon_client
+import engine
+from daemon import DaemonServer, DownloadDaemon
+from daemon_client import DaemonClient, DaemonError, RemoteEngine
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    settings = engine.default_settings(str(tmp_path / 'out'))
+    settings['metrics_port'] = 0
+    downloader = engine.DownloadEngine(settings)
+    server = DaemonServer(DownloadDaemon(downloader), 0).start()
+    yield server
+    server.stop()
+    downloader.shutdown()
+
+
+def post(server, length, body=b''):
+    connection = http.client.HTTPConnection('127.0.0.1', server.httpd.server_address[1], timeout=5)
+    connection.putrequest('POST', '/jobs')
+    connection.putheader('Content-Type', 'application/json')
+    connection.putheader('Content-Length', length)
+    connection.endheaders()
+    if body:
+        connection.send(body)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.mark.parametrize('length', ['abc', '-1', '1.5'])
+def test_bad_content_length_is_rejected(api, length):
+    status, body = post(api, length)
+    assert status == 400
+    assert body['error'] == "Content-Length must be a byte count"
+
+
+def test_oversized_and_invalid_bodies(api):
+    assert post(api, str(10 ** 9))[0] == 413
+    assert post(api, '5', b'[1,2]') == (400, {'error': "Send the job as a JSON object"})
+    status, body = post(api, '17', b'{"kind": "video"}')
+    assert (status, body) == (400, {'error': "url is required"})
+
+
+def test_progress_of_finished_jobs_is_dropped(api):
+    daemon = api.daemon
+    # Nothing listens there, so the job keeps retrying until it is cancelled
+    job = daemon.submit({'kind': 'video', 'url': 'http://127.0.0.1:9/clip.mp4'})
+    daemon.progress_hook(job, {'status': 'downloading', 'downloaded_bytes': 10})
+    assert daemon.progress[job.id] == {'status': 'downloading', 'downloaded_bytes': 10}
+    daemon.engine.cancel(job)
+    daemon.engine.wait([job])
+    assert job.id not in daemon.progress
+    daemon.progress_hook(job, {'status': 'downloading', 'downloaded_bytes': 20})
+    assert job.id not in daemon.progress
+
+
+def test_settings_are_checked_applied_and_saved(api):
+    client = DaemonClient(api.url)
+    with pytest.raises(DaemonError, match="Unknown setting"):
+        client.update_settings({'no_such_setting': 1})
+    with pytest.raises(DaemonError, match="concurrent_downloads must be of type int"):
+        client.update_settings({'concurrent_downloads': True})
+    settings = client.update_settings({'concurrent_downloads': 5, 'bandwidth_limit_kbps': 100})
+    assert settings['concurrent_downloads'] == 5
+    assert api.daemon.engine.scheduler.max_workers == 5
+    assert api.daemon.engine.bandwidth_limit() == 100 * 1024
+    assert engine.load_settings()['bandwidth_limit_kbps'] == 100
+    assert client.settings() == settings
+
+
+@pytest.mark.parametrize('changes, error', [
+    ({'bandwidth_schedule': [{'x': 1}]}, "rules must have start, end and limit_kbps"),
+    ({'bandwidth_schedule': [{'start': '25:00', 'end': '06:00', 'limit_kbps': 10}]}, "start must be a time of day"),
+    ({'bandwidth_schedule': [{'start': '22:00', 'end': '06:00', 'limit_kbps': '10'}]}, "limit_kbps must be"),
+    ({'concurrent_downloads': -2}, "concurrent_downloads must be 1 or more"),
+    ({'bandwidth_limit_kbps': 50, 'cache_max_mb': -1}, "cache_max_mb must be 0 or more"),
+])
+def test_invalid_settings_are_neither_applied_nor_saved(api, changes, error):
+    before = dict(api.daemon.engine.settings)
+    with pytest.raises(DaemonError, match=error) as raised:
+        DaemonClient(api.url).update_settings(changes)
+    assert raised.value.status == 400
+    assert api.daemon.engine.settings == before
+    assert engine.load_settings() == engine.default_settings()
+
+
+def test_attached_engine_uses_the_daemons_settings_and_statistics(api):
+    local = engine.MetadataEngine(engine.default_settings(api.daemon.engine.download_path))
+    remote = RemoteEngine(DaemonClient(api.url), local)
+    try:
+        assert not hasattr(local, 'scheduler')
+        remote.apply_settings(dict(remote.settings, concurrent_downloads=2))
+        assert api.daemon.engine.scheduler.max_workers == 2
+        assert remote.settings['concurrent_downloads'] == 2
+        assert remote.throughput.snapshot() == api.daemon.engine.throughput.snapshot()
+        assert remote.stage_stats()['download'] == api.daemon.engine.stage_stats()['download']
+        assert remote.concurrency is None
+        assert remote.metrics_server.url == api.url
+    finally:
+        remote.shutdown()
+
+
+def test_attached_engine_keeps_only_the_newest_finished_jobs(api, monkeypatch):
+    monkeypatch.setattr(daemon_client, 'FINISHED_JOBS_KEPT', 3)
+    local = engine.MetadataEngine(engine.default_settings(api.daemon.engine.download_path))
+    remote = RemoteEngine(DaemonClient(api.url), local)
+    remote.shutdown()
+
+    def job(job_id, state, sync=None):
+        return {'id': job_id, 'kind': 'Video', 'url': f"https://example.com/{job_id}", 'state': state,
+                'queue_position': 0, 'result': None, 'error': None, 'error_kind': None, 'cancelled': False,
+                'attempts': 1, 'skipped': False, 'file_path': None, 'bytes': 0, 'expected_bytes': 0,
+                'speed': 0.0, 'sync': sync}
+
+    remote._apply(job(1, 'done', {'subscription_id': 7, 'summary': {}}))
+    for job_id in range(2, 8):
+        remote._apply(job(job_id, 'running'))
+    for job_id in range(2, 6):
+        remote._apply(job(job_id, 'failed' if job_id % 2 else 'done'))
+    assert sorted(remote.jobs) == [3, 4, 5, 6, 7]
+    assert remote.syncs == {}
@@ -0,0 +1,145 @@
+"""Format ranking against recorded format lists"""
+import pytest
+
+from format_selection import FormatSelector, format_size, select_format
+
+
+def fmt(format_id, ext, vcodec, acodec, height=None, tbr=None, fps=None, abr=None, protocol='https', **extra):
+    f = {'format_id': format_id, 'ext': ext, 'vcodec': vcodec, 'acodec': acodec, 'height': height,
+         'width': height and height * 16 // 9, 'fps': fps, 'tbr': tbr, 'abr': abr, 'protocol': protocol,
+         'url': f"https://rr1---sn-example.googlevideo.com/videoplayback?itag={format_id}"}
+    f.update(extra)
+    return f
+
+
+# Formats of a 4K YouTube upload as yt-dlp extracts them (worst first), trimmed to the ranked fields
+YOUTUBE_FORMATS = [
+    fmt('sb0', 'mhtml', 'none', 'none', height=90, protocol='mhtml'),
+    fmt('233', 'mp4', 'none', 'none', protocol='m3u8_native', preference=-1000),
+    fmt('139', 'm4a', 'none', 'mp4a.40.5', tbr=48.8, abr=48.8, filesize=1171012),
+    fmt('249', 'webm', 'none', 'opus', tbr=53.1, abr=53.1, filesize=1274830),
+    fmt('250', 'webm', 'none', 'opus', tbr=70.2, abr=70.2, filesize=1685144),
+    fmt('140', 'm4a', 'none', 'mp4a.40.2', tbr=129.5, abr=129.5, filesize=3107420),
+    fmt('251', 'webm', 'none', 'opus', tbr=135.8, abr=135.8, filesize=3259230),
+    fmt('160', 'mp4', 'avc1.4d400c', 'none', height=144, fps=30, tbr=69.1, filesize=1658160),
+    fmt('278', 'webm', 'vp9', 'none', height=144, fps=30, tbr=61.4, filesize=1473211),
+    fmt('394', 'mp4', 'av01.0.00M.08', 'none', height=144, fps=30, tbr=58.7, filesize=1408630),
+    fmt('18', 'mp4', 'avc1.42001E', 'mp4a.40.2', height=360, fps=30, tbr=503.2, filesize=12076904),
+    fmt('134', 'mp4', 'avc1.4d401e', 'none', height=360, fps=30, tbr=284.6, filesize=6830018),
+    fmt('243', 'webm', 'vp9', 'none', height=360, fps=30, tbr=262.3, filesize=6295014),
+    fmt('22', 'mp4', 'avc1.64001F', 'mp4a.40.2', height=720, fps=30, tbr=1181.4),
+    fmt('136', 'mp4', 'avc1.4d401f', 'none', height=720, fps=30, tbr=1132.0, filesize=27168112),
+    fmt('247', 'webm', 'vp9', 'none', height=720, fps=30, tbr=1048.7, filesize=25169040),
+    fmt('398', 'mp4', 'av01.0.05M.08', 'none', height=720, fps=30, tbr=998.3, filesize=23959361),
+    fmt('137', 'mp4', 'avc1.640028', 'none', height=1080, fps=30, tbr=4396.1, filesize=105506220),
+    fmt('248', 'webm', 'vp9', 'none', height=1080, fps=30, tbr=2621.6, filesize=62918130),
+    fmt('399', 'mp4', 'av01.0.08M.08', 'none', height=1080, fps=30, tbr=1902.4, filesize=45657450),
+    fmt('313', 'webm', 'vp9', 'none', height=2160, fps=30, tbr=17865.0, filesize=428760102),
+    fmt('401', 'mp4', 'av01.0.12M.08', 'none', height=2160, fps=30, tbr=12345.6, filesize=296294410),
+]
+
+# An older upload: nothing above 720p and only H.264/VP9
+LEGACY_FORMATS = [
+    fmt('139', 'm4a', 'none', 'mp4a.40.5', tbr=48.6, abr=48.6),
+    fmt('140', 'm4a', 'none', 'mp4a.40.2', tbr=129.4, abr=129.4),
+    fmt('251', 'webm', 'none', 'opus', tbr=141.0, abr=141.0),
+    fmt('18', 'mp4', 'avc1.42001E', 'mp4a.40.2', height=360, fps=25, tbr=420.0),
+    fmt('134', 'mp4', 'avc1.4d401e', 'none', height=360, fps=25, tbr=300.1),
+    fmt('22', 'mp4', 'avc1.64001F', 'mp4a.40.2', height=720, fps=25, tbr=1100.5),
+    fmt('247', 'webm', 'vp9', 'none', height=720, fps=25, tbr=980.7),
+]
+
+# A dubbed upload: the original track is marked by language_preference
+DUBBED_FORMATS = [
+    fmt('140-0', 'm4a', 'none', 'mp4a.40.2', tbr=129.5, abr=129.5, language='de', language_preference=-1),
+    fmt('140-1', 'm4a', 'none', 'mp4a.40.2', tbr=129.5, abr=129.5, language='en', language_preference=10),
+    fmt('137', 'mp4', 'avc1.640028', 'none', height=1080, fps=30, tbr=4396.1),
+]
+
+# A generic extractor: muxed formats with no codec information
+GENERIC_FORMATS = [
+    {'format_id': 'low', 'ext': 'mp4', 'height': 480, 'url': 'https://cdn.example.com/low.mp4'},
+    {'format_id': 'high', 'ext': 'mp4', 'height': 1080, 'url': 'https://cdn.example.com/high.mp4'},
+]
+
+
+@pytest.mark.parametrize('formats, quality, container, can_merge, format_id, ext', [
+    # best: the highest video the container holds, with its preferred audio codec
+    (YOUTUBE_FORMATS, 'best', 'mp4', True, '401+140', 'mp4'),
+    (YOUTUBE_FORMATS, '1080p', 'mp4', True, '137+140', 'mp4'),
+    (YOUTUBE_FORMATS, '720p', 'mp4', True, '22', 'mp4'),
+    (YOUTUBE_FORMATS, '480p', 'mp4', True, '18', 'mp4'),
+    (YOUTUBE_FORMATS, 'worst', 'mp4', True, '394+139', 'mp4'),
+    # webm and mkv prefer their own codecs
+    (YOUTUBE_FORMATS, 'best', 'webm', True, '313+251', 'webm'),
+    (YOUTUBE_FORMATS, '1080p', 'webm', True, '248+251', 'webm'),
+    (YOUTUBE_FORMATS, 'worst', 'webm', True, '394+249', 'webm'),
+    (YOUTUBE_FORMATS, 'best', 'mkv', True, '401+251', 'mkv'),
+    (YOUTUBE_FORMATS, '720p', 'mkv', True, '22', 'mp4'),
+    # without ffmpeg only muxed formats can be downloaded
+    (YOUTUBE_FORMATS, 'best', 'mp4', False, '22', 'mp4'),
+    (YOUTUBE_FORMATS, '1080p', 'mp4', False, '22', 'mp4'),
+    (YOUTUBE_FORMATS, '360p', 'mp4', False, '18', 'mp4'),
+    (YOUTUBE_FORMATS, 'worst', 'mp4', False, '18', 'mp4'),
+    (YOUTUBE_FORMATS, 'best', 'webm', False, '22', 'mp4'),
+    # a muxed format wins when its video is as good as the best video-only one
+    (LEGACY_FORMATS, 'best', 'mp4', True, '22', 'mp4'),
+    (LEGACY_FORMATS, '1080p', 'mp4', True, '22', 'mp4'),
+    (LEGACY_FORMATS, '720p', 'webm', True, '247+251', 'webm'),
+    (LEGACY_FORMATS, 'worst', 'mp4', True, '18', 'mp4'),
+    # a cap below every height falls back to the lowest one
+    (LEGACY_FORMATS, '240p', 'mp4', True, '18', 'mp4'),
+    (DUBBED_FORMATS, 'best', 'mp4', True, '137+140-1', 'mp4'),
+    (GENERIC_FORMATS, 'best', 'mp4', True, 'high', 'mp4'),
+    (GENERIC_FORMATS, '720p', 'mp4', False, 'low', 'mp4'),
+])
+def test_select_format(formats, quality, container, can_merge, format_id, ext):
+    selected = select_format(formats, quality, container, can_merge)
+    assert selected['format_id'] == format_id
+    assert selected['ext'] == ext
+
+
+def test_pair_falls_back_to_mkv_when_the_container_cannot_hold_it():
+    formats = [f for f in YOUTUBE_FORMATS if f['format_id'] == '137']
+    formats.append(fmt('171', 'webm', 'none', 'vorbis', tbr=128.0, abr=128.0))
+    selected = select_format(formats, 'best', 'mp4')
+    assert selected['format_id'] == '137+171'
+    assert selected['ext'] == 'mkv'
+
+
+def test_pair_carries_both_streams_and_their_size():
+    selected = select_format(YOUTUBE_FORMATS, '1080p', 'mp4')
+    video, audio = selected['requested_formats']
+    assert (video['format_id'], audio['format_id']) == ('137', '140')
+    assert selected['height'] == 1080
+    assert format_size(selected) == 105506220 + 3107420
+
+
+def test_pair_size_is_estimated_from_bitrate_and_duration():
+    formats = [dict(f, filesize=None) for f in YOUTUBE_FORMATS if f['format_id'] in ('136', '140')]
+    selected = select_format(formats, 'best', 'mp4', duration=100)
+    assert selected['filesize_approx'] == int(1132.0 * 1000 / 8 * 100) + int(129.5 * 1000 / 8 * 100)
+
+
+def test_audio_only_source():
+    formats = [f for f in YOUTUBE_FORMATS if f['vcodec'] == 'none' and f['acodec'] != 'none']
+    assert select_format(formats, 'best', 'mp4')['format_id'] == '140'
+    assert select_format(formats, 'worst', 'mp4')['format_id'] == '139'
+
+
+def test_nothing_usable():
+    unusable = [f for f in YOUTUBE_FORMATS if f['format_id'] in ('sb0', '233')]
+    assert select_format(unusable) is None
+    assert select_format([]) is None
+
+
+def test_selector_falls_back_to_the_last_format():
+    unusable = [f for f in YOUTUBE_FORMATS if f['format_id'] in ('sb0', '233')]
+    assert [f['format_id'] for f in FormatSelector()({'formats': unusable})] == ['233']
+    assert list(FormatSelector()({'formats': []})) == []
+
+
+def test_selector_yields_the_selection():
+    selector = FormatSelector('1080p', 'webm', can_merge=True)
+    assert [f['format_id'] for f in selector({'formats': YOUTUBE_FORMATS})] == ['248+251']
+    assert repr(selector) == "FormatSelector('1080p', 'webm', can_merge=True)"
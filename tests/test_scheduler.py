@@ -0,0 +1,53 @@
+"""Job table bounds and queue positions of the download scheduler"""
+import threading
+import time
+
+from scheduler import DONE, FAILED, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, DownloadScheduler
+
+
+def wait_finished(jobs, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not all(job.is_finished() for job in jobs):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_only_the_last_finished_jobs_are_kept_but_all_are_counted():
+    scheduler = DownloadScheduler(2, keep_finished=5)
+
+    def run(job):
+        if job.name == 'bad':
+            raise RuntimeError("failed")
+
+    def playlist(job):
+        for _ in range(3):
+            scheduler.submit(run, name='entry', parent=job)
+
+    try:
+        jobs = [scheduler.submit(run, name='bad' if i % 4 == 0 else 'ok') for i in range(20)]
+        wait_finished(jobs)
+        parent = scheduler.submit(playlist, name='playlist')
+        wait_finished([parent])
+        # The playlist and its entries, plus the 4 newest other jobs
+        assert set(scheduler.jobs) == {job.id for job in jobs[-4:] + [parent] + parent.children}
+        assert scheduler.counts() == {'queued': 0, 'running': 0, DONE: 18, FAILED: 5}
+    finally:
+        scheduler.shutdown()
+
+
+def test_queue_position_orders_queued_jobs_by_priority():
+    scheduler = DownloadScheduler(1)
+    gate = threading.Event()
+    try:
+        blocker = scheduler.submit(lambda job: gate.wait())
+        while blocker.started_at is None:
+            time.sleep(0.01)
+        queued = [scheduler.submit(lambda job: None, priority=priority)
+                  for priority in (PRIORITY_NORMAL, PRIORITY_HIGH, PRIORITY_LOW)]
+        assert [scheduler.queue_position(job) for job in queued] == [2, 1, 3]
+        assert scheduler.queue_position(blocker) == 0
+        scheduler.cancel(queued[1])
+        assert [scheduler.queue_position(job) for job in queued] == [1, 0, 2]
+    finally:
+        gate.set()
+        scheduler.shutdown()
@@ -0,0 +1,85 @@
+"""Multi-connection downloads against the local range-capable server"""
+import os
+
+import pytest
+from yt_dlp.utils import DownloadError
+
+from benchmark import MediaServer
+from segmented_download import SegmentedYoutubeDL
+
+SIZE = 4 * 1024 * 1024
+
+
+class TruncatedResponse:
+    """A response that ends after limit bytes, like a connection dropped mid-segment"""
+
+    def __init__(self, response, limit):
+        self.response = response
+        self.left = limit
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def read(self, amt=None):
+        if self.left <= 0:
+            return b''
+        data = self.response.read(min(amt or self.left, self.left))
+        self.left -= len(data)
+        return data
+
+
+def download(tmp_path, urlopen=None, retries=2):
+    """Download the served file over 4 connections; urlopen(ydl, request) may wrap range requests"""
+    finished = []
+    opts = {'quiet': True, 'no_warnings': True, 'noprogress': True, 'retries': retries,
+            'outtmpl': os.path.join(str(tmp_path), '%(title)s.%(ext)s'), 'segmented_connections': 4,
+            'progress_hooks': [lambda d: d['status'] == 'finished' and finished.append(d)]}
+    with MediaServer({'large.mp4': SIZE}) as server, SegmentedYoutubeDL(opts) as ydl:
+        if urlopen is not None:
+            original = ydl.urlopen
+            ydl.urlopen = lambda request: urlopen(original, request)
+        try:
+            ydl.extract_info(server.url('large.mp4'))
+        finally:
+            files = sorted(os.listdir(tmp_path))
+    return files, finished
+
+
+def segment_requests(urlopen):
+    """Count the range requests of segments (not extraction or the size probe) and pass them to urlopen"""
+    requests = []
+
+    def wrapped(original, request):
+        if request.headers.get('Range') in (None, 'bytes=0-0'):
+            return original(request)
+        requests.append(request.headers['Range'])
+        return urlopen(original, request)
+    return wrapped, requests
+
+
+def test_download_is_assembled_in_place(tmp_path):
+    files, finished = download(tmp_path)
+    assert files == ['large.mp4']
+    assert os.path.getsize(tmp_path / 'large.mp4') == SIZE
+    assert len(finished) == 1
+
+
+def test_a_server_that_keeps_truncating_uses_up_the_retries(tmp_path):
+    urlopen, requests = segment_requests(lambda original, request: TruncatedResponse(original(request), 1024))
+    with pytest.raises(DownloadError, match="more expected"):
+        download(tmp_path, urlopen, retries=2)
+    # Each segment's first attempt and its two retries; no endless loop
+    assert 4 <= len(requests) <= 4 * 3
+    assert 'large.mp4' not in os.listdir(tmp_path)
+
+
+def test_an_unexpected_error_in_a_segment_fails_the_download(tmp_path):
+    def urlopen(original, request):
+        if request.headers['Range'].startswith('bytes=0-'):
+            raise ValueError("unexpected")
+        return original(request)
+    urlopen, requests = segment_requests(urlopen)
+    with pytest.raises(ValueError, match="unexpected"):
+        download(tmp_path, urlopen)
+    # Not renamed and not reported finished with the first segment missing
+    assert 'large.mp4' not in os.listdir(tmp_path)
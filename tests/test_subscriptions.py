@@ -0,0 +1,35 @@
+"""Incremental listing of subscriptions against their snapshot"""
+from subscriptions import APPENDED, NEWEST_FIRST, SyncRun
+
+
+def sync(order, known, listing):
+    run = SyncRun({'id': 1, 'url': 'https://www.youtube.com/playlist?list=PL1', 'title': None,
+                   'listing_order': order}, known)
+    entries = ({'id': entry_id} for entry_id in listing)
+    new = [entry['id'] for entry in run.filter(entries, {'playlist_count': len(listing)})]
+    return run, new
+
+
+def test_appended_playlist_with_one_entry_removed_and_one_added_is_listed_to_the_end():
+    known = [f"v{i}" for i in range(10)]
+    listing = [entry_id for entry_id in known if entry_id != 'v4'] + ['v10']
+    run, new = sync(APPENDED, known, listing)
+    assert new == ['v10']
+    assert not run.stopped_early
+    assert run.snapshot() == listing
+
+
+def test_newest_first_listing_stops_after_known_entries():
+    known = [f"v{i}" for i in range(10, 0, -1)]
+    run, new = sync(NEWEST_FIRST, known, ['v12', 'v11'] + known)
+    assert new == ['v12', 'v11']
+    assert run.stopped_early
+    assert run.checked_ids == ['v12', 'v11', 'v10', 'v9', 'v8']
+    # Entries past the stop are kept from the previous snapshot
+    assert run.snapshot() == ['v12', 'v11'] + known
+
+
+def test_failed_entries_are_left_out_of_the_snapshot():
+    run, new = sync(APPENDED, ['a'], ['a', 'b', 'c'])
+    assert new == ['b', 'c']
+    assert run.snapshot(failed_ids=['b']) == ['a', 'c']
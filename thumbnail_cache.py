@@ -0,0 +1,261 @@
+"""Content-addressed thumbnail cache shared by thumbnail embedding and the info previews"""
+import hashlib
+import importlib.util
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+MAX_THUMBNAIL_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 20
+
+_pp_class = None
+
+
+def thumbnail_sort_key(thumbnail):
+    """yt-dlp's thumbnail order: the last one after sorting is the one it writes"""
+    return (thumbnail.get('preference') if thumbnail.get('preference') is not None else -1,
+            thumbnail.get('width') if thumbnail.get('width') is not None else -1,
+            thumbnail.get('height') if thumbnail.get('height') is not None else -1,
+            thumbnail.get('id') if thumbnail.get('id') is not None else '',
+            thumbnail.get('url'))
+
+
+def best_thumbnail_url(info):
+    """Return the URL of the thumbnail yt-dlp would embed for an info dict or flat entry, or None"""
+    thumbnails = [t for t in info.get('thumbnails') or [] if t.get('url')]
+    if thumbnails:
+        return max(thumbnails, key=thumbnail_sort_key)['url']
+    return info.get('thumbnail')
+
+
+def decode_preview(path, size):
+    """Decode an image and shrink it to fit size (w, h); None when Pillow is not installed"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(path) as image:
+        image.thumbnail(size)
+        return image.convert('RGB')
+
+
+def _urlopen(url):
+    return urllib.request.urlopen(urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'}),
+                                  timeout=FETCH_TIMEOUT)
+
+
+class ThumbnailCache:
+    """Thumbnail files stored once per content hash, with a size cap and LRU eviction
+
+    urls maps every thumbnail URL seen to the SHA-256 of its bytes, so
+    thumbnails served under several URLs are stored once. A URL is fetched
+    at most once while it stays cached, even when several jobs ask for it
+    at the same time.
+    """
+
+    def __init__(self, directory="thumbnails", max_bytes=128 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.fetches = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._fetching = {}
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_blobs_accessed ON blobs (accessed_at);
+            CREATE INDEX IF NOT EXISTS idx_urls_digest ON urls (digest);
+        """)
+        self._conn.commit()
+
+    def get(self, url):
+        """Return the cached file of a thumbnail URL, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT b.digest, b.ext FROM urls u JOIN blobs b ON b.digest = u.digest "
+                                     "WHERE u.url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            path = self._path(*row)
+            if not os.path.exists(path):
+                self._remove_blob(row[0])
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time(), row[0]))
+            self._conn.commit()
+            self.hits += 1
+        return path
+
+    def fetch(self, url, urlopen=None):
+        """Return the cached file of a thumbnail URL, downloading it first if needed
+
+        urlopen(url) returns a response to read; YoutubeDL.urlopen keeps the
+        job's proxy and cookies.
+        """
+        while True:
+            path = self.get(url)
+            if path is not None:
+                return path
+            with self._lock:
+                pending = self._fetching.get(url)
+                if pending is None:
+                    pending = self._fetching[url] = threading.Event()
+                    break
+            # Someone else is fetching this URL; use their result
+            pending.wait(FETCH_TIMEOUT)
+        try:
+            with (urlopen or _urlopen)(url) as response:
+                data = response.read(MAX_THUMBNAIL_BYTES + 1)
+            if len(data) > MAX_THUMBNAIL_BYTES:
+                raise ValueError(f"Thumbnail larger than {MAX_THUMBNAIL_BYTES} bytes: {url}")
+            return self._store(url, data)
+        finally:
+            with self._lock:
+                self._fetching.pop(url, None)
+            pending.set()
+
+    def place(self, url, target, urlopen=None):
+        """Copy a thumbnail to target, fetching it only if it is not cached"""
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        try:
+            shutil.copyfile(self.fetch(url, urlopen), target)
+        except FileNotFoundError:
+            # Evicted between the lookup and the copy
+            shutil.copyfile(self.fetch(url, urlopen), target)
+        return target
+
+    def preview(self, infos, size):
+        """Return a decoded preview of the first info dict (or flat entry) with a thumbnail
+
+        Fetching, decoding and resizing all block, so this runs on a worker;
+        None when there is no thumbnail or Pillow is not installed.
+        """
+        if importlib.util.find_spec('PIL') is None:
+            return None
+        for info in infos:
+            url = info and best_thumbnail_url(info)
+            if url:
+                return decode_preview(self.fetch(url), size)
+        return None
+
+    def clear(self):
+        """Remove every cached thumbnail"""
+        with self._lock:
+            for digest, ext in self._conn.execute("SELECT digest, ext FROM blobs").fetchall():
+                self._unlink(self._path(digest, ext))
+            self._conn.execute("DELETE FROM blobs")
+            self._conn.execute("DELETE FROM urls")
+            self._conn.commit()
+
+    def stats(self):
+        """Return file count, stored bytes and hit/fetch counters"""
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {'files': count, 'bytes': size, 'hits': self.hits, 'fetches': self.fetches,
+                'evictions': self.evictions}
+
+    def _store(self, url, data):
+        digest = hashlib.sha256(data).hexdigest()
+        ext = os.path.splitext(urlparse(url).path)[1].lstrip('.').lower() or 'jpg'
+        now = time.time()
+        with self._lock:
+            self.fetches += 1
+            row = self._conn.execute("SELECT ext FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is None:
+                path = self._path(digest, ext)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(path + '.tmp', path)
+                self._conn.execute("INSERT INTO blobs VALUES (?, ?, ?, ?)", (digest, ext, len(data), now))
+            else:
+                # Same image under another URL
+                path = self._path(digest, row[0])
+                self._conn.execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (now, digest))
+            self._conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, digest))
+            self._evict(keep=digest)
+            self._conn.commit()
+        return path
+
+    def _evict(self, keep=None):
+        """Drop least recently used files until under max_bytes (lock must be held)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT digest, ext, size FROM blobs ORDER BY accessed_at").fetchall()
+        for digest, ext, size in rows:
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            self._unlink(self._path(digest, ext))
+            self._remove_blob(digest)
+            total -= size
+            self.evictions += 1
+
+    def _remove_blob(self, digest):
+        self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        self._conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+
+    def _path(self, digest, ext):
+        return os.path.join(self.directory, digest[:2], f"{digest}.{ext}")
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def add_thumbnail_cache(ydl, cache):
+    """Let a YoutubeDL write thumbnails from the cache (for jobs with the cache_thumbnail option)
+
+    The job's options swap writethumbnail for cache_thumbnail; the
+    postprocessor then does what yt-dlp's own thumbnail writing does, but
+    copies the file from the cache instead of fetching it again.
+    """
+    global _pp_class
+    if _pp_class is None:
+        from yt_dlp.postprocessor.common import PostProcessor
+        from yt_dlp.networking import Request
+        from yt_dlp.utils import determine_ext, replace_extension
+
+        def run(self, info):
+            thumbnails = info.get('thumbnails') or []
+            if not self.get_param('cache_thumbnail') or not thumbnails:
+                return [], info
+            ydl = self._downloader
+            thumbnail = thumbnails[-1]
+            ext = thumbnail.get('ext') or determine_ext(thumbnail['url'], 'jpg')
+            filename = replace_extension(ydl.prepare_filename(info, 'temp'), ext, info.get('ext'))
+            final = replace_extension(ydl.prepare_filename(info, 'thumbnail'), ext, info.get('ext'))
+            try:
+                self.cache.place(thumbnail['url'], filename,
+                                 lambda url: ydl.urlopen(Request(url, headers=thumbnail.get('http_headers') or {})))
+            except Exception as e:
+                self.report_warning(f"Unable to get thumbnail: {e}")
+                return [], info
+            thumbnail['filepath'] = filename
+            info['__files_to_move'][filename] = final
+            return [], info
+
+        _pp_class = type(PostProcessor)("CachedThumbnailPP", (PostProcessor,), {'run': run})
+    pp = _pp_class()
+    pp.cache = cache
+    ydl.add_post_processor(pp, when='before_dl')
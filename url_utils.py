@@ -0,0 +1,100 @@
+"""YouTube URL parsing and normalization"""
+import re
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+
+VIDEO_ID_RE = re.compile(r'^[0-9A-Za-z_-]{11}$')
+PLAYLIST_ID_RE = re.compile(r'^[0-9A-Za-z_-]{10,}$')
+YOUTUBE_HOSTS = ('youtube.com', 'youtube-nocookie.com')
+SHORT_HOSTS = ('youtu.be',)
+PATH_VIDEO_PREFIXES = ('shorts', 'embed', 'v', 'live', 'e')
+URL_IN_TEXT_RE = re.compile(r'(?:https?://|www\.|m\.|music\.|youtu\.be/|youtube\.com/)\S+', re.IGNORECASE)
+
+
+def _host(parsed):
+    """Return the lower-cased host without www./m./music. prefixes"""
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return host
+
+
+def parse_youtube_url(url):
+    """Return (video_id, playlist_id) for a YouTube URL; either may be None"""
+    url = (url or '').strip()
+    if not url:
+        return None, None
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None, None
+
+    host = _host(parsed)
+    query = parse_qs(parsed.query)
+    parts = [p for p in parsed.path.split('/') if p]
+    video_id = None
+
+    if host in SHORT_HOSTS:
+        if parts:
+            video_id = parts[0]
+    elif host in YOUTUBE_HOSTS:
+        if parts and parts[0] == 'watch':
+            video_id = query.get('v', [None])[0]
+        elif len(parts) >= 2 and parts[0] in PATH_VIDEO_PREFIXES:
+            video_id = parts[1]
+    else:
+        return None, None
+
+    playlist_id = query.get('list', [None])[0]
+    if video_id and not VIDEO_ID_RE.match(video_id):
+        video_id = None
+    if playlist_id and not PLAYLIST_ID_RE.match(playlist_id):
+        playlist_id = None
+    return video_id, playlist_id
+
+
+def find_youtube_urls(text):
+    """Yield (url, video_id, playlist_id) for every YouTube URL found in free text"""
+    for match in URL_IN_TEXT_RE.finditer(text or ''):
+        url = match.group(0).rstrip('.,;:!?)]}>"\'')
+        video_id, playlist_id = parse_youtube_url(url)
+        if video_id or playlist_id:
+            yield url, video_id, playlist_id
+
+
+def canonical_url(video_id=None, playlist_id=None):
+    """Build the canonical YouTube URL for a video and/or playlist ID"""
+    if video_id and playlist_id:
+        return f"https://www.youtube.com/watch?v={video_id}&list={playlist_id}"
+    if playlist_id:
+        return f"https://www.youtube.com/playlist?list={playlist_id}"
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def is_youtube_url(url):
+    """Check whether a URL points to a YouTube video or playlist"""
+    video_id, playlist_id = parse_youtube_url(url)
+    return bool(video_id or playlist_id)
+
+
+def normalize_url(url):
+    """Normalize a generic URL: lower-case scheme/host, sorted query, no fragment"""
+    parsed = urlparse(url.strip())
+    query = urlencode(sorted(parse_qs(parsed.query, keep_blank_values=True).items()), doseq=True)
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path, parsed.params, query, ''))
+
+
+def canonical_key(url):
+    """Return a stable identity for a URL
+
+    A playlist ID wins over a video ID because yt-dlp extracts the whole
+    playlist for watch URLs that carry a list parameter.
+    """
+    video_id, playlist_id = parse_youtube_url(url)
+    if playlist_id:
+        return f"youtube:playlist:{playlist_id}"
+    if video_id:
+        return f"youtube:video:{video_id}"
+    return f"url:{normalize_url(url)}"
@@ -0,0 +1,109 @@
+"""Pool of reusable YoutubeDL instances"""
+import contextlib
+import json
+import threading
+
+# Option profiles
+PROFILE_INFO = "info"
+PROFILE_FLAT = "flat"
+PROFILE_VIDEO = "video"
+PROFILE_AUDIO = "audio"
+
+
+class YDLPool:
+    """Keeps idle YoutubeDL instances per option profile for reuse
+
+    Constructing a YoutubeDL loads the extractor list, the cookie jar and a
+    new HTTP opener. Reusing an instance skips that cost and keeps HTTP
+    connections alive. Each instance is used by one job at a time; job
+    hooks are attached on acquire and removed again on release.
+    """
+
+    def __init__(self, factory, max_idle_per_key=4):
+        self.factory = factory
+        self.max_idle_per_key = max_idle_per_key
+        self.created = {}
+        self.reused = {}
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def options_key(profile, opts):
+        """Return the pool key for a profile and its options"""
+        return profile, json.dumps(opts, sort_keys=True, default=repr)
+
+    @contextlib.contextmanager
+    def acquire(self, profile, opts, progress_hooks=(), postprocessor_hooks=()):
+        """Borrow an instance for the given options, with job hooks attached"""
+        key = self.options_key(profile, opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            ydl = idle.pop() if idle else None
+            counter = self.reused if ydl is not None else self.created
+            counter[profile] = counter.get(profile, 0) + 1
+        if ydl is None:
+            ydl = self.factory(dict(opts))
+
+        for hook in progress_hooks:
+            ydl.add_progress_hook(hook)
+        for hook in postprocessor_hooks:
+            ydl.add_postprocessor_hook(hook)
+
+        reusable = True
+        try:
+            yield ydl
+        except Exception as e:
+            # Download errors leave the instance usable; anything else might not
+            reusable = type(e).__name__ in ('DownloadError', 'ExtractorError')
+            raise
+        except BaseException:
+            reusable = False
+            raise
+        finally:
+            self._detach(ydl, progress_hooks, postprocessor_hooks)
+            self._release(key, ydl, reusable)
+
+    def stats(self):
+        """Return created/reused counts per profile"""
+        with self._lock:
+            return {'created': dict(self.created), 'reused': dict(self.reused),
+                    'idle': sum(len(v) for v in self._idle.values())}
+
+    def close(self):
+        """Close every idle instance"""
+        with self._lock:
+            idle = [ydl for instances in self._idle.values() for ydl in instances]
+            self._idle.clear()
+        for ydl in idle:
+            self._close(ydl)
+
+    def _detach(self, ydl, progress_hooks, postprocessor_hooks):
+        """Remove job hooks from an instance and its postprocessors"""
+        for hook in progress_hooks:
+            if hook in ydl._progress_hooks:
+                ydl._progress_hooks.remove(hook)
+        for hook in postprocessor_hooks:
+            if hook in ydl._postprocessor_hooks:
+                ydl._postprocessor_hooks.remove(hook)
+            for pps in ydl._pps.values():
+                for pp in pps:
+                    if hook in pp._progress_hooks:
+                        pp._progress_hooks.remove(hook)
+
+    def _release(self, key, ydl, reusable):
+        """Return an instance to the pool, or close it"""
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle_per_key:
+                    idle.append(ydl)
+                    return
+        self._close(ydl)
+
+    @staticmethod
+    def _close(ydl):
+        """Close an instance, ignoring errors"""
+        try:
+            ydl.close()
+        except Exception as e:
+            print(f"Error closing YoutubeDL: {e}")
@@ -1,31 +1,44 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
 import sys
-import time
 import re
 from datetime import datetime
 import webbrowser
 from urllib.parse import urlparse, parse_qs
-import subprocess
 
-# Try to import yt-dlp
-try:
-    import yt_dlp
-except ImportError:
-    print("yt-dlp not found. Installing...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "yt-dlp"])
-    import yt_dlp
+import engine
+from clipboard_watcher import ClipboardWatcher
+from daemon_client import DaemonClient, DaemonError, RemoteEngine
+from format_selection import describe_format
+from progress_bus import ProgressBus, progress_state, retry_text
+from bandwidth import format_schedule, parse_schedule
+from stats_store import format_bytes
+from subscriptions import format_summary
+from url_utils import canonical_url, parse_youtube_url
+from scheduler import DONE, FAILED
+
+HISTORY_PAGE_SIZE = 25
+# Largest thumbnail preview in the info panels (width, height)
+PREVIEW_SIZE = (240, 135)
+# Subscription sync intervals offered in the Playlist tab, in minutes (0 = manual only)
+SUBSCRIPTION_INTERVALS = {"Manual sync": 0, "Every hour": 60, "Every 6 hours": 360, "Daily": 1440}
 
 # Set appearance mode and color theme
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
 class YouTubeDownloaderPro:
-    def __init__(self):
+    def __init__(self, startup_report=False, attach=None):
+        self.startup_report = startup_report
+        self.startup_times = {}
         self.root = ctk.CTk()
         self.root.title("YouTube Downloader Pro")
         self.root.geometry("1200x800")
@@ -33,50 +46,59 @@ class YouTubeDownloaderPro:
         
         # Initialize variables
         self.download_path = os.path.expanduser("~/Downloads/YouTube")
-        self.history = []
+        self.history_page = 0
+        self.history_rows = []
         self.current_downloads = {}
+        self.bulk_import = None
         self.settings = self.load_settings()
-        self.clipboard_content = ""
         
-        # Create download directory if it doesn't exist
-        os.makedirs(self.download_path, exist_ok=True)
+        # Download engine owns the scheduler and creates the download directory
+        self.attached = attach is not None
+        if self.attached:
+            # Jobs, settings and statistics live on a daemon; metadata, history and caches are read locally
+            url = attach or f"http://127.0.0.1:{self.settings['daemon_port']}"
+            try:
+                self.engine = RemoteEngine(DaemonClient(url), engine.MetadataEngine(self.settings, quiet=False),
+                                           on_job_state=self.on_job_state_change)
+            except (OSError, DaemonError) as e:
+                messagebox.showerror("Daemon Error", f"Could not attach to the daemon at {url}: {e}")
+                raise SystemExit(1)
+            # The Settings tab shows and changes the daemon's settings
+            self.settings = dict(self.engine.settings)
+            self.root.title(f"YouTube Downloader Pro (attached to {url})")
+            self.root.report_callback_exception = self.report_daemon_error
+        else:
+            self.engine = engine.DownloadEngine(self.settings, on_job_state=self.on_job_state_change,
+                                                quiet=False)
+        self.download_path = self.engine.download_path
+        
+        # Thumbnail previews are fetched and decoded off the Tk thread
+        self.preview_executor = ThreadPoolExecutor(2, thread_name_prefix="thumbnail")
+        
+        # Progress events are coalesced per job and flushed at a fixed frame rate
+        self.progress_bus = ProgressBus(hz=self.settings["ui_refresh_hz"])
         
         self.setup_ui()
+        self.refresh_stats()
+        self.progress_bus.start(self.root)
         self.start_clipboard_watcher()
-        
+        self.startup_times["ui_built"] = time.perf_counter() - STARTUP_STARTED
+        self.root.bind("<Map>", self.on_first_frame, add="+")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+    def report_daemon_error(self, exc_type, error, traceback):
+        """Show failed daemon requests (attached mode) instead of only printing them"""
+        self.root.__class__.report_callback_exception(self.root, exc_type, error, traceback)
+        if isinstance(error, (OSError, DaemonError)):
+            messagebox.showerror("Daemon Error", f"Request to the daemon failed: {error}")
+    
     def load_settings(self):
         """Load settings from JSON file"""
-        settings_file = "settings.json"
-        default_settings = {
-            "download_path": self.download_path,
-            "theme": "dark",
-            "auto_clipboard": True,
-            "concurrent_downloads": 3,
-            "default_video_quality": "best",
-            "default_audio_format": "mp3"
-        }
-        
-        try:
-            if os.path.exists(settings_file):
-                with open(settings_file, 'r') as f:
-                    settings = json.load(f)
-                    # Update with any missing keys
-                    for key, value in default_settings.items():
-                        if key not in settings:
-                            settings[key] = value
-                    return settings
-        except:
-            pass
-        
-        return default_settings
+        return engine.load_settings(download_path=self.download_path)
     
     def save_settings(self):
         """Save settings to JSON file"""
-        try:
-            with open("settings.json", 'w') as f:
-                json.dump(self.settings, f, indent=2)
-        except Exception as e:
-            print(f"Error saving settings: {e}")
+        engine.save_settings(self.settings)
     
     def setup_ui(self):
         """Setup the main user interface"""
@@ -102,6 +124,7 @@ class YouTubeDownloaderPro:
             ("Playlist Download", "📋"),
             ("Audio Extract", "🎵"),
             ("History", "📜"),
+            ("Diagnostics", "🩺"),
             ("Settings", "⚙️")
         ]
         
@@ -117,39 +140,40 @@ class YouTubeDownloaderPro:
                                          command=self.toggle_theme, height=30)
         self.theme_button.grid(row=11, column=0, padx=20, pady=10, sticky="ew")
         
+        # Settings variables are shared by several tabs, so they exist before any tab is built
+        self.auto_clipboard_var = ctk.BooleanVar(value=self.settings["auto_clipboard"])
+        self.clipboard_enqueue_var = ctk.BooleanVar(value=self.settings["clipboard_auto_enqueue"])
+        self.adaptive_concurrency_var = ctk.BooleanVar(value=self.settings["adaptive_concurrency"])
+        
         # Main content area
         self.main_frame = ctk.CTkFrame(self.root)
         self.main_frame.grid(row=0, column=1, sticky="nsew", padx=10, pady=10)
         self.main_frame.grid_columnconfigure(0, weight=1)
         self.main_frame.grid_rowconfigure(0, weight=1)
         
-        # Create all tabs
+        # Register tabs; each one is built the first time it is shown
         self.create_tabs()
         
         # Show home tab by default
         self.show_tab("Home")
     
     def create_tabs(self):
-        """Create all tab content"""
+        """Register tab builders; tabs are constructed lazily by ensure_tab"""
         self.tabs = {}
-        
-        # Home Tab
-        self.create_home_tab()
-        
-        # Video Download Tab
-        self.create_video_tab()
-        
-        # Playlist Download Tab  
-        self.create_playlist_tab()
-        
-        # Audio Extract Tab
-        self.create_audio_tab()
-        
-        # History Tab
-        self.create_history_tab()
-        
-        # Settings Tab
-        self.create_settings_tab()
+        self.tab_builders = {
+            "Home": self.create_home_tab,
+            "Video Download": self.create_video_tab,
+            "Playlist Download": self.create_playlist_tab,
+            "Audio Extract": self.create_audio_tab,
+            "History": self.create_history_tab,
+            "Diagnostics": self.create_diagnostics_tab,
+            "Settings": self.create_settings_tab,
+        }
+    
+    def ensure_tab(self, tab_name):
+        """Build a tab if it has not been built yet"""
+        if tab_name not in self.tabs and tab_name in self.tab_builders:
+            self.tab_builders[tab_name]()
     
     def create_home_tab(self):
         """Create home tab content"""
@@ -186,6 +210,21 @@ class YouTubeDownloaderPro:
                                           command=self.quick_download, height=40, width=120)
         quick_download_btn.pack(side="right", padx=(5, 10), pady=10)
         
+        # Bulk import of URL lists
+        bulk_frame = ctk.CTkFrame(quick_frame)
+        bulk_frame.pack(pady=(0, 20), padx=20, fill="x")
+        
+        bulk_btn = ctk.CTkButton(bulk_frame, text="Bulk Import...", command=self.open_bulk_import,
+                                 height=32, width=120)
+        bulk_btn.pack(side="left", padx=(10, 5), pady=10)
+        
+        self.bulk_cancel_btn = ctk.CTkButton(bulk_frame, text="Cancel Import", command=self.cancel_bulk_import,
+                                             height=32, width=120, state="disabled")
+        self.bulk_cancel_btn.pack(side="left", padx=5, pady=10)
+        
+        self.bulk_status_label = ctk.CTkLabel(bulk_frame, text="Import a text file or a pasted list of URLs")
+        self.bulk_status_label.pack(side="left", padx=10, pady=10)
+        
         # Statistics
         stats_frame = ctk.CTkFrame(home_frame)
         stats_frame.pack(pady=20, padx=40, fill="x")
@@ -196,7 +235,11 @@ class YouTubeDownloaderPro:
         
         self.stats_label = ctk.CTkLabel(stats_frame, text="Downloads: 0 | Total Size: 0 MB", 
                                        font=ctk.CTkFont(size=14))
-        self.stats_label.pack(pady=(0, 20))
+        self.stats_label.pack(pady=(0, 10))
+        
+        self.queue_label = ctk.CTkLabel(stats_frame, text="Queued: 0 | Running: 0 | Failed: 0", 
+                                       font=ctk.CTkFont(size=14))
+        self.queue_label.pack(pady=(0, 20))
     
     def create_video_tab(self):
         """Create video download tab"""
@@ -225,6 +268,7 @@ class YouTubeDownloaderPro:
         self.video_info_frame = ctk.CTkFrame(video_frame, height=200)
         self.video_info_frame.grid(row=4, column=0, sticky="ew", padx=20, pady=10)
         self.video_info_frame.grid_columnconfigure(1, weight=1)
+        self.video_preview_label = ctk.CTkLabel(self.video_info_frame, text="")
         
         # Quality selection
         quality_label = ctk.CTkLabel(video_frame, text="Quality:")
@@ -279,6 +323,10 @@ class YouTubeDownloaderPro:
         # Playlist info
         self.playlist_info_frame = ctk.CTkFrame(playlist_frame, height=150)
         self.playlist_info_frame.grid(row=4, column=0, sticky="ew", padx=20, pady=10)
+        self.playlist_info_frame.grid_columnconfigure(1, weight=1)
+        self.playlist_preview_label = ctk.CTkLabel(self.playlist_info_frame, text="")
+        # Widgets and running totals of the listing shown in the panel
+        self.playlist_panel = None
         
         # Range selection
         range_frame = ctk.CTkFrame(playlist_frame)
@@ -313,15 +361,42 @@ class YouTubeDownloaderPro:
                                                  values=["best", "worst", "720p", "1080p"])
         self.playlist_quality.grid(row=0, column=2, padx=5, pady=10)
         
-        # Download button
-        download_btn = ctk.CTkButton(playlist_frame, text="Download Playlist", 
+        # Download and subscribe buttons
+        actions_frame = ctk.CTkFrame(playlist_frame, fg_color="transparent")
+        actions_frame.grid(row=7, column=0, sticky="w", padx=20, pady=20)
+        
+        download_btn = ctk.CTkButton(actions_frame, text="Download Playlist", 
                                     command=self.download_playlist, height=40)
-        download_btn.grid(row=7, column=0, sticky="w", padx=20, pady=20)
+        download_btn.pack(side="left")
+        
+        subscribe_btn = ctk.CTkButton(actions_frame, text="Subscribe", 
+                                     command=self.subscribe_playlist, height=40)
+        subscribe_btn.pack(side="left", padx=(10, 5))
+        
+        self.subscription_interval = ctk.CTkOptionMenu(actions_frame, values=list(SUBSCRIPTION_INTERVALS))
+        self.subscription_interval.pack(side="left", padx=5)
         
         # Progress
         self.playlist_progress_frame = ctk.CTkFrame(playlist_frame)
         self.playlist_progress_frame.grid(row=8, column=0, sticky="ew", padx=20, pady=10)
         self.playlist_progress_frame.grid_columnconfigure(0, weight=1)
+        
+        # Subscriptions: only what was added since the last sync is downloaded
+        subscriptions_header = ctk.CTkFrame(playlist_frame, fg_color="transparent")
+        subscriptions_header.grid(row=9, column=0, sticky="ew", padx=20, pady=(10, 0))
+        
+        subscriptions_title = ctk.CTkLabel(subscriptions_header, text="Subscriptions", 
+                                          font=ctk.CTkFont(size=16, weight="bold"))
+        subscriptions_title.pack(side="left")
+        
+        sync_all_btn = ctk.CTkButton(subscriptions_header, text="Sync All", width=90, 
+                                    command=lambda: self.sync_subscriptions())
+        sync_all_btn.pack(side="right")
+        
+        self.subscriptions_frame = ctk.CTkScrollableFrame(playlist_frame, height=150)
+        self.subscriptions_frame.grid(row=10, column=0, sticky="ew", padx=20, pady=10)
+        self.subscriptions_frame.grid_columnconfigure(0, weight=1)
+        self.update_subscriptions()
     
     def create_audio_tab(self):
         """Create audio extraction tab"""
@@ -391,15 +466,122 @@ class YouTubeDownloaderPro:
                             font=ctk.CTkFont(size=24, weight="bold"))
         title.grid(row=0, column=0, pady=(20, 10), sticky="w", padx=20)
         
-        # History list
+        # History list; only one page of rows is ever created
         self.history_frame = ctk.CTkScrollableFrame(history_frame)
         self.history_frame.grid(row=1, column=0, sticky="nsew", padx=20, pady=10)
         self.history_frame.grid_columnconfigure(0, weight=1)
         
-        # Clear history button
-        clear_btn = ctk.CTkButton(history_frame, text="Clear History", 
+        # Paging and clear history buttons
+        controls_frame = ctk.CTkFrame(history_frame, fg_color="transparent")
+        controls_frame.grid(row=2, column=0, sticky="ew", padx=20, pady=10)
+        
+        clear_btn = ctk.CTkButton(controls_frame, text="Clear History", 
                                  command=self.clear_history, height=35)
-        clear_btn.grid(row=2, column=0, sticky="w", padx=20, pady=10)
+        clear_btn.pack(side="left")
+        
+        next_btn = ctk.CTkButton(controls_frame, text="Older ▶", width=80, height=35,
+                                command=lambda: self.change_history_page(1))
+        next_btn.pack(side="right")
+        
+        self.history_page_label = ctk.CTkLabel(controls_frame, text="")
+        self.history_page_label.pack(side="right", padx=10)
+        
+        prev_btn = ctk.CTkButton(controls_frame, text="◀ Newer", width=80, height=35,
+                                command=lambda: self.change_history_page(-1))
+        prev_btn.pack(side="right")
+        
+        self.update_history_display()
+    
+    def create_diagnostics_tab(self):
+        """Create diagnostics tab with timing percentiles per job stage"""
+        diagnostics_frame = ctk.CTkFrame(self.main_frame)
+        self.tabs["Diagnostics"] = diagnostics_frame
+        diagnostics_frame.grid_columnconfigure(0, weight=1)
+        diagnostics_frame.grid_rowconfigure(1, weight=1)
+        
+        # Title
+        title = ctk.CTkLabel(diagnostics_frame, text="Diagnostics", 
+                            font=ctk.CTkFont(size=24, weight="bold"))
+        title.grid(row=0, column=0, pady=(20, 10), sticky="w", padx=20)
+        
+        # Stage table; a row per stage is created the first time the stage is seen
+        self.stage_table = ctk.CTkScrollableFrame(diagnostics_frame)
+        self.stage_table.grid(row=1, column=0, sticky="nsew", padx=20, pady=10)
+        for column, heading in enumerate(("Stage", "Count", "p50", "p95", "Max")):
+            self.stage_table.grid_columnconfigure(column, weight=1)
+            header = ctk.CTkLabel(self.stage_table, text=heading, font=ctk.CTkFont(weight="bold"))
+            header.grid(row=0, column=column, padx=10, pady=5, sticky="w")
+        self.stage_rows = {}
+        self.diagnostics_after = None
+        
+        # Export and endpoint
+        controls_frame = ctk.CTkFrame(diagnostics_frame, fg_color="transparent")
+        controls_frame.grid(row=2, column=0, sticky="ew", padx=20, pady=10)
+        
+        export_btn = ctk.CTkButton(controls_frame, text="Export Spans", 
+                                  command=self.export_spans, height=35)
+        export_btn.pack(side="left")
+        
+        server = self.engine.metrics_server
+        endpoint_text = (f"Metrics: {server.url}/metrics | Spans: {server.url}/spans" if server
+                         else "Metrics endpoint off (set metrics_port in settings.json)")
+        endpoint_label = ctk.CTkLabel(controls_frame, text=endpoint_text)
+        endpoint_label.pack(side="left", padx=20)
+        
+        # Adaptive concurrency decisions
+        self.concurrency_label = ctk.CTkLabel(diagnostics_frame, text="", justify="left")
+        self.concurrency_label.grid(row=3, column=0, sticky="w", padx=20, pady=(0, 10))
+    
+    def update_diagnostics(self):
+        """Refresh the stage table every two seconds while the tab is shown"""
+        if self.diagnostics_after is not None:
+            self.root.after_cancel(self.diagnostics_after)
+            self.diagnostics_after = None
+        
+        def seconds_text(value):
+            return f"{value * 1000:.0f} ms" if value < 1 else f"{value:.2f} s"
+        
+        for i, (stage, stats) in enumerate(self.engine.spans.summary().items(), 1):
+            labels = self.stage_rows.get(stage)
+            if labels is None:
+                labels = self.stage_rows[stage] = [ctk.CTkLabel(self.stage_table, text=stage)] + [
+                    ctk.CTkLabel(self.stage_table, text="") for _ in range(4)]
+            values = (f"{stats['count']:,}", seconds_text(stats['p50']), seconds_text(stats['p95']),
+                      seconds_text(stats['max']))
+            for column, label in enumerate(labels):
+                if column:
+                    label.configure(text=values[column - 1])
+                label.grid(row=i, column=column, padx=10, pady=2, sticky="w")
+        
+        controller = self.engine.concurrency
+        if controller is None:
+            text = f"Concurrent downloads: {self.engine.scheduler.max_workers} (fixed)"
+        else:
+            snapshot = controller.snapshot()
+            text = (f"Concurrent downloads: {snapshot['workers']} of at most {snapshot['ceiling']} (auto) | "
+                    f"{format_bytes(snapshot['throughput'])}/s")
+            for decision in snapshot['decisions'][-5:]:
+                at = datetime.fromtimestamp(decision['time']).strftime('%H:%M:%S')
+                text += f"\n{at}  {decision['from']} -> {decision['to']}: {decision['reason']}"
+        for host, state in self.engine.breaker.snapshot().items():
+            text += f"\nPaused host {host}: {state['state']}, retry in {state['retry_in']:.0f}s"
+        self.concurrency_label.configure(text=text)
+        
+        # winfo_manager is empty once show_tab has hidden the tab
+        if self.tabs["Diagnostics"].winfo_manager():
+            self.diagnostics_after = self.root.after(2000, self.update_diagnostics)
+    
+    def export_spans(self):
+        """Save the recent spans as JSON lines"""
+        path = filedialog.asksaveasfilename(defaultextension=".jsonl",
+                                            filetypes=[("JSON lines", "*.jsonl"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            with open(path, 'w') as f:
+                f.write(self.engine.spans.json_lines())
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not export spans: {e}")
     
     def create_settings_tab(self):
         """Create settings tab"""
@@ -432,11 +614,14 @@ class YouTubeDownloaderPro:
         other_frame = ctk.CTkFrame(settings_frame)
         other_frame.grid(row=2, column=0, sticky="ew", padx=20, pady=10)
         
-        self.auto_clipboard_var = ctk.BooleanVar(value=self.settings["auto_clipboard"])
         auto_clipboard_cb = ctk.CTkCheckBox(other_frame, text="Auto-detect clipboard URLs", 
                                            variable=self.auto_clipboard_var)
         auto_clipboard_cb.grid(row=0, column=0, padx=10, pady=10, sticky="w")
         
+        clipboard_enqueue_cb = ctk.CTkCheckBox(other_frame, text="Queue clipboard URLs for download immediately", 
+                                              variable=self.clipboard_enqueue_var)
+        clipboard_enqueue_cb.grid(row=0, column=1, padx=10, pady=10, sticky="w")
+        
         # Concurrent downloads
         concurrent_label = ctk.CTkLabel(other_frame, text="Max Concurrent Downloads:")
         concurrent_label.grid(row=1, column=0, padx=10, pady=10, sticky="w")
@@ -445,6 +630,53 @@ class YouTubeDownloaderPro:
         self.concurrent_downloads.set(self.settings["concurrent_downloads"])
         self.concurrent_downloads.grid(row=1, column=1, padx=10, pady=10, sticky="w")
         
+        # Adaptive mode starts from the slider value and stays at or below the ceiling
+        adaptive_cb = ctk.CTkCheckBox(other_frame, text="Adjust automatically, up to:", 
+                                     variable=self.adaptive_concurrency_var)
+        adaptive_cb.grid(row=1, column=2, padx=10, pady=10, sticky="w")
+        
+        self.concurrency_ceiling_entry = ctk.CTkEntry(other_frame, width=60)
+        self.concurrency_ceiling_entry.grid(row=1, column=3, padx=10, pady=10, sticky="w")
+        self.concurrency_ceiling_entry.insert(0, str(self.settings["max_concurrent_downloads"]))
+        
+        # Connections per download (fragments for DASH/HLS, byte ranges for plain files)
+        connections_label = ctk.CTkLabel(other_frame, text="Connections per Download:")
+        connections_label.grid(row=2, column=0, padx=10, pady=10, sticky="w")
+        
+        self.connections_per_download = ctk.CTkSlider(other_frame, from_=1, to=16, number_of_steps=15)
+        self.connections_per_download.set(self.settings["connections_per_download"])
+        self.connections_per_download.grid(row=2, column=1, padx=10, pady=10, sticky="w")
+        
+        # Bandwidth limit, applied to running downloads as soon as it is saved
+        limit_label = ctk.CTkLabel(other_frame, text="Bandwidth Limit (KB/s, 0 = unlimited):")
+        limit_label.grid(row=3, column=0, padx=10, pady=10, sticky="w")
+        
+        self.bandwidth_limit_entry = ctk.CTkEntry(other_frame, width=120)
+        self.bandwidth_limit_entry.grid(row=3, column=1, padx=10, pady=10, sticky="w")
+        self.bandwidth_limit_entry.insert(0, str(self.settings["bandwidth_limit_kbps"]))
+        
+        schedule_label = ctk.CTkLabel(other_frame, text="Limit Schedule:")
+        schedule_label.grid(row=4, column=0, padx=10, pady=10, sticky="w")
+        
+        self.bandwidth_schedule_entry = ctk.CTkEntry(other_frame, width=300,
+                                                     placeholder_text="09:00-18:00=2000, 22:00-06:00=0")
+        self.bandwidth_schedule_entry.grid(row=4, column=1, padx=10, pady=10, sticky="w")
+        schedule_text = format_schedule(self.settings["bandwidth_schedule"])
+        if schedule_text:
+            self.bandwidth_schedule_entry.insert(0, schedule_text)
+        
+        # Metadata cache
+        cache_frame = ctk.CTkFrame(settings_frame)
+        cache_frame.grid(row=5, column=0, sticky="ew", padx=20, pady=10)
+        
+        self.cache_stats_label = ctk.CTkLabel(cache_frame, text="Metadata cache: -", justify="left")
+        self.cache_stats_label.grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        
+        clear_cache_btn = ctk.CTkButton(cache_frame, text="Clear Cache", 
+                                       command=self.clear_metadata_cache, width=100)
+        clear_cache_btn.grid(row=0, column=1, padx=10, pady=10)
+        self.update_cache_stats()
+        
         # Save settings button
         save_btn = ctk.CTkButton(settings_frame, text="Save Settings", 
                                 command=self.save_settings_gui, height=40)
@@ -464,6 +696,8 @@ class YouTubeDownloaderPro:
     
     def show_tab(self, tab_name):
         """Show selected tab"""
+        self.ensure_tab(tab_name)
+        
         # Hide all tabs
         for tab in self.tabs.values():
             tab.grid_forget()
@@ -471,6 +705,10 @@ class YouTubeDownloaderPro:
         # Show selected tab
         if tab_name in self.tabs:
             self.tabs[tab_name].grid(row=0, column=0, sticky="nsew")
+        if tab_name == "Settings":
+            self.update_cache_stats()
+        if tab_name == "Diagnostics":
+            self.update_diagnostics()
         
         # Update button states
         for name, btn in self.nav_buttons.items():
@@ -493,23 +731,18 @@ class YouTubeDownloaderPro:
         self.save_settings()
     
     def start_clipboard_watcher(self):
-        """Start watching clipboard for YouTube URLs"""
-        def watch_clipboard():
-            while True:
-                try:
-                    current = self.root.clipboard_get()
-                    if (current != self.clipboard_content and 
-                        self.auto_clipboard_var.get() and
-                        ("youtube.com" in current or "youtu.be" in current)):
-                        self.clipboard_content = current
-                        # Auto-fill the current tab's URL field
-                        self.root.after(0, lambda: self.auto_fill_url(current))
-                except:
-                    pass
-                time.sleep(1)
-        
-        thread = threading.Thread(target=watch_clipboard, daemon=True)
-        thread.start()
+        """Start watching clipboard for YouTube URLs on the main loop"""
+        self.clipboard_watcher = ClipboardWatcher(self.root, self.on_clipboard_url,
+                                                  enabled=self.auto_clipboard_var.get)
+        self.clipboard_watcher.start()
+    
+    def on_clipboard_url(self, url, video_id, playlist_id):
+        """Handle a new YouTube URL found in the clipboard"""
+        url = canonical_url(video_id, playlist_id)
+        if self.settings["clipboard_auto_enqueue"]:
+            self.enqueue_url(url)
+        else:
+            self.auto_fill_url(url)
     
     def auto_fill_url(self, url):
         """Auto-fill URL in current tab"""
@@ -517,6 +750,102 @@ class YouTubeDownloaderPro:
         if hasattr(self, 'quick_url_entry') and self.quick_url_entry.get() == "":
             self.quick_url_entry.insert(0, url)
     
+    def enqueue_url(self, url):
+        """Queue a URL for download with the default settings"""
+        video_id, playlist_id = parse_youtube_url(url)
+        if playlist_id and not video_id:
+            self.ensure_tab("Playlist Download")
+            progress_bar, status_label = self.create_progress_widgets(self.playlist_progress_frame, url)
+            job = self.engine.submit_playlist(
+                url, progress_hook=self.playlist_progress_hook(progress_bar, status_label))
+        else:
+            self.ensure_tab("Video Download")
+            progress_bar, status_label = self.create_progress_widgets(self.video_progress_frame, url)
+            job = self.engine.submit_video(
+                url, self.settings["default_video_quality"], "mp4",
+                progress_hook=self.video_progress_hook(progress_bar, status_label))
+        self.track_job(job, status_label)
+        return job
+    
+    def open_bulk_import(self):
+        """Ask for a URL list to import, pasted or from a file"""
+        dialog = ctk.CTkToplevel(self.root)
+        dialog.title("Bulk Import")
+        dialog.geometry("600x420")
+        dialog.transient(self.root)
+        
+        ctk.CTkLabel(dialog, text="Paste URLs (one or more per line), or load a text file:").pack(
+            pady=(15, 5), padx=15, anchor="w")
+        textbox = ctk.CTkTextbox(dialog)
+        textbox.pack(fill="both", expand=True, padx=15, pady=5)
+        
+        kind = ctk.CTkSegmentedButton(dialog, values=["Video", "Audio"])
+        kind.set("Video")
+        kind.pack(pady=5)
+        
+        def import_pasted():
+            text = textbox.get("1.0", "end")
+            dialog.destroy()
+            self.start_bulk_import(text.splitlines(), kind.get())
+        
+        def import_file():
+            path = filedialog.askopenfilename(parent=dialog, filetypes=[("Text files", "*.txt"),
+                                                                          ("All files", "*.*")])
+            if not path:
+                return
+            try:
+                # Read lazily by the importer, so lists of any length are fine
+                lines = open(path, encoding="utf-8", errors="replace")
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not open {path}: {e}", parent=dialog)
+                return
+            dialog.destroy()
+            self.start_bulk_import(lines, kind.get())
+        
+        button_frame = ctk.CTkFrame(dialog, fg_color="transparent")
+        button_frame.pack(pady=(5, 15))
+        ctk.CTkButton(button_frame, text="Load File...", command=import_file).pack(side="left", padx=5)
+        ctk.CTkButton(button_frame, text="Import Pasted", command=import_pasted).pack(side="left", padx=5)
+    
+    def start_bulk_import(self, lines, kind="Video"):
+        """Stream a URL list into the queue with the default settings"""
+        if self.bulk_import is not None and not self.bulk_import.done.is_set():
+            messagebox.showerror("Error", "An import is already running")
+            return
+        
+        def on_update(importer):
+            self.progress_bus.publish('bulk-import', importer, self.render_bulk_import)
+        
+        # Imported jobs get no progress widgets; the summary line reports them
+        self.bulk_import = self.engine.import_urls(
+            lines, kind, self.settings["default_video_quality"], "mp4",
+            self.settings["default_audio_format"], on_update=on_update)
+        self.bulk_cancel_btn.configure(state="normal")
+        self.render_bulk_import(self.bulk_import)
+    
+    def cancel_bulk_import(self):
+        """Stop reading the current URL list; queued downloads continue"""
+        if self.bulk_import is not None:
+            self.bulk_import.cancel()
+    
+    def render_bulk_import(self, importer):
+        """Show the progress of a bulk import on the home tab"""
+        counts = importer.stats()
+        if counts['done']:
+            state = "Import cancelled" if counts['cancelled'] else "Imported"
+            self.bulk_cancel_btn.configure(state="disabled")
+        else:
+            state = "Importing"
+        text = (f"{state}: {counts['queued']} queued of {counts['read']} read | "
+                f"{counts['duplicates']} duplicates | {counts['resolving']} resolving")
+        if counts['failed']:
+            text += f" | {counts['failed']} unresolved"
+        text += f" | {counts['downloaded']} downloaded"
+        if counts['download_failed']:
+            text += f", {counts['download_failed']} failed"
+        self.bulk_status_label.configure(text=text)
+        self.update_queue_status()
+    
     def quick_download(self):
         """Quick download from home tab"""
         url = self.quick_url_entry.get().strip()
@@ -525,7 +854,8 @@ class YouTubeDownloaderPro:
             return
         
         # Determine if it's a playlist or single video
-        if "playlist" in url:
+        video_id, playlist_id = parse_youtube_url(url)
+        if (playlist_id and not video_id) or (not video_id and "playlist" in url):
             self.show_tab("Playlist Download")
             self.playlist_url_entry.delete(0, tk.END)
             self.playlist_url_entry.insert(0, url)
@@ -543,12 +873,11 @@ class YouTubeDownloaderPro:
         
         def fetch_info():
             try:
-                ydl_opts = {'quiet': True, 'no_warnings': True}
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    
-                    # Update UI in main thread
-                    self.root.after(0, lambda: self.display_video_info(info))
+                info = self.engine.get_video_info(url)
+                
+                # Update UI in main thread
+                self.root.after(0, lambda: self.display_video_info(info))
+                self.load_preview(self.video_preview_label, [info])
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to get video info: {str(e)}"))
         
@@ -556,9 +885,11 @@ class YouTubeDownloaderPro:
     
     def display_video_info(self, info):
         """Display video information"""
-        # Clear previous info
+        # Clear previous info; the preview is replaced once the new thumbnail is decoded
         for widget in self.video_info_frame.winfo_children():
-            widget.destroy()
+            if widget is not self.video_preview_label:
+                widget.destroy()
+        self.video_preview_label.grid(row=0, column=2, rowspan=4, padx=10, pady=5, sticky="ne")
         
         # Title
         title_label = ctk.CTkLabel(self.video_info_frame, text="Title:", 
@@ -587,6 +918,16 @@ class YouTubeDownloaderPro:
         views_text = f"{views:,}" if views else "N/A"
         views_display = ctk.CTkLabel(self.video_info_frame, text=views_text)
         views_display.grid(row=2, column=1, sticky="w", padx=10, pady=5)
+        
+        # Format the current quality and format settings would download
+        selected = self.engine.select_format(info, self.video_quality.get(), self.video_format.get())
+        selected_label = ctk.CTkLabel(self.video_info_frame, text="Download:", 
+                                     font=ctk.CTkFont(weight="bold"))
+        selected_label.grid(row=3, column=0, sticky="w", padx=10, pady=5)
+        
+        selected_text = describe_format(selected, info.get('duration')) if selected else "N/A"
+        selected_display = ctk.CTkLabel(self.video_info_frame, text=selected_text)
+        selected_display.grid(row=3, column=1, sticky="w", padx=10, pady=5)
     
     def get_playlist_info(self):
         """Get playlist information"""
@@ -595,24 +936,98 @@ class YouTubeDownloaderPro:
             messagebox.showerror("Error", "Please enter a playlist URL")
             return
         
+        listing = object()
+        
+        def render(state):
+            self.display_playlist_info(*state, listing=listing)
+        
         def fetch_info():
             try:
-                ydl_opts = {'quiet': True, 'no_warnings': True, 'extract_flat': True}
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    
-                    # Update UI in main thread
-                    self.root.after(0, lambda: self.display_playlist_info(info))
+                # Entries arrive page by page; the display shows the count growing
+                playlist = self.engine.iter_playlist(url)
+                info = next(playlist)
+                entries = []
+                for entry in playlist:
+                    if not entries:
+                        # The playlist's own thumbnail, or else its first video's
+                        self.load_preview(self.playlist_preview_label, [info, entry])
+                    entries.append(entry)
+                    self.progress_bus.publish('playlist-info', (info, entries, True), render)
+                self.progress_bus.publish('playlist-info', (info, entries, False), render)
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to get playlist info: {str(e)}"))
         
         threading.Thread(target=fetch_info, daemon=True).start()
     
-    def display_playlist_info(self, info):
-        """Display playlist information"""
-        # Clear previous info
+    def load_preview(self, label, infos):
+        """Show the thumbnail of the first of infos that has one in label
+
+        The cached thumbnail is fetched, decoded and resized on the preview
+        workers; the Tk thread only wraps the finished image. A newer request
+        for the same label wins over one that is still loading.
+        """
+        token = object()
+        label.preview_token = token
+        self.root.after(0, lambda: label.configure(image=None))
+        
+        def show(image):
+            if label.preview_token is token:
+                label.preview_image = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
+                label.configure(image=label.preview_image)
+        
+        def work():
+            try:
+                image = self.engine.thumbnails.preview(infos, PREVIEW_SIZE)
+            except Exception as e:
+                print(f"Error loading thumbnail preview: {e}")
+                return
+            if image is not None:
+                self.root.after(0, lambda: show(image))
+        
+        self.preview_executor.submit(work)
+    
+    def display_playlist_info(self, info, entries=None, expanding=False, listing=None):
+        """Display playlist information; entries may still be growing while expanding
+
+        Repeated calls for the same listing only add the entries that arrived
+        since the last one to the totals, so a flush costs the same at the
+        end of a long playlist as at its start.
+        """
+        if entries is None:
+            entries = info.get('entries', [])
+        panel = self.playlist_panel
+        if panel is None or listing is None or panel['listing'] is not listing:
+            panel = self.playlist_panel = self.build_playlist_panel(info, listing)
+        # Duration from the flat entries; missing ones are extrapolated from the known average.
+        # The listing thread may append meanwhile, so count what was sliced off
+        new_entries = entries[panel['shown']:]
+        for entry in new_entries:
+            if entry and entry.get('duration'):
+                panel['known'] += 1
+                panel['seconds'] += entry['duration']
+        panel['shown'] += len(new_entries)
+        
+        count_text = f"{panel['shown']}+ (listing...)" if expanding else str(panel['shown'])
+        panel['count'].configure(text=count_text)
+        
+        missing = panel['shown'] - panel['known']
+        avg_duration = panel['seconds'] / panel['known'] if panel['known'] else 4 * 60  # 4 minutes fallback
+        total_seconds = int(panel['seconds'] + missing * avg_duration)
+        hours = total_seconds // 3600
+        minutes = (total_seconds % 3600) // 60
+        approx = "~" if missing else ""
+        duration_text = f"{approx}{hours}h {minutes}m"
+        if missing and panel['known']:
+            duration_text += f" ({missing} videos estimated)"
+        panel['duration'].configure(text=duration_text)
+    
+    def build_playlist_panel(self, info, listing):
+        """Replace the playlist info panel's labels and return them with empty totals"""
+        # Clear previous info; the preview stays while the listing grows
         for widget in self.playlist_info_frame.winfo_children():
-            widget.destroy()
+            if widget is not self.playlist_preview_label:
+                widget.destroy()
+        self.playlist_preview_label.grid(row=0, column=2, rowspan=3, padx=10, pady=5, sticky="ne")
         
         # Title
         title_label = ctk.CTkLabel(self.playlist_info_frame, text="Playlist:", 
@@ -627,24 +1042,109 @@ class YouTubeDownloaderPro:
                                   font=ctk.CTkFont(weight="bold"))
         count_label.grid(row=1, column=0, sticky="w", padx=10, pady=5)
         
-        entries = info.get('entries', [])
-        count_text = str(len(entries))
-        count_display = ctk.CTkLabel(self.playlist_info_frame, text=count_text)
+        count_display = ctk.CTkLabel(self.playlist_info_frame, text="")
         count_display.grid(row=1, column=1, sticky="w", padx=10, pady=5)
         
-        # Estimated duration (simplified)
-        duration_label = ctk.CTkLabel(self.playlist_info_frame, text="Est. Duration:", 
+        duration_label = ctk.CTkLabel(self.playlist_info_frame, text="Duration:", 
                                      font=ctk.CTkFont(weight="bold"))
         duration_label.grid(row=2, column=0, sticky="w", padx=10, pady=5)
         
-        # Rough estimate based on average video length
-        avg_duration = 4 * 60  # 4 minutes average
-        total_seconds = len(entries) * avg_duration
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        duration_text = f"~{hours}h {minutes}m"
-        duration_display = ctk.CTkLabel(self.playlist_info_frame, text=duration_text)
+        duration_display = ctk.CTkLabel(self.playlist_info_frame, text="")
         duration_display.grid(row=2, column=1, sticky="w", padx=10, pady=5)
+        
+        return {'listing': listing, 'count': count_display, 'duration': duration_display,
+                'shown': 0, 'known': 0, 'seconds': 0}
+    
+    def create_progress_widgets(self, parent, title):
+        """Add a progress block for one job and return its bar and status label"""
+        row = len(parent.winfo_children())
+        job_frame = ctk.CTkFrame(parent)
+        job_frame.grid(row=row, column=0, sticky="ew", padx=5, pady=5)
+        job_frame.grid_columnconfigure(0, weight=1)
+        
+        progress_label = ctk.CTkLabel(job_frame, text=title)
+        progress_label.grid(row=0, column=0, sticky="w", padx=10, pady=5)
+        
+        progress_bar = ctk.CTkProgressBar(job_frame)
+        progress_bar.grid(row=1, column=0, sticky="ew", padx=10, pady=5)
+        progress_bar.set(0)
+        
+        status_label = ctk.CTkLabel(job_frame, text="Queued...")
+        status_label.grid(row=2, column=0, sticky="w", padx=10, pady=5)
+        
+        return progress_bar, status_label
+    
+    def track_job(self, job, status_label):
+        """Remember a submitted job and show its queue position"""
+        job.status_label = status_label
+        self.current_downloads[job.id] = job
+        position = self.engine.scheduler.queue_position(job)
+        if position:
+            status_label.configure(text=f"Queued (position {position})")
+        return job
+    
+    def on_job_state_change(self, job):
+        """Scheduler callback; runs on worker threads"""
+        if hasattr(self, 'root'):
+            self.root.after(0, lambda: self.handle_job_state(job))
+    
+    def handle_job_state(self, job):
+        """Reflect a job state change in the UI"""
+        if job.parent is not None:
+            # Playlist entries are reported through their playlist
+            pass
+        elif job.sync is not None:
+            # Subscription syncs report through their summary, also when started by the timer
+            if job.is_finished():
+                self.show_playlist_done(job)
+                self.add_to_history(job)
+            self.update_subscriptions()
+        elif job.state == DONE:
+            if job.kind == "Playlist":
+                self.show_playlist_done(job)
+            elif job.skipped and getattr(job, 'status_label', None) is not None:
+                job.status_label.configure(text=f"Already downloaded: {os.path.basename(job.file_path)}")
+            self.add_to_history(job)
+            if getattr(job, 'imported', False):
+                self.progress_bus.publish('bulk-import', self.bulk_import, self.render_bulk_import)
+        elif job.state == FAILED:
+            titles = {'Video': "Download failed", 'Playlist': "Playlist download failed",
+                      'Audio': "Audio extraction failed"}
+            status_label = getattr(job, 'status_label', None)
+            if status_label is not None:
+                status_label.configure(text="Cancelled" if job.cancelled else f"Failed: {str(job.error)[:80]}")
+            if getattr(job, 'imported', False):
+                # Counted in the import summary instead of one dialog per URL
+                self.progress_bus.publish('bulk-import', self.bulk_import, self.render_bulk_import)
+            elif not job.cancelled:
+                attempts = f" ({job.error_kind}, gave up after {job.attempts} attempts)" if job.attempts > 1 else ""
+                messagebox.showerror("Error", f"{titles.get(job.kind, 'Download failed')}{attempts}: {str(job.error)}")
+        self.update_queue_status()
+    
+    def show_playlist_done(self, job):
+        """Show the final summary of a playlist job"""
+        status_label = getattr(job, 'status_label', None)
+        if status_label is None:
+            return
+        if job.sync is not None:
+            status_label.configure(text=format_summary(job.sync.summary))
+            return
+        progress = job.progress.snapshot()
+        text = "Playlist download completed!"
+        if progress['skipped']:
+            text += f" ({progress['skipped']} already downloaded)"
+        if progress['failed']:
+            text += f" ({progress['failed']} of {progress['total']} videos failed)"
+        status_label.configure(text=text)
+    
+    def update_queue_status(self):
+        """Update queued/running counters on the home tab"""
+        counts = self.engine.scheduler.counts()
+        auto = " (auto)" if self.engine.concurrency is not None else ""
+        if hasattr(self, 'queue_label'):
+            self.queue_label.configure(
+                text=f"Queued: {counts['queued']} | Running: {counts['running']} | Failed: {counts['failed']} | "
+                     f"Workers: {self.engine.scheduler.max_workers}{auto}")
     
     def download_video(self):
         """Download single video"""
@@ -655,50 +1155,37 @@ class YouTubeDownloaderPro:
         
         quality = self.video_quality.get()
         format_ext = self.video_format.get()
+        progress_bar, status_label = self.create_progress_widgets(self.video_progress_frame, url)
         
-        def download():
-            try:
-                # Clear previous progress
-                for widget in self.video_progress_frame.winfo_children():
-                    widget.destroy()
-                
-                # Create progress bar
-                progress_label = ctk.CTkLabel(self.video_progress_frame, text="Downloading...")
-                progress_label.grid(row=0, column=0, sticky="w", padx=10, pady=5)
-                
-                progress_bar = ctk.CTkProgressBar(self.video_progress_frame)
-                progress_bar.grid(row=1, column=0, sticky="ew", padx=10, pady=5)
-                progress_bar.set(0)
-                
-                status_label = ctk.CTkLabel(self.video_progress_frame, text="Starting download...")
-                status_label.grid(row=2, column=0, sticky="w", padx=10, pady=5)
-                
-                def progress_hook(d):
-                    if d['status'] == 'downloading':
-                        if 'total_bytes' in d:
-                            percent = d['downloaded_bytes'] / d['total_bytes']
-                            self.root.after(0, lambda: progress_bar.set(percent))
-                            self.root.after(0, lambda: status_label.configure(
-                                text=f"Downloaded: {d['downloaded_bytes']//1024//1024}MB / {d['total_bytes']//1024//1024}MB"))
-                    elif d['status'] == 'finished':
-                        self.root.after(0, lambda: progress_bar.set(1))
-                        self.root.after(0, lambda: status_label.configure(text="Download completed!"))
-                        self.add_to_history(url, "Video", d.get('filename', 'Unknown'))
-                
-                # Configure yt-dlp options
-                ydl_opts = {
-                    'outtmpl': os.path.join(self.download_path, '%(title)s.%(ext)s'),
-                    'progress_hooks': [progress_hook],
-                    'format': self.get_format_string(quality, format_ext),
-                }
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-                    
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("Error", f"Download failed: {str(e)}"))
-        
-        threading.Thread(target=download, daemon=True).start()
+        job = self.engine.submit_video(url, quality, format_ext,
+                                       progress_hook=self.video_progress_hook(progress_bar, status_label))
+        self.track_job(job, status_label)
+    
+    def video_progress_hook(self, progress_bar, status_label):
+        """Return a progress hook that renders a video job into the given widgets"""
+        def render(state):
+            if state['retry']:
+                status_label.configure(text=retry_text(state['retry']))
+                return
+            progress_bar.set(state['fraction'])
+            if state['status'] == 'finished':
+                status_label.configure(text="Download completed!")
+            elif state['total_bytes']:
+                approx = "~" if state['estimated'] else ""
+                expected = (f" (~{format_bytes(state['expected_bytes'])} in total)"
+                            if state['expected_bytes'] > state['total_bytes'] else "")
+                status_label.configure(
+                    text=f"Downloaded: {state['downloaded_bytes']//1024//1024}MB / "
+                         f"{approx}{state['total_bytes']//1024//1024}MB{expected} | "
+                         f"{format_bytes(state['job_speed'])}/s")
+        
+        def progress_hook(job, d):
+            state = progress_state(d)
+            state['job_speed'] = self.engine.job_speed(job)
+            state['expected_bytes'] = job.expected_bytes
+            self.progress_bus.publish(job.id, state, render)
+        
+        return progress_hook
     
     def download_playlist(self):
         """Download playlist"""
@@ -711,92 +1198,92 @@ class YouTubeDownloaderPro:
         end_range = self.range_end.get().strip()
         audio_only = self.playlist_audio_only.get()
         quality = self.playlist_quality.get()
+        progress_bar, status_label = self.create_progress_widgets(self.playlist_progress_frame, url)
         
-        def download():
-            try:
-                # Clear previous progress
-                for widget in self.playlist_progress_frame.winfo_children():
-                    widget.destroy()
-                
-                # Create progress display
-                progress_label = ctk.CTkLabel(self.playlist_progress_frame, text="Downloading playlist...")
-                progress_label.grid(row=0, column=0, sticky="w", padx=10, pady=5)
-                
-                progress_bar = ctk.CTkProgressBar(self.playlist_progress_frame)
-                progress_bar.grid(row=1, column=0, sticky="ew", padx=10, pady=5)
-                progress_bar.set(0)
-                
-                status_label = ctk.CTkLabel(self.playlist_progress_frame, text="Starting...")
-                status_label.grid(row=2, column=0, sticky="w", padx=10, pady=5)
-                
-                current_video = 0
-                total_videos = 0
-                
-                def progress_hook(d):
-                    nonlocal current_video
-                    if d['status'] == 'downloading':
-                        if 'total_bytes' in d and total_videos > 0:
-                            video_progress = current_video / total_videos
-                            self.root.after(0, lambda: progress_bar.set(video_progress))
-                            self.root.after(0, lambda: status_label.configure(
-                                text=f"Video {current_video + 1}/{total_videos}: {d['filename'].split('/')[-1][:50]}..."))
-                    elif d['status'] == 'finished':
-                        current_video += 1
-                        if total_videos > 0:
-                            progress = current_video / total_videos
-                            self.root.after(0, lambda: progress_bar.set(progress))
-                
-                # Build format string
-                if audio_only:
-                    format_str = 'bestaudio/best'
-                else:
-                    format_str = self.get_format_string(quality, 'mp4')
-                
-                # Build playlist selection
-                playlist_items = ""
-                if start_range and end_range:
-                    playlist_items = f"{start_range}-{end_range}"
-                elif start_range:
-                    playlist_items = f"{start_range}-"
-                
-                ydl_opts = {
-                    'outtmpl': os.path.join(self.download_path, 'Playlists/%(playlist)s/%(title)s.%(ext)s'),
-                    'progress_hooks': [progress_hook],
-                    'format': format_str,
-                }
-                
-                if playlist_items:
-                    ydl_opts['playlist_items'] = playlist_items
-                
-                if audio_only:
-                    ydl_opts['postprocessors'] = [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }]
-                
-                # Get total count first
-                with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    entries = info.get('entries', [])
-                    if playlist_items:
-                        # Calculate actual range
-                        start_idx = int(start_range) - 1 if start_range else 0
-                        end_idx = int(end_range) if end_range else len(entries)
-                        total_videos = end_idx - start_idx
-                    else:
-                        total_videos = len(entries)
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-                
-                self.root.after(0, lambda: status_label.configure(text="Playlist download completed!"))
-                self.add_to_history(url, "Playlist", f"{total_videos} videos")
-                    
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("Error", f"Playlist download failed: {str(e)}"))
-        
-        threading.Thread(target=download, daemon=True).start()
+        job = self.engine.submit_playlist(url, start_range, end_range, audio_only, quality,
+                                          progress_hook=self.playlist_progress_hook(progress_bar, status_label))
+        self.track_job(job, status_label)
+    
+    def playlist_progress_hook(self, progress_bar, status_label):
+        """Return a progress hook that renders a playlist job into the given widgets"""
+        def render(job):
+            # Aggregate is read at flush time, so every flush shows the newest totals
+            progress = job.progress.snapshot()
+            if progress['total'] > 0:
+                finished = progress['done'] + progress['failed']
+                failed_text = f", {progress['failed']} failed" if progress['failed'] else ""
+                # The count keeps growing while later pages are still being listed
+                more = "+" if progress['expanding'] else ""
+                progress_bar.set(progress['fraction'])
+                status_label.configure(
+                    text=f"Videos {finished}/{progress['total']}{more} finished{failed_text} | "
+                         f"{progress['active']} downloading | {format_bytes(self.engine.job_speed(job))}/s")
+        
+        def progress_hook(job, d):
+            self.progress_bus.publish(job.id, job, render)
+        
+        return progress_hook
+    
+    def subscribe_playlist(self):
+        """Save the playlist or channel URL as a subscription and sync it"""
+        url = self.playlist_url_entry.get().strip()
+        if not url:
+            messagebox.showerror("Error", "Please enter a playlist or channel URL")
+            return
+        interval = SUBSCRIPTION_INTERVALS[self.subscription_interval.get()]
+        subscription_id = self.engine.subscribe(url, self.playlist_audio_only.get(),
+                                                self.playlist_quality.get(), interval)
+        self.sync_subscriptions([subscription_id])
+    
+    def sync_subscriptions(self, subscription_ids=None):
+        """Sync subscriptions (all by default), each with its own progress block"""
+        subscriptions = {s['id']: s for s in self.engine.subscriptions.all()}
+        for subscription_id in subscription_ids or list(subscriptions):
+            subscription = subscriptions[subscription_id]
+            running = self.engine.syncs.get(subscription_id)
+            if running is not None and not running.is_finished():
+                continue
+            title = f"Sync: {subscription['title'] or subscription['url']}"
+            progress_bar, status_label = self.create_progress_widgets(self.playlist_progress_frame, title)
+            job = self.engine.sync_subscription(
+                subscription_id, progress_hook=self.playlist_progress_hook(progress_bar, status_label))
+            self.track_job(job, status_label)
+        self.update_subscriptions()
+    
+    def unsubscribe(self, subscription_id):
+        """Remove a subscription after confirmation"""
+        if messagebox.askyesno("Unsubscribe", "Remove this subscription? Downloaded files are kept."):
+            self.engine.unsubscribe(subscription_id)
+            self.update_subscriptions()
+    
+    def update_subscriptions(self):
+        """Rebuild the subscription list with each one's last sync summary"""
+        if not hasattr(self, 'subscriptions_frame'):
+            return
+        for widget in self.subscriptions_frame.winfo_children():
+            widget.destroy()
+        intervals = {minutes: name for name, minutes in SUBSCRIPTION_INTERVALS.items()}
+        for row, subscription in enumerate(self.engine.subscriptions.all()):
+            running = self.engine.syncs.get(subscription['id'])
+            if running is not None and not running.is_finished():
+                status = "Syncing..."
+            elif subscription['last_summary']:
+                synced_at = datetime.fromtimestamp(subscription['last_sync_at']).strftime("%Y-%m-%d %H:%M")
+                status = f"{synced_at}: {format_summary(subscription['last_summary'])}"
+            else:
+                status = "Not synced yet"
+            interval = intervals.get(subscription['interval_minutes'],
+                                     f"Every {subscription['interval_minutes']} min")
+            text = (f"{subscription['title'] or subscription['url']} | {subscription['entries']} known | "
+                    f"{interval}\n{status}")
+            label = ctk.CTkLabel(self.subscriptions_frame, text=text, justify="left", anchor="w")
+            label.grid(row=row, column=0, sticky="w", padx=5, pady=2)
+            sync_btn = ctk.CTkButton(self.subscriptions_frame, text="Sync", width=60,
+                                    command=lambda i=subscription['id']: self.sync_subscriptions([i]))
+            sync_btn.grid(row=row, column=1, padx=5, pady=2)
+            remove_btn = ctk.CTkButton(self.subscriptions_frame, text="Remove", width=70,
+                                      command=lambda i=subscription['id']: self.unsubscribe(i))
+            remove_btn.grid(row=row, column=2, padx=5, pady=2)
     
     def extract_audio(self):
         """Extract audio from video/playlist"""
@@ -809,135 +1296,146 @@ class YouTubeDownloaderPro:
         quality = self.audio_quality.get()
         embed_metadata = self.embed_metadata.get()
         embed_thumbnail = self.embed_thumbnail.get()
+        progress_bar, status_label = self.create_progress_widgets(self.audio_progress_frame, url)
+        
+        def render(state):
+            if state['retry']:
+                status_label.configure(text=retry_text(state['retry']))
+                return
+            progress_bar.set(state['fraction'])
+            if state['status'] == 'finished':
+                status_label.configure(text="Audio extraction completed!")
+            else:
+                status_label.configure(text=f"Extracting: {os.path.basename(state['filename'])[:50]}... "
+                                            f"| {format_bytes(state['job_speed'])}/s")
         
-        def download():
-            try:
-                # Clear previous progress
-                for widget in self.audio_progress_frame.winfo_children():
-                    widget.destroy()
-                
-                # Create progress display
-                progress_label = ctk.CTkLabel(self.audio_progress_frame, text="Extracting audio...")
-                progress_label.grid(row=0, column=0, sticky="w", padx=10, pady=5)
-                
-                progress_bar = ctk.CTkProgressBar(self.audio_progress_frame)
-                progress_bar.grid(row=1, column=0, sticky="ew", padx=10, pady=5)
-                progress_bar.set(0)
-                
-                status_label = ctk.CTkLabel(self.audio_progress_frame, text="Starting...")
-                status_label.grid(row=2, column=0, sticky="w", padx=10, pady=5)
-                
-                def progress_hook(d):
-                    if d['status'] == 'downloading':
-                        if 'total_bytes' in d:
-                            percent = d['downloaded_bytes'] / d['total_bytes']
-                            self.root.after(0, lambda: progress_bar.set(percent))
-                            self.root.after(0, lambda: status_label.configure(
-                                text=f"Extracting: {d['filename'].split('/')[-1][:50]}..."))
-                    elif d['status'] == 'finished':
-                        self.root.after(0, lambda: progress_bar.set(1))
-                        self.root.after(0, lambda: status_label.configure(text="Audio extraction completed!"))
-                
-                # Configure quality
-                quality_map = {'best': '0', '320k': '320', '256k': '256', '192k': '192', '128k': '128'}
-                audio_quality = quality_map.get(quality, '192')
-                
-                postprocessors = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': audio_format,
-                    'preferredquality': audio_quality,
-                }]
-                
-                if embed_metadata:
-                    postprocessors.append({'key': 'FFmpegMetadata'})
-                
-                if embed_thumbnail:
-                    postprocessors.append({'key': 'EmbedThumbnail'})
-                
-                ydl_opts = {
-                    'outtmpl': os.path.join(self.download_path, 'Audio/%(title)s.%(ext)s'),
-                    'progress_hooks': [progress_hook],
-                    'format': 'bestaudio/best',
-                    'postprocessors': postprocessors,
-                    'writethumbnail': embed_thumbnail,
-                }
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-                
-                self.add_to_history(url, "Audio", f"{audio_format.upper()} extraction")
-                    
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("Error", f"Audio extraction failed: {str(e)}"))
+        def progress_hook(job, d):
+            state = progress_state(d)
+            state['job_speed'] = self.engine.job_speed(job)
+            self.progress_bus.publish(job.id, state, render)
         
-        threading.Thread(target=download, daemon=True).start()
+        job = self.engine.submit_audio(url, audio_format, quality, embed_metadata, embed_thumbnail,
+                                       progress_hook=progress_hook)
+        self.track_job(job, status_label)
     
-    def get_format_string(self, quality, format_ext):
-        """Generate format string for yt-dlp"""
-        if quality == "best":
-            return f"best[ext={format_ext}]/best"
-        elif quality == "worst":
-            return f"worst[ext={format_ext}]/worst"
-        else:
-            height = quality.replace('p', '')
-            return f"best[height<={height}][ext={format_ext}]/best[height<={height}]/best"
-    
-    def add_to_history(self, url, type_str, info):
-        """Add download to history"""
-        entry = {
-            'url': url,
-            'type': type_str,
-            'info': info,
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.history.append(entry)
-        self.update_history_display()
+    def add_to_history(self, job):
+        """Refresh history views after the engine recorded a finished job"""
+        # The History tab loads its first page when it is built
+        if "History" in self.tabs:
+            if self.history_page == 0:
+                self.update_history_display()
+            else:
+                self.update_history_pager()
         self.update_stats()
     
-    def update_history_display(self):
-        """Update history display"""
-        # Clear existing items
-        for widget in self.history_frame.winfo_children():
-            widget.destroy()
-        
-        # Add history items
-        for i, entry in enumerate(reversed(self.history[-20:])):  # Show last 20
+    def get_history_row(self, index):
+        """Return the widgets for a visible history row, creating them on first use"""
+        while len(self.history_rows) <= index:
             item_frame = ctk.CTkFrame(self.history_frame)
-            item_frame.grid(row=i, column=0, sticky="ew", padx=5, pady=2)
             item_frame.grid_columnconfigure(1, weight=1)
             
             # Type icon
-            type_icons = {'Video': '🎥', 'Playlist': '📋', 'Audio': '🎵'}
-            icon_label = ctk.CTkLabel(item_frame, text=type_icons.get(entry['type'], '📄'), 
-                                     font=ctk.CTkFont(size=16))
+            icon_label = ctk.CTkLabel(item_frame, text="", font=ctk.CTkFont(size=16))
             icon_label.grid(row=0, column=0, padx=10, pady=5)
             
             # Info
-            info_text = f"{entry['type']}: {entry['info']}\n{entry['timestamp']}"
-            info_label = ctk.CTkLabel(item_frame, text=info_text, justify="left")
+            info_label = ctk.CTkLabel(item_frame, text="", justify="left")
             info_label.grid(row=0, column=1, sticky="w", padx=5, pady=5)
             
             # URL button
-            url_btn = ctk.CTkButton(item_frame, text="🔗", width=30, height=30,
-                                   command=lambda u=entry['url']: webbrowser.open(u))
+            url_btn = ctk.CTkButton(item_frame, text="🔗", width=30, height=30)
             url_btn.grid(row=0, column=2, padx=5, pady=5)
+            
+            self.history_rows.append({'frame': item_frame, 'icon': icon_label, 'info': info_label,
+                                      'url': url_btn, 'entry_id': None})
+        return self.history_rows[index]
+    
+    def update_history_display(self):
+        """Show the current history page, reconfiguring only rows whose entry changed"""
+        self.update_history_pager()
+        entries = self.engine.history.page(self.history_page * HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE)
+        type_icons = {'Video': '🎥', 'Playlist': '📋', 'Audio': '🎵'}
+        
+        for i, entry in enumerate(entries):
+            row = self.get_history_row(i)
+            if row['entry_id'] == entry['id']:
+                continue
+            row['entry_id'] = entry['id']
+            size_text = f" | {entry['bytes'] / 1024 / 1024:.1f} MB" if entry['bytes'] else ""
+            row['icon'].configure(text=type_icons.get(entry['type'], '📄'))
+            row['info'].configure(text=f"{entry['type']}: {entry['info']}\n{entry['timestamp']}{size_text}")
+            row['url'].configure(command=lambda u=entry['url']: webbrowser.open(u))
+            row['frame'].grid(row=i, column=0, sticky="ew", padx=5, pady=2)
+        
+        # Hide rows beyond the end of the page
+        for row in self.history_rows[len(entries):]:
+            if row['entry_id'] is not None:
+                row['entry_id'] = None
+                row['frame'].grid_remove()
+    
+    def update_history_pager(self):
+        """Update the page label and clamp the current page"""
+        total = self.engine.history.count()
+        pages = max(1, (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+        self.history_page = min(self.history_page, pages - 1)
+        self.history_page_label.configure(
+            text=f"Page {self.history_page + 1} of {pages} ({total:,} entries)")
+    
+    def change_history_page(self, delta):
+        """Move to the previous or next history page"""
+        self.history_page = max(0, self.history_page + delta)
+        self.update_history_display()
     
     def clear_history(self):
         """Clear download history"""
         if messagebox.askyesno("Confirm", "Clear all download history?"):
-            self.history.clear()
+            self.engine.history.clear()
+            self.history_page = 0
             self.update_history_display()
             self.update_stats()
     
     def update_stats(self):
-        """Update statistics display"""
-        total_downloads = len(self.history)
-        # Simplified stats - in a real app you'd track actual file sizes
-        estimated_size = total_downloads * 50  # 50MB average
-        stats_text = f"Downloads: {total_downloads} | Est. Total Size: {estimated_size} MB"
+        """Update statistics display from measured totals"""
+        stats = self.engine.throughput.snapshot()
+        session, all_time = stats['session'], stats['all_time']
+        stats_text = (f"Downloads: {all_time['jobs']} | Total Size: {format_bytes(all_time['bytes'])} | "
+                      f"Avg Speed: {format_bytes(all_time['average_speed'])}/s | "
+                      f"Peak: {format_bytes(all_time['peak_speed'])}/s\n"
+                      f"This session: {session['jobs']} downloads, {format_bytes(session['bytes'])}, "
+                      f"post-processing {session['postprocess_seconds']:.0f}s | "
+                      f"Current Speed: {format_bytes(stats['current_speed'])}/s")
+        stages = self.engine.stage_stats()
+        download, postprocess = stages['download'], stages['postprocess']
+        stats_text += (f"\nDownloading: {download['active']} active, {download['queued']} waiting "
+                       f"(avg wait {download['mean_wait_seconds']:.1f}s) | "
+                       f"Post-processing: {postprocess['active']} active, {postprocess['queued']} waiting "
+                       f"(avg {postprocess['mean_busy_seconds']:.1f}s)")
         if hasattr(self, 'stats_label'):
             self.stats_label.configure(text=stats_text)
     
+    def refresh_stats(self):
+        """Refresh the statistics once a second so the current speed stays live"""
+        self.update_stats()
+        self.root.after(1000, self.refresh_stats)
+    
+    def update_cache_stats(self):
+        """Update metadata and thumbnail cache statistics in the settings tab"""
+        stats = self.engine.metadata_cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = f"{stats['hits'] / lookups * 100:.0f}%" if lookups else "n/a"
+        thumbnails = self.engine.thumbnails.stats()
+        self.cache_stats_label.configure(
+            text=f"Metadata cache: {stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.1f} MB | "
+                 f"Hits: {stats['hits']} | Misses: {stats['misses']} | Hit rate: {hit_rate}\n"
+                 f"Thumbnails: {thumbnails['files']} files, {thumbnails['bytes'] / 1024 / 1024:.1f} MB | "
+                 f"Hits: {thumbnails['hits']} | Fetched: {thumbnails['fetches']}")
+    
+    def clear_metadata_cache(self):
+        """Clear the extraction metadata and thumbnail caches"""
+        self.engine.metadata_cache.clear()
+        self.engine.thumbnails.clear()
+        self.update_cache_stats()
+    
     def browse_download_path(self):
         """Browse for download directory"""
         folder = filedialog.askdirectory(initialdir=self.download_path)
@@ -949,19 +1447,113 @@ class YouTubeDownloaderPro:
         """Save settings from GUI"""
         self.settings["download_path"] = self.path_entry.get()
         self.settings["auto_clipboard"] = self.auto_clipboard_var.get()
+        self.settings["clipboard_auto_enqueue"] = self.clipboard_enqueue_var.get()
         self.settings["concurrent_downloads"] = int(self.concurrent_downloads.get())
+        self.settings["connections_per_download"] = int(self.connections_per_download.get())
+        self.settings["adaptive_concurrency"] = self.adaptive_concurrency_var.get()
+        try:
+            self.settings["max_concurrent_downloads"] = max(1, int(self.concurrency_ceiling_entry.get()))
+        except ValueError:
+            messagebox.showerror("Error", "Invalid concurrent download ceiling")
+            return
+        try:
+            self.settings["bandwidth_limit_kbps"] = max(0, int(self.bandwidth_limit_entry.get() or 0))
+            self.settings["bandwidth_schedule"] = parse_schedule(self.bandwidth_schedule_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid bandwidth limit or schedule")
+            return
         
-        self.download_path = self.settings["download_path"]
-        os.makedirs(self.download_path, exist_ok=True)
+        self.engine.apply_settings(self.settings)
+        self.download_path = self.engine.download_path
         
         self.save_settings()
         messagebox.showinfo("Success", "Settings saved successfully!")
     
+    def on_first_frame(self, event=None):
+        """Record time-to-first-frame and start warming up yt-dlp in the background"""
+        if "first_frame" in self.startup_times:
+            return
+        self.startup_times["first_frame"] = time.perf_counter() - STARTUP_STARTED
+        threading.Thread(target=self.warm_up_engine, daemon=True).start()
+        if not self.startup_report:
+            self.root.after(200, self.offer_resume)
+    
+    def warm_up_engine(self):
+        """Import yt-dlp off the main thread so the first download does not pay for it"""
+        try:
+            engine.get_yt_dlp()
+        except Exception as e:
+            print(f"Error loading yt-dlp: {e}")
+        self.root.after(0, self.on_ready)
+    
+    def on_ready(self):
+        """Record time-to-ready, start subscription syncs and print the startup timing report"""
+        self.startup_times["ready"] = time.perf_counter() - STARTUP_STARTED
+        times = self.startup_times
+        print(f"Startup: UI built {times['ui_built'] * 1000:.0f} ms | "
+              f"first frame {times['first_frame'] * 1000:.0f} ms | "
+              f"ready {times['ready'] * 1000:.0f} ms")
+        if not self.startup_report:
+            self.engine.start_subscription_timer()
+        if self.startup_report:
+            print(json.dumps({name: round(value * 1000, 1) for name, value in times.items()}))
+            self.root.after(0, self.root.destroy)
+    
+    def offer_resume(self):
+        """Offer to resume downloads that a crash or shutdown left unfinished"""
+        entries = self.engine.pending_jobs()
+        if not entries:
+            return
+        partial = sum(entry['partial_bytes'] for entry in entries)
+        partial_text = f" ({format_bytes(partial)} already downloaded)" if partial else ""
+        if not messagebox.askyesno("Resume Downloads",
+                                   f"{len(entries)} downloads did not finish last time{partial_text}.\n"
+                                   "Resume them now?"):
+            self.engine.discard_pending()
+            return
+        frames = {'Video': ("Video Download", 'video_progress_frame'),
+                  'Playlist': ("Playlist Download", 'playlist_progress_frame'),
+                  'Audio': ("Audio Extract", 'audio_progress_frame')}
+        for entry in entries:
+            tab_name, frame_name = frames[entry['kind']]
+            self.ensure_tab(tab_name)
+            progress_bar, status_label = self.create_progress_widgets(getattr(self, frame_name), entry['url'])
+            if entry['kind'] == "Playlist":
+                progress_hook = self.playlist_progress_hook(progress_bar, status_label)
+            else:
+                progress_hook = self.video_progress_hook(progress_bar, status_label)
+            self.track_job(self.engine.resume(entry, progress_hook=progress_hook), status_label)
+    
+    def on_close(self):
+        """Stop downloads cleanly so they can be resumed, then close the window"""
+        counts = self.engine.scheduler.counts()
+        # An attached daemon keeps downloading after the window closes
+        if not self.attached and (counts['running'] or counts['queued']):
+            if not messagebox.askyesno("Quit",
+                                       "Downloads are still in progress. Quit now?\n"
+                                       "They will be offered for resuming next time."):
+                return
+        self.clipboard_watcher.stop()
+        self.progress_bus.stop()
+        self.preview_executor.shutdown(wait=False)
+        # Workers notice the shutdown at their next progress event; they are not
+        # daemon threads, so the process exits once they have saved their state
+        self.engine.shutdown(wait=False)
+        self.root.destroy()
+    
     def run(self):
         """Start the application"""
         self.root.mainloop()
+        # Covers every way out of the main loop, not just the close button
+        self.engine.shutdown(wait=False)
 
 # Main execution
 if __name__ == "__main__":
-    app = YouTubeDownloaderPro()
+    # --startup-report prints startup timings as JSON and exits once ready
+    # --attach [URL] runs downloads on a daemon started with 'cli.py daemon' (default: the daemon_port setting)
+    attach = None
+    if "--attach" in sys.argv:
+        position = sys.argv.index("--attach") + 1
+        attach = sys.argv[position] if position < len(sys.argv) and not sys.argv[position].startswith("--") else ""
+    app = YouTubeDownloaderPro(startup_report="--startup-report" in sys.argv, attach=attach)
     app.run()
\ No newline at end of file